@@ -1,12 +1,17 @@
 from __future__ import annotations
+import asyncio
 from valdec.decorators import validate
-from typing import Callable, Union, List
+from typing import Callable, Union, List, Awaitable, Iterable
 from copy import deepcopy
 
 import pandas as pd
 
 from data_quality.src.plot import plot_session_results
 from data_quality.src.table import Table
+from data_quality.src.streaming_table import StreamingTable
+from data_quality.src.parquet_table import ParquetTable
+from data_quality.src.arrow_table import ArrowTable
+from data_quality.src.process_executor import ProcessMaskExecutor
 from data_quality.src.sources import Sources
 from data_quality.src.utils import TAG_FLAG_ONLY_WARNING, TAG_FLAG_WARNING, TAG_WARNING_DESCRIPTION
 
@@ -19,16 +24,37 @@ class DataQualitySession(object):
         self.tables = []
 
     def create_sources(self,
-                       run_query_function: Callable[[str], pd.DataFrame],
+                       run_query_function: Union[Callable[[str], pd.DataFrame],
+                                                 Callable[[str], Awaitable[pd.DataFrame]]],
                        type_sources: str = None,
                        get_rows_flag: bool = False,
-                       n_max_rows_output: int = DEFAULT_MAX_ROWS_OUTPUT
+                       n_max_rows_output: int = DEFAULT_MAX_ROWS_OUTPUT,
+                       deferred: bool = False,
+                       max_workers: int = 1,
+                       count_with_rows_flag: bool = False,
+                       unique_rows_sql_flag: bool = False,
+                       cache_size: Union[int, None] = None,
+                       cache_ttl: Union[float, None] = None,
+                       connection_id: Union[str, None] = None,
+                       source_type_cache_path: Union[str, None] = None,
+                       sample_rate: Union[float, None] = None,
+                       upload_dataframe_function: Union[Callable[[pd.DataFrame], str], None] = None
                        ) -> Sources:
         return Sources(run_query_function,
                        self,
                        type_sources=type_sources,
                        get_rows_flag=get_rows_flag,
-                       n_max_rows_output=n_max_rows_output)
+                       n_max_rows_output=n_max_rows_output,
+                       deferred=deferred,
+                       max_workers=max_workers,
+                       count_with_rows_flag=count_with_rows_flag,
+                       unique_rows_sql_flag=unique_rows_sql_flag,
+                       cache_size=cache_size,
+                       cache_ttl=cache_ttl,
+                       connection_id=connection_id,
+                       source_type_cache_path=source_type_cache_path,
+                       sample_rate=sample_rate,
+                       upload_dataframe_function=upload_dataframe_function)
 
     def create_table_from_dataframe(self,
                                     df: pd.DataFrame,
@@ -38,8 +64,14 @@ class DataQualitySession(object):
                                     datetime_columns: Union[List[str], str, None] = None,
                                     datetime_formats: Union[List[str], str, None] = None,
                                     table_filter: str = None,
-                                    output_columns: Union[List[str], str] = None
+                                    output_columns: Union[List[str], str] = None,
+                                    deferred: bool = False,
+                                    max_processes: Union[int, None] = None,
+                                    n_partitions: Union[int, None] = None,
+                                    sample_rate: Union[float, None] = None
                                     ) -> Table:
+        # With max_processes the masks of the checks are computed by a pool of processes on row partitions
+        mask_executor = ProcessMaskExecutor(max_processes, n_partitions) if max_processes is not None else None
         table = Table(df=df,
                       index_column=index_column,
                       output_name=output_name,
@@ -47,16 +79,91 @@ class DataQualitySession(object):
                       not_empthy_columns=not_empthy_columns,
                       datetime_columns=datetime_columns,
                       datetime_formats=datetime_formats,
-                      output_columns=output_columns)
+                      output_columns=output_columns,
+                      deferred=deferred,
+                      mask_executor=mask_executor,
+                      sample_rate=sample_rate)
+        self.tables.append(table)
+        return table
+
+    def create_table_from_arrow(self,
+                                arrow_table,
+                                output_name: str,
+                                index_column: str = None,
+                                not_empthy_columns: Union[List[str], str, None] = None,
+                                datetime_columns: Union[List[str], str, None] = None,
+                                datetime_formats: Union[List[str], str, None] = None,
+                                table_filter: str = None,
+                                output_columns: Union[List[str], str] = None,
+                                deferred: bool = False
+                                ) -> ArrowTable:
+        table = ArrowTable(arrow_table,
+                           index_column=index_column,
+                           output_name=output_name,
+                           table_filter=table_filter,
+                           not_empthy_columns=not_empthy_columns,
+                           datetime_columns=datetime_columns,
+                           datetime_formats=datetime_formats,
+                           output_columns=output_columns,
+                           deferred=deferred)
+        self.tables.append(table)
+        return table
+
+    def create_table_from_chunks(self,
+                                 chunks: Iterable[pd.DataFrame],
+                                 output_name: str,
+                                 index_column: str = None,
+                                 not_empthy_columns: Union[List[str], str, None] = None,
+                                 datetime_columns: Union[List[str], str, None] = None,
+                                 datetime_formats: Union[List[str], str, None] = None,
+                                 table_filter: str = None,
+                                 output_columns: Union[List[str], str] = None,
+                                 n_max_rows_output: Union[int, None] = DEFAULT_MAX_ROWS_OUTPUT,
+                                 spill_path: Union[str, None] = None
+                                 ) -> StreamingTable:
+        table = StreamingTable(chunks,
+                               index_column=index_column,
+                               output_name=output_name,
+                               table_filter=table_filter,
+                               not_empthy_columns=not_empthy_columns,
+                               datetime_columns=datetime_columns,
+                               datetime_formats=datetime_formats,
+                               output_columns=output_columns,
+                               n_max_rows_output=n_max_rows_output,
+                               spill_path=spill_path)
+        self.tables.append(table)
+        return table
+
+    def create_table_from_parquet(self,
+                                  path: str,
+                                  output_name: str,
+                                  index_column: str = None,
+                                  not_empthy_columns: Union[List[str], str, None] = None,
+                                  datetime_columns: Union[List[str], str, None] = None,
+                                  datetime_formats: Union[List[str], str, None] = None,
+                                  table_filter: str = None,
+                                  output_columns: Union[List[str], str] = None,
+                                  n_max_rows_output: Union[int, None] = DEFAULT_MAX_ROWS_OUTPUT,
+                                  get_rows_flag: Union[bool, None] = None
+                                  ) -> ParquetTable:
+        table = ParquetTable(path,
+                             index_column=index_column,
+                             output_name=output_name,
+                             table_filter=table_filter,
+                             not_empthy_columns=not_empthy_columns,
+                             datetime_columns=datetime_columns,
+                             datetime_formats=datetime_formats,
+                             output_columns=output_columns,
+                             n_max_rows_output=n_max_rows_output,
+                             get_rows_flag=get_rows_flag)
         self.tables.append(table)
         return table
 
-    @validate
     def del_table(self,
                   table: Table):
         self.tables.remove(table)
+        table.clear_column_cache()
 
-    @validate
     def create_new_table_by_filter(self,
                                    table: Table,
                                    table_filter: str = None,
@@ -68,6 +175,24 @@ class DataQualitySession(object):
         self.tables.append(new_table)
         return new_table
 
+    def run(self):
+        plans = [(table, table._pop_planned_checks()) for table in self.tables]
+        fused_jobs = [table._submit(table.get_fused_number_ko_sql, [check for check, _ in planned_checks])
+                      for table, planned_checks in plans]
+        jobs = [table._submit_planned_checks(planned_checks, fused_job.result())
+                for (table, planned_checks), fused_job in zip(plans, fused_jobs)]
+        for (table, _), table_jobs in zip(plans, jobs):
+            table._register_planned_checks(table_jobs)
+
+    async def arun(self, max_concurrency: int = 10):
+        semaphore = asyncio.Semaphore(max_concurrency)
+        plans = [(table, table._pop_planned_checks()) for table in self.tables]
+        await asyncio.gather(*[table._arun_planned_checks(semaphore, planned_checks)
+                               for table, planned_checks in plans])
+        for table, planned_checks in plans:
+            table.check_list += [check for check, _ in planned_checks]
+            table.ko_rows = None
+
     @validate
     def create_html_output(self, **kargs):
         plot_session_results(self, **kargs)
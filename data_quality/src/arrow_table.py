@@ -0,0 +1,172 @@
+from typing import Union, List, Optional
+
+import numpy as np
+import pandas as pd
+from valdec.decorators import validate
+
+from data_quality.src.table import Table
+from data_quality.src.checks.index_null import IndexNull
+from data_quality.src.checks.not_empthy_column import NotEmpthyColumn
+from data_quality.src.checks.match_regex import MatchRegex
+from data_quality.src.checks.values_in_list import ValuesInList
+from data_quality.src.checks.column_between_values import ColumnBetweenValues
+from data_quality.src.utils import _clean_sql_filter, _referenced_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+
+def _is_string(column) -> bool:
+    return pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+
+
+def _is_numeric(column) -> bool:
+    return pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+
+
+def _to_numpy_mask(values) -> np.ndarray:
+    return pc.fill_null(values, False).to_numpy().astype(bool)
+
+
+def _mask_empthy(table, check) -> np.ndarray:
+    column_name = check.index_column if isinstance(check, IndexNull) else check.column_name
+    return ~table.get_mask_not_empthy(column_name)
+
+
+def _mask_match_regex(table, check) -> Optional[np.ndarray]:
+    column = table.arrow_table.column(check.column_name)
+    if not _is_string(column):
+        return None
+    try:
+        matches = pc.match_substring_regex(column, check.regex, ignore_case=not check.case_sensitive)
+    except pa.ArrowInvalid:
+        # Patterns that RE2 can't compile are left to the pandas implementation
+        return None
+    mask = table.get_mask_not_empthy(check.column_name)
+    mask &= _to_numpy_mask(pc.invert(matches))
+    return mask
+
+
+def _mask_values_in_list(table, check) -> Optional[np.ndarray]:
+    column = table.arrow_table.column(check.column_name)
+    if not _is_string(column):
+        return None
+    values_list = [str(v) for v in check.values_list]
+    if not check.case_sensitive:
+        column = pc.utf8_lower(column)
+        values_list = [v.lower() for v in values_list]
+    mask = table.get_mask_not_empthy(check.column_name)
+    mask &= ~_to_numpy_mask(pc.is_in(column, value_set=pa.array(values_list, type=column.type)))
+    return mask
+
+
+def _mask_column_between_values(table, check) -> Optional[np.ndarray]:
+    column = table.arrow_table.column(check.column_name)
+    if not _is_numeric(column):
+        return None
+    mask = table.get_mask_not_empthy(check.column_name)
+    result = np.zeros(mask.shape[0], dtype=bool)
+    if check.min_value is not None:
+        compare = pc.less if check.min_included else pc.less_equal
+        result |= _to_numpy_mask(compare(column, check.min_value))
+    if check.max_value is not None:
+        compare = pc.greater if check.max_included else pc.greater_equal
+        result |= _to_numpy_mask(compare(column, check.max_value))
+    mask &= result
+    return mask
+
+
+_ARROW_MASKS = {
+    IndexNull: _mask_empthy,
+    NotEmpthyColumn: _mask_empthy,
+    MatchRegex: _mask_match_regex,
+    ValuesInList: _mask_values_in_list,
+    ColumnBetweenValues: _mask_column_between_values
+}
+
+
+class ArrowTable(Table):
+    def __init__(self,
+                 arrow_table,
+                 index_column: str = None,
+                 output_name: str = None,
+                 not_empthy_columns: Union[str, list] = None,
+                 datetime_columns: Union[str, list, None] = None,
+                 datetime_formats: Union[str, list, None] = None,
+                 table_filter: str = None,
+                 output_columns: Union[List[str], str] = None,
+                 n_max_rows_output: int = None,
+                 deferred: bool = False):
+        if pa is None:
+            raise Exception("pyarrow is required to check arrow tables.")
+        self.flag_dataframe = True
+        self.arrow_table = arrow_table
+        self._df = None
+        super().__init__(index_column=index_column,
+                         output_name=output_name,
+                         not_empthy_columns=not_empthy_columns,
+                         datetime_columns=datetime_columns,
+                         datetime_formats=datetime_formats,
+                         table_filter=table_filter,
+                         output_columns=output_columns,
+                         n_max_rows_output=n_max_rows_output,
+                         deferred=deferred)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        # The pandas frame is built only for the checks without an Arrow implementation
+        if self._df is None:
+            self._df = self.arrow_table.to_pandas()
+        return self._df
+
+    @df.setter
+    def df(self, df: Union[pd.DataFrame, None]):
+        self._df = df
+
+    @validate
+    def set_table_filer(self, sql_filter: Optional[str]):
+        self.table_filter = _clean_sql_filter(sql_filter)
+        if self.table_filter is not None:
+            # Only the columns used by the filter are converted to evaluate it
+            columns = _referenced_columns(self.table_filter, set(self.arrow_table.column_names))
+            df = self.arrow_table.select([col for col in self.arrow_table.column_names if col in columns]).to_pandas()
+            mask = df.eval(self.table_filter).values
+            self._set_arrow_table(self.arrow_table.filter(pa.array(mask, type=pa.bool_())))
+
+    def _set_arrow_table(self, arrow_table):
+        self._set_df(None)
+        self.arrow_table = arrow_table
+
+    def get_number_of_rows(self, refresh: bool = False):
+        self.n_rows = self.arrow_table.num_rows
+
+    def get_column_names(self) -> List[str]:
+        return list(self.arrow_table.column_names)
+
+    def get_rows_by_positions(self, positions: np.ndarray, columns: Union[List[str], None] = None) -> pd.DataFrame:
+        arrow_table = self.arrow_table.take(pa.array(positions, type=pa.int64()))
+        if columns is not None:
+            arrow_table = arrow_table.select(columns)
+        return arrow_table.to_pandas()
+
+    def get_mask_not_empthy(self, column_name: str) -> np.ndarray:
+        mask = self._get_cached_column(("not_empthy", column_name), lambda: self._create_mask_not_empthy(column_name))
+        return mask.copy()
+
+    def _create_mask_not_empthy(self, column_name: str) -> np.ndarray:
+        column = self.arrow_table.column(column_name)
+        mask = pc.invert(pc.is_null(column, nan_is_null=True))
+        if _is_string(column):
+            mask = pc.and_(mask, pc.not_equal(column, ""))
+        return _to_numpy_mask(mask)
+
+    def _get_check_mask_values(self, check) -> Optional[np.ndarray]:
+        function = _ARROW_MASKS.get(type(check))
+        mask = function(self, check) if function is not None else None
+        if mask is None:
+            mask = check._get_mask_dataframe()
+        return mask
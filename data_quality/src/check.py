@@ -1,10 +1,15 @@
+import math
 from abc import ABC, abstractmethod
-from typing import Union, List
+from typing import Union, List, Optional
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.utils import _create_filter_columns_not_null, _aggregate_sql_filter, _output_column_to_sql, \
-    _query_limit, TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION
+    _query_limit, _referenced_columns, TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, COLUMN_NUMBER_KO, CONFIDENCE_Z
+
+RESULT_ATTRIBUTES = ["flag_ko", "n_ko", "flag_over_max_rows", "_ko_rows", "ko_positions",
+                     "ko_rate", "n_ko_estimate", "n_ko_lower", "n_ko_upper"]
 
 
 class Check(ABC):
@@ -28,6 +33,33 @@ class Check(ABC):
         self.ko_rows = None
         self.flag_warning = False
 
+        self.ko_rate = None
+        self.n_ko_estimate = None
+        self.n_ko_lower = None
+        self.n_ko_upper = None
+
+    @property
+    def ko_rows(self) -> Union[pd.DataFrame, None]:
+        # DataFrame checks only keep the positions of the KO rows, the frame is built when it is read
+        if self.ko_positions is not None:
+            return self._materialize_ko_rows()
+        return self._ko_rows
+
+    @ko_rows.setter
+    def ko_rows(self, df_ko: Union[pd.DataFrame, None]):
+        self._ko_rows = df_ko
+        self.ko_positions = None
+
+    def _materialize_ko_rows(self) -> pd.DataFrame:
+        df_ko = self.table.get_rows_by_positions(self.ko_positions, self.output_columns).copy()
+        df_ko[TAG_CHECK_DESCRIPTION] = self.check_description
+        return df_ko
+
+    def keep_ko_rows(self):
+        # Turn the positions into a frame, needed before the rows of table.df change
+        if self.ko_positions is not None:
+            self.ko_rows = self._materialize_ko_rows()
+
     @abstractmethod
     def _get_number_ko_sql(self) -> int:
         pass
@@ -36,9 +68,13 @@ class Check(ABC):
     def _get_rows_ko_sql(self) -> pd.DataFrame:
         pass
 
-    @abstractmethod
+    def _get_mask_dataframe(self) -> Optional[np.ndarray]:
+        # Boolean KO flag for each row of table.df. Checks whose KO rows are not rows of table.df (joins,
+        # added columns, ...) keep returning None and implement _get_rows_ko_dataframe
+        return None
+
     def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        pass
+        return self.table.df[self.table.get_check_mask(self)]
 
     def initialize_params(self,
                           check_description: Union[str, None] = None,
@@ -81,26 +117,38 @@ class Check(ABC):
             for f in sql_filter:
                 self.ignore_filters.append(f)
 
-    def standard_get_number_ko_sql(self, negative_filter: str):
-        ignore_filters = self.ignore_filters
+    def _create_sql_negative_filter(self) -> Optional[str]:
+        # Checks that need a custom query (joins, window functions, ...) can't be counted with a
+        # plain CASE WHEN on the table and keep returning None
+        return None
+
+    def _create_sql_ignore_filters(self) -> List[str]:
+        return []
+
+    def _get_sql_ignore_filters(self) -> List[str]:
+        ignore_filters = list(self.ignore_filters)
+        ignore_filters += self._create_sql_ignore_filters()
         ignore_filters.append(_create_filter_columns_not_null(self.columns_not_null))
         ignore_filters.append(self.table.table_filter)
-        ignore_filters = _aggregate_sql_filter(ignore_filters)
+        return ignore_filters
+
+    def standard_get_number_ko_sql(self, negative_filter: str):
+        ignore_filters = _aggregate_sql_filter(self._get_sql_ignore_filters())
         query = f"""
                 SELECT 
-                    CASE WHEN {negative_filter} THEN "KO" ELSE "OK" END as check,
+                    CASE WHEN {negative_filter} THEN 'KO' ELSE 'OK' END as check_result,
                     count(*) as n_rows
                 from {self.table.db_name}
                 {ignore_filters}
-                group by check
+                group by check_result
                 """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
+        n_ok = df.loc[df["check_result"] == "OK", "n_rows"].values
         if len(n_ok) > 0:
             n_ok = n_ok[0]
         else:
             n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
@@ -108,12 +156,34 @@ class Check(ABC):
         return n_ko
 
     def standard_rows_ko_sql(self, negative_filter: str) -> pd.DataFrame:
-        sql_filter = self.ignore_filters
-        sql_filter.append(_create_filter_columns_not_null(self.columns_not_null))
-        sql_filter.append(self.table.table_filter)
-        sql_filter.append(negative_filter)
+        query = self._create_standard_rows_ko_sql(negative_filter)
+        df = self.table.source.run_query(query)
+        return df
+
+    def standard_number_and_rows_ko_sql(self, negative_filter: str):
+        # The window count is computed before the LIMIT, so it is the exact number of KO rows
+        query = self._create_standard_rows_ko_sql(negative_filter,
+                                                  extra_columns=[f"count(*) over () as {COLUMN_NUMBER_KO}"])
+        df = self.table.source.run_query(query)
+        if df.shape[0] > 0:
+            n_ko = int(df[COLUMN_NUMBER_KO].iloc[0])
+            df = df.drop(columns=COLUMN_NUMBER_KO)
+        elif self.n_max_rows_output == 0:
+            # With LIMIT 0 no rows come back even if the check fails
+            n_ko = self.standard_get_number_ko_sql(negative_filter)
+        else:
+            n_ko = 0
+        return n_ko, df
+
+    def _create_standard_rows_ko_sql(self,
+                                     negative_filter: str,
+                                     extra_columns: Union[List[str], None] = None) -> str:
+        sql_filter = self._get_sql_ignore_filters()
+        sql_filter.append(f"({negative_filter})")
         sql_filter = _aggregate_sql_filter(sql_filter)
         output_columns = _output_column_to_sql(self.output_columns)
+        if extra_columns is not None:
+            output_columns = ", ".join([output_columns] + extra_columns)
         sql_limit = _query_limit(self.n_max_rows_output)
         query = f"""
         SELECT 
@@ -122,43 +192,126 @@ class Check(ABC):
         {sql_filter}
         {sql_limit}
         """
-        df = self.table.source.run_query(query)
-        return df
+        return query
+
+    def _get_plan_key(self) -> tuple:
+        # Two planned checks with the same parameters give the same result
+        parameters = [(k, repr(v)) for k, v in sorted(vars(self).items()) if k not in RESULT_ATTRIBUTES]
+        return (type(self).__name__, tuple(parameters))
+
+    def get_referenced_columns(self, column_names: set) -> set:
+        # Columns of the table used by the check parameters, the description is free text
+        values = [v for k, v in vars(self).items() if k not in RESULT_ATTRIBUTES + ["table", "check_description"]]
+        return _referenced_columns(values, column_names)
 
-    def check(self, get_rows_flag: Union[bool, None] = None):
+    def _set_result(self,
+                    n_ko: int,
+                    df_ko: Union[pd.DataFrame, None],
+                    flag_over_max_rows: Union[bool, None],
+                    ko_positions: Union[np.ndarray, None] = None):
+        self.n_ko = n_ko
+        self.flag_ko = n_ko != 0
+        self.ko_rows = df_ko
+        self.ko_positions = ko_positions
+        self.flag_over_max_rows = flag_over_max_rows
+
+    def set_estimate(self, n_rows: int, sample_rate: float):
+        # n_ko is counted on a sample of n_rows rows: the KO rate gets a Wilson score interval and the
+        # bounds are scaled to the estimated number of rows of the table
+        if n_rows == 0:
+            self.ko_rate, self.n_ko_estimate, self.n_ko_lower, self.n_ko_upper = 0, 0, 0, 0
+            return
+        n_rows_estimate = n_rows / sample_rate
+        p = self.n_ko / n_rows
+        z2 = CONFIDENCE_Z ** 2
+        center = (p + z2 / (2 * n_rows)) / (1 + z2 / n_rows)
+        margin = CONFIDENCE_Z * math.sqrt(p * (1 - p) / n_rows + z2 / (4 * n_rows ** 2)) / (1 + z2 / n_rows)
+        self.ko_rate = p
+        self.n_ko_estimate = int(round(self.n_ko / sample_rate))
+        self.n_ko_lower = max(self.n_ko, int(math.floor((center - margin) * n_rows_estimate)))
+        self.n_ko_upper = int(math.ceil((center + margin) * n_rows_estimate))
+
+    def check(self,
+              get_rows_flag: Union[bool, None] = None,
+              n_ko: Union[int, None] = None):
+        n_ko = self._compute(get_rows_flag=get_rows_flag, n_ko=n_ko)
+        self.table.check_list.append(self)
+        return n_ko
+
+    def _compute(self,
+                 get_rows_flag: Union[bool, None] = None,
+                 n_ko: Union[int, None] = None):
         if get_rows_flag is None:
             get_rows_flag = self.table.get_rows_flag
         flag_over_max_rows = None
+        ko_positions = None
         if self.table.flag_dataframe:
-            df_ko = self._get_rows_ko_dataframe()
-            n_ko = df_ko.shape[0]
-            if self.output_columns is not None:
-                if n_ko > 0:
-                    df_ko = df_ko[self.output_columns]
-                else:
-                    df_ko = pd.DataFrame(columns=self.output_columns)
-            df_ko[TAG_CHECK_DESCRIPTION] = self.check_description
-            flag_over_max_rows = False
-        else:
-            n_ko = self._get_number_ko_sql()
-            if get_rows_flag:
-                if n_ko == 0:
-                    df_ko = pd.DataFrame(columns=self.output_columns)
-                    flag_over_max_rows = False
-                else:
-                    df_ko = self._get_rows_ko_sql()
-                    n_rows = df_ko.shape[0]
-                    if n_rows == self.n_max_rows_output:
-                        flag_over_max_rows = True
+            mask = self.table.get_check_mask(self)
+            if mask is not None:
+                ko_positions = np.flatnonzero(mask)
+                n_ko = ko_positions.shape[0]
+                df_ko = None
+            else:
+                df_ko = self._get_rows_ko_dataframe()
+                n_ko = df_ko.shape[0]
+                if self.output_columns is not None:
+                    if n_ko > 0:
+                        df_ko = df_ko[self.output_columns]
                     else:
-                        flag_over_max_rows = False
+                        df_ko = pd.DataFrame(columns=self.output_columns)
                 df_ko[TAG_CHECK_DESCRIPTION] = self.check_description
+            flag_over_max_rows = False
+        else:
+            negative_filter = self._create_sql_negative_filter()
+            if (n_ko is None) and get_rows_flag and self.table.count_with_rows_flag and (negative_filter is not None):
+                n_ko, df_ko = self.standard_number_and_rows_ko_sql(negative_filter)
             else:
-                df_ko = None
+                if n_ko is None:
+                    n_ko = self._get_number_ko_sql()
+                if get_rows_flag and (n_ko != 0):
+                    df_ko = self._get_rows_ko_sql()
+                else:
+                    df_ko = None
+            df_ko, flag_over_max_rows = self._format_rows_ko_sql(n_ko, df_ko, get_rows_flag)
 
-        self.n_ko = n_ko
-        self.flag_ko = n_ko != 0
-        self.ko_rows = df_ko
-        self.flag_over_max_rows = flag_over_max_rows
-        self.table.check_list.append(self)
+        self._set_result(n_ko, df_ko, flag_over_max_rows, ko_positions)
+        return n_ko
+
+    async def _acompute(self,
+                        get_rows_flag: Union[bool, None],
+                        n_ko: int):
+        # Only for checks counted by the fused query: the rows query is awaited on the event loop
+        if get_rows_flag is None:
+            get_rows_flag = self.table.get_rows_flag
+        if get_rows_flag and (n_ko != 0):
+            query = self._create_standard_rows_ko_sql(self._create_sql_negative_filter())
+            df_ko = await self.table.source.arun_query(query)
+        else:
+            df_ko = None
+        return self._set_rows_result(n_ko, df_ko, get_rows_flag)
+
+    def _set_rows_result(self,
+                         n_ko: int,
+                         df_ko: Union[pd.DataFrame, None],
+                         get_rows_flag: bool):
+        df_ko, flag_over_max_rows = self._format_rows_ko_sql(n_ko, df_ko, get_rows_flag)
+        self._set_result(n_ko, df_ko, flag_over_max_rows)
         return n_ko
+
+    def _format_rows_ko_sql(self,
+                            n_ko: int,
+                            df_ko: Union[pd.DataFrame, None],
+                            get_rows_flag: bool):
+        flag_over_max_rows = None
+        if get_rows_flag:
+            if n_ko == 0:
+                df_ko = pd.DataFrame(columns=self.output_columns)
+                flag_over_max_rows = False
+            else:
+                n_rows = df_ko.shape[0]
+                if n_rows == self.n_max_rows_output:
+                    flag_over_max_rows = True
+                else:
+                    flag_over_max_rows = False
+            df_ko[TAG_CHECK_DESCRIPTION] = self.check_description
+        return df_ko, flag_over_max_rows
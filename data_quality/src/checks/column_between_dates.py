@@ -1,10 +1,11 @@
 from typing import Union, Optional
 from datetime import date, datetime
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
-from data_quality.src.utils import _create_filter_columns_not_null, COLUMN_CURRENT_CHECK
+from data_quality.src.utils import _create_filter_columns_not_null
 
 
 class ColumnBetweenDates(Check):
@@ -58,39 +59,35 @@ class ColumnBetweenDates(Check):
         else:
             return ""
 
+    def _create_sql_negative_filter(self):
+        return self._create_filter()
+
+    def _create_sql_ignore_filters(self):
+        return [_create_filter_columns_not_null(self.column_name),
+                f"{self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[self.column_name])} is not null"]
+
     def _get_number_ko_sql(self) -> int:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        self.add_ignore_filter(f"{self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[self.column_name])} is not null")
-        negative_filter = self._create_filter()
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        self.add_ignore_filter(
-            f"{self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[self.column_name])} is not null")
-        negative_filter = self._create_filter()
-        return self.standard_rows_ko_sql(negative_filter)
-
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].notnull() & (df[self.column_name].astype(str) != "")]
-        a = pd.to_datetime(df[self.column_name], errors="coerce")
-        df = df[a.notnull()]
-        tag_check = COLUMN_CURRENT_CHECK
-        df[tag_check] = False
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
+
+    def _get_mask_dataframe(self) -> np.ndarray:
+        mask = self.table.get_mask_not_empthy(self.column_name)
+        a = self.table.get_column_datetime(self.column_name)[mask]
+        check = np.zeros(a.shape[0], dtype=bool)
         if self.min_date is not None:
             if self.min_included:
-                df[tag_check] = a < self.min_date
+                check |= (a < self.min_date).values
             else:
-                df[tag_check] = a <= self.min_date
+                check |= (a <= self.min_date).values
         if self.max_date is not None:
             if self.max_included:
-                df[tag_check] = df[tag_check] | (a > self.max_date)
+                check |= (a > self.max_date).values
             else:
-                df[tag_check] = df[tag_check] | (a >= self.max_date)
-        df = df[df[tag_check]]
-        df.drop([tag_check], axis=1, inplace=True)
-        return df
+                check |= (a >= self.max_date).values
+        mask[mask] = check
+        return mask
 
 
 
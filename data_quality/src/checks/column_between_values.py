@@ -1,9 +1,10 @@
 from typing import Union, Optional
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
-from data_quality.src.utils import _human_format, _create_filter_columns_not_null, COLUMN_CURRENT_CHECK
+from data_quality.src.utils import _human_format, _create_filter_columns_not_null
 
 
 class ColumnBetweenValues(Check):
@@ -50,34 +51,34 @@ class ColumnBetweenValues(Check):
         else:
             return ""
 
+    def _create_sql_negative_filter(self):
+        return self._create_filter()
+
+    def _create_sql_ignore_filters(self):
+        return [_create_filter_columns_not_null(self.column_name)]
+
     def _get_number_ko_sql(self) -> int:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_rows_ko_sql(negative_filter)
-
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].notnull() & (df[self.column_name].astype(str) != "")]
-        tag_check = COLUMN_CURRENT_CHECK
-        df[tag_check] = False
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
+
+    def _get_mask_dataframe(self) -> np.ndarray:
+        mask = self.table.get_mask_not_empthy(self.column_name)
+        values = self.table.df[self.column_name][mask]
+        check = np.zeros(values.shape[0], dtype=bool)
         if self.min_value is not None:
             if self.min_included:
-                df[tag_check] = df[self.column_name] < self.min_value
+                check |= (values < self.min_value).values
             else:
-                df[tag_check] = df[self.column_name] <= self.min_value
+                check |= (values <= self.min_value).values
         if self.max_value is not None:
             if self.max_included:
-                df[tag_check] = df[tag_check] | (df[self.column_name] > self.max_value)
+                check |= (values > self.max_value).values
             else:
-                df[tag_check] = df[tag_check] | (df[self.column_name] >= self.max_value)
-        df = df[df[tag_check]]
-        df.drop([tag_check], axis=1, inplace=True)
-        return df
+                check |= (values >= self.max_value).values
+        mask[mask] = check
+        return mask
 
 
 
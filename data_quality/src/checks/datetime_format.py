@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
@@ -14,26 +15,23 @@ class DatetimeFormat(Check):
                          [column_name])
         self.column_name = column_name
 
+    def _create_sql_negative_filter(self):
+        return self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[self.column_name]) + " is null"
+
+    def _create_sql_ignore_filters(self):
+        return [_create_filter_columns_not_null(self.column_name)]
+
     def _get_number_ko_sql(self) -> int:
-        negative_filter = self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[self.column_name]) + " is null"
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        negative_filter = self.table.source.cast_datetime_sql(self.column_name, self.table.datetime_columns[
-            self.column_name]) + " is null"
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        return self.standard_rows_ko_sql(negative_filter)
-
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].notnull() & (df[self.column_name].astype(str) != "")]
-        if self.table.datetime_columns[self.column_name] is not None:
-            check_column = pd.to_datetime(df[self.column_name], format=self.table.datetime_columns[self.column_name], errors="coerce")
-        else:
-            check_column = pd.to_datetime(df[self.column_name], errors="coerce")
-        df = df[check_column.isna()]
-        return df
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
+
+    def _get_mask_dataframe(self) -> np.ndarray:
+        mask = self.table.get_mask_not_empthy(self.column_name)
+        check_column = self.table.get_column_datetime(self.column_name, self.table.datetime_columns[self.column_name])
+        mask[mask] = check_column[mask].isna().values
+        return mask
 
 
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
@@ -13,26 +14,22 @@ class IndexNull(Check):
                          [table.index_column])
         self.index_column = table.index_column
 
+    def _create_sql_negative_filter(self):
+        return _create_filter_columns_null(self.index_column)
+
     def _get_number_ko_sql(self) -> int:
-        negative_filter = _create_filter_columns_null(self.index_column)
-        n_ko = self.standard_get_number_ko_sql(negative_filter)
-        if n_ko > 0:
-            self.table.index_problem = True
-        return n_ko
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        negative_filter = _create_filter_columns_null(self.index_column)
-        df_ko = self.standard_rows_ko_sql(negative_filter)
-        if df_ko.shape[0] > 0:
-            self.table.index_problem = True
-        return df_ko
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
 
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.index_column].isna() | (df[self.index_column].astype(str) == "")]
-        if df.shape[0] > 0:
+    def _set_result(self, n_ko, df_ko, flag_over_max_rows, ko_positions=None):
+        super()._set_result(n_ko, df_ko, flag_over_max_rows, ko_positions)
+        if n_ko > 0:
             self.table.index_problem = True
-        return df
+
+    def _get_mask_dataframe(self) -> np.ndarray:
+        return ~self.table.get_mask_not_empthy(self.index_column)
 
 
 
@@ -5,7 +5,8 @@ import pandas as pd
 
 from data_quality.src.check import Check
 from data_quality.src.utils import _create_filter_columns_not_null, _aggregate_sql_filter, _output_column_to_sql, \
-    _query_limit, _clean_string_float_inf_columns_df, _uniform_to_list
+    _query_limit, _uniform_to_list, _concatenate_key_columns, _key_literal_size, _chunk_keys_by_size, COLUMN_KEY, \
+    KEY_SEPARATOR, MAX_LITERAL_KEYS_BYTES, MAX_ARRAY_KEYS_BYTES, KEYS_CHUNK_BYTES, KEYS_CHUNK_SIZE
 
 
 class MatchDImensionTable(Check):
@@ -37,27 +38,65 @@ class MatchDImensionTable(Check):
 
         query = f"""
                 SELECT 
-                    CASE WHEN d.{self.primary_keys[0]} is null THEN "KO" ELSE "OK" END as check,
+                    CASE WHEN d.{self.primary_keys[0]} is null THEN 'KO' ELSE 'OK' END as check_result,
                     count(*) as n_rows
                 from 
                     (SELECT * FROM {self.table.db_name} {ignore_filters}) f
                 left join {self.dimension_table.db_name} d
                     on {join_keys}
-                GROUP BY check   
+                GROUP BY check_result   
                 """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
+        n_ok = df.loc[df["check_result"] == "OK", "n_rows"].values
         if len(n_ok) > 0:
             n_ok = n_ok[0]
         else:
             n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
             n_ko = 0
         return n_ko
 
+    def _get_key_sql(self, columns: list, table_tag: Union[str, None] = None) -> str:
+        prefix = f"{table_tag}." if table_tag is not None else ""
+        keys = [f"cast({prefix}{col} as string)" for col in columns]
+        if len(keys) == 1:
+            return keys[0]
+        return "CONCAT(" + f", '{KEY_SEPARATOR}', ".join(keys) + ")"
+
+    def _get_dimension_keys(self) -> list:
+        return list(self.dimension_table.get_key_index(self.primary_keys).keys)
+
+    def _get_dimension_keys_relation(self) -> Union[str, None]:
+        # Small key sets are inlined in a NOT IN list (None), larger ones are sent as chunks of arrays and
+        # the largest are uploaded to a staging table, if the source has an upload function. Sets are measured
+        # in bytes of literals, the dialects without arrays keep the NOT IN list when there is no staging table
+        keys = self._get_dimension_keys()
+        keys_size = sum([_key_literal_size(key) for key in keys])
+        if keys_size <= MAX_LITERAL_KEYS_BYTES:
+            return None
+        source = self.table.source
+        flag_upload = (keys_size > MAX_ARRAY_KEYS_BYTES) and (source.upload_dataframe_function is not None)
+        if (not flag_upload) and (source.keys_array_sql is None):
+            return None
+
+        def create_relation():
+            if flag_upload:
+                table_name = source.upload_dataframe_function(pd.DataFrame({COLUMN_KEY: keys}))
+                self.dimension_table.staging_tables.append((source, table_name))
+                return f"SELECT {COLUMN_KEY} FROM {table_name}"
+            return " UNION ALL ".join([source.keys_array_sql(chunk, COLUMN_KEY)
+                                       for chunk in _chunk_keys_by_size(keys, KEYS_CHUNK_BYTES)])
+        # The same relation is used by the count and the rows queries
+        return self.dimension_table._get_cached_column(
+            ("dimension_keys_relation", tuple(self.primary_keys), source), create_relation)
+
+    def _get_negative_condition_dimension_keys(self) -> str:
+        columns_keys = "','".join(self._get_dimension_keys())
+        return f"({self._get_key_sql(self.foreign_keys)} not in ('{columns_keys}'))"
+
     def _get_number_ko_sql_dimension_table_dataframe(self):
         ignore_filters = [_create_filter_columns_not_null(self.foreign_keys),
                           _create_filter_columns_not_null(self.columns_not_null),
@@ -65,35 +104,29 @@ class MatchDImensionTable(Check):
                           self.table.table_filter]
         ignore_filters = _aggregate_sql_filter(ignore_filters)
 
-        if len(self.foreign_keys) == 1:
-            negative_condition = f"(cast({self.foreign_keys[0]} as string)"
+        keys_relation = self._get_dimension_keys_relation()
+        if keys_relation is None:
+            query = f"""
+                    SELECT 
+                        CASE WHEN {self._get_negative_condition_dimension_keys()} THEN 'KO' ELSE 'OK' END as check_result,
+                        count(*) as n_rows
+                    from  {self.table.db_name} 
+                    {ignore_filters}
+                    GROUP BY check_result   
+                    """
         else:
-            negative_condition = [f"cast({self.foreign_keys[i]} as string)" for i in range(len(self.foreign_keys))]
-            negative_condition = "(CONCAT(" + ", '-', ".join(negative_condition) + ")"
-
-        negative_condition += " not in ('"
-        columns_keys = ""
-        for col in self.primary_keys:
-            columns_keys += _clean_string_float_inf_columns_df(self.dimension_table.df[col])
-        columns_keys = list(columns_keys.unique())
-        columns_keys = "','".join(columns_keys)
-        negative_condition += columns_keys + "'))"
-
-        query = f"""
-                SELECT 
-                    CASE WHEN {negative_condition} THEN "KO" ELSE "OK" END as check,
-                    count(*) as n_rows
-                from  {self.table.db_name} 
-                {ignore_filters}
-                GROUP BY check   
-                """
+            query = f"""
+                    SELECT 
+                        CASE WHEN k.{COLUMN_KEY} is null THEN 'KO' ELSE 'OK' END as check_result,
+                        count(*) as n_rows
+                    from 
+                        (SELECT * FROM {self.table.db_name} {ignore_filters}) f
+                    left join ({keys_relation}) k
+                        on {self._get_key_sql(self.foreign_keys, "f")} = k.{COLUMN_KEY}
+                    GROUP BY check_result   
+                    """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
-        if len(n_ok) > 0:
-            n_ok = n_ok[0]
-        else:
-            n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
@@ -132,37 +165,35 @@ class MatchDImensionTable(Check):
         return df
 
     def _get_rows_ko_sql_dimension_table_dataframe(self):
-
-        if len(self.foreign_keys) == 1:
-            negative_condition = f"(cast({self.foreign_keys[0]} as string)"
-        else:
-            negative_condition = [f"cast({self.foreign_keys[i]} as string)" for i in range(len(self.foreign_keys))]
-            negative_condition = "(CONCAT(" + ", '-', ".join(negative_condition) + ")"
-
-        negative_condition += " not in ('"
-        columns_keys = ""
-        for col in self.primary_keys:
-            columns_keys += _clean_string_float_inf_columns_df(self.dimension_table.df[col])
-        columns_keys = list(columns_keys.unique())
-        columns_keys = "','".join(columns_keys)
-        negative_condition += columns_keys + "'))"
-
+        keys_relation = self._get_dimension_keys_relation()
         ignore_filters = [_create_filter_columns_not_null(self.foreign_keys),
                           _create_filter_columns_not_null(self.columns_not_null),
                           self.ignore_filters,
-                          negative_condition,
                           self.table.table_filter]
-        ignore_filters = _aggregate_sql_filter(ignore_filters)
-
-        output_columns = _output_column_to_sql(self.table.output_columns)
         sql_limit = _query_limit(self.n_max_rows_output)
-        query = f"""
-                SELECT 
-                    {output_columns}
-                from {self.table.db_name}
-                {ignore_filters}
-                {sql_limit}
-                """
+        if keys_relation is None:
+            ignore_filters = _aggregate_sql_filter(ignore_filters + [self._get_negative_condition_dimension_keys()])
+            output_columns = _output_column_to_sql(self.table.output_columns)
+            query = f"""
+                    SELECT 
+                        {output_columns}
+                    from {self.table.db_name}
+                    {ignore_filters}
+                    {sql_limit}
+                    """
+        else:
+            ignore_filters = _aggregate_sql_filter(ignore_filters)
+            output_columns = _output_column_to_sql(self.table.output_columns, table_tag="f")
+            query = f"""
+                    SELECT 
+                        {output_columns}
+                    from 
+                        (SELECT * FROM {self.table.db_name} {ignore_filters}) f
+                    left join ({keys_relation}) k
+                        on {self._get_key_sql(self.foreign_keys, "f")} = k.{COLUMN_KEY}
+                    WHERE k.{COLUMN_KEY} is null 
+                    {sql_limit}
+                    """
         df = self.table.source.run_query(query)
         return df
 
@@ -172,59 +203,47 @@ class MatchDImensionTable(Check):
         else:
             return self._get_rows_ko_sql_dimension_table_sql()
 
+    @staticmethod
+    def _get_keys_relation_sql(source, keys: list) -> str:
+        # Dialects without arrays get one SELECT for each key
+        if source.keys_array_sql is None:
+            return " UNION ALL ".join([f"SELECT '{key}' as {COLUMN_KEY}" for key in keys])
+        return source.keys_array_sql(keys, COLUMN_KEY)
+
     def _get_rows_ko_dataframe_dimension_table_sql(self) -> pd.DataFrame:
         df = self.table.df
         if df.shape[0] > 0:
             for col in self.foreign_keys:
                 df = df[df[col].notnull() & (df[col].astype(str) != "")]
-            tag_key = "unique_concatenate_key_data_quality"
-            df[tag_key] = ""
-            for col in self.foreign_keys:
-                df[tag_key] += _clean_string_float_inf_columns_df(df[col])
-
-            values_list = list(df[tag_key].unique())
-            values_list = [f"(SELECT '{v}' as key_columns)" for v in values_list]
-            values_list = " union all ".join(values_list)
-
-            if len(self.primary_keys) == 1:
-                concat_columns = f"cast(d.{self.primary_keys[0]} as string)"
-            else:
-                concat_columns = [f"cast(d.{self.primary_keys[i]} as string)" for i in range(len(self.primary_keys))]
-                concat_columns = "(CONCAT(" + ", ".join(concat_columns) + ")"
-            query = f"""
-            SELECT 
-                f.key_columns
-            FROM (
-                {values_list} 
-            ) f
-            left join {self.dimension_table.db_name} d
-            on {concat_columns} = f.key_columns
-            WHERE d.{self.primary_keys[0]} is null
-            """
-            match_df = self.dimension_table.source.run_query(query)
-            df = df[df[tag_key].isin(match_df["key_columns"])]
-            df.drop([tag_key], axis=1, inplace=True)
+            keys = _concatenate_key_columns(df, self.foreign_keys)
+
+            # The distinct keys are looked up in batches run concurrently, only the unmatched ones come back
+            source = self.dimension_table.source
+            values_list = list(keys.unique())
+            queries = []
+            for i in range(0, len(values_list), KEYS_CHUNK_SIZE):
+                query = f"""
+                SELECT 
+                    f.{COLUMN_KEY}
+                FROM (
+                    {self._get_keys_relation_sql(source, values_list[i:i + KEYS_CHUNK_SIZE])} 
+                ) f
+                left join {self.dimension_table.db_name} d
+                on {self._get_key_sql(self.primary_keys, "d")} = f.{COLUMN_KEY}
+                WHERE d.{self.primary_keys[0]} is null
+                """
+                queries.append(query)
+            unmatched_keys = [match_df[COLUMN_KEY] for match_df in source.run_queries(queries)]
+            if len(unmatched_keys) > 0:
+                df = df[keys.isin(pd.concat(unmatched_keys))]
         return df
 
     def _get_rows_ko_dataframe_dimension_table_dataframe(self) -> pd.DataFrame:
         df = self.table.df
         for col in self.foreign_keys:
             df = df[df[col].notnull() & (df[col].astype(str) != "")]
-
-        tag_key = "unique_concatenate_key_data_quality"
-        df[tag_key] = ""
-
-        dimension_table = self.dimension_table.df.copy()
-        dimension_table[tag_key] = ""
-        for i in range(len(self.foreign_keys)):
-            foreign_keys_col = self.foreign_keys[i]
-            primary_keys_col = self.primary_keys[i]
-            df[tag_key] += _clean_string_float_inf_columns_df(df[foreign_keys_col])
-            dimension_table[tag_key] += _clean_string_float_inf_columns_df(dimension_table[primary_keys_col]) #dimension_table[primary_keys_col].astype(float, errors='ignore').astype(str)
-
-        df = df[~df[tag_key].isin(dimension_table[tag_key].unique())]
-        df.drop([tag_key], axis=1, inplace=True)
-        return df
+        key_index = self.dimension_table.get_key_index(self.primary_keys)
+        return df[key_index.get_codes(_concatenate_key_columns(df, self.foreign_keys)) < 0]
 
     def _get_rows_ko_dataframe(self) -> pd.DataFrame:
         if self.dimension_table.flag_dataframe:
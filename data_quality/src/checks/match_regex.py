@@ -1,5 +1,6 @@
 from typing import Union, Optional
 
+import numpy as np
 import pandas as pd
 import re
 
@@ -26,21 +27,23 @@ class MatchRegex(Check):
         regex = re.sub(r"(?<!\\)\\(?!\\)", r"\\\\", self.regex)
         return f" NOT {self.table.source.match_regex(self.column_name, regex, self.case_sensitive)} "
 
+    def _create_sql_negative_filter(self):
+        return self._create_filter()
+
+    def _create_sql_ignore_filters(self):
+        return [_create_filter_columns_not_null(self.column_name)]
+
     def _get_number_ko_sql(self) -> int:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_rows_ko_sql(negative_filter)
-
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].notnull() & (df[self.column_name].astype(str) != "")]
-        df = df[~df[self.column_name].astype(str).str.contains(self.regex, case=self.case_sensitive)]
-        return df
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
+
+    def _get_mask_dataframe(self) -> np.ndarray:
+        column = self.table.get_column_string(self.column_name)
+        mask = self.table.get_mask_not_empthy(self.column_name)
+        mask[mask] = ~column[mask].str.contains(self.regex, case=self.case_sensitive).values
+        return mask
 
 
 
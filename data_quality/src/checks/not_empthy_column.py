@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
@@ -15,18 +16,17 @@ class NotEmpthyColumn(Check):
 
         self.column_name = column_name
 
+    def _create_sql_negative_filter(self):
+        return _create_filter_columns_null(self.column_name)
+
     def _get_number_ko_sql(self) -> int:
-        negative_filter = _create_filter_columns_null(self.column_name)
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        negative_filter = _create_filter_columns_null(self.column_name)
-        return self.standard_rows_ko_sql(negative_filter)
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
 
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].isna() | (df[self.column_name].astype(str) == "")]
-        return df
+    def _get_mask_dataframe(self) -> np.ndarray:
+        return ~self.table.get_mask_not_empthy(self.column_name)
 
 
 
@@ -5,9 +5,11 @@ import numpy as np
 
 from data_quality.src.check import Check
 from data_quality.src.utils import _aggregate_sql_filter, _output_column_to_sql, _query_limit, \
-    _create_filter_columns_not_null, _clean_string_float_inf_columns_df
+    _create_filter_columns_not_null
 
 TAG_FORMATTED = "_custom_formatted"
+COLUMN_MAX_END = "max_end_data_quality"
+COLUMN_NEXT_START = "next_start_data_quality"
 
 
 class PeriodIntersection(Check):
@@ -28,26 +30,32 @@ class PeriodIntersection(Check):
         self.extremes_exclude = extremes_exclude
         self.operator = ">=" if extremes_exclude else ">"
 
-    def _sql_check_previus_query(self):
-        if self.id_columns is not None:
-            query = f"""
-            coalesce(case when lag(sql_id_columns) over (order by sql_id_columns, {self.start_date}{TAG_FORMATTED}) = sql_id_columns
-                THEN lag({self.end_date}{TAG_FORMATTED}) over (order by sql_id_columns, {self.start_date}{TAG_FORMATTED})
-                else null end {self.operator} {self.start_date}{TAG_FORMATTED}, false)
-            """
-        else:
-            query = f"""
-            coalesce(lag({self.end_date}{TAG_FORMATTED}) over (order by {self.start_date}{TAG_FORMATTED})
-                {self.operator} {self.start_date}{TAG_FORMATTED}, false)
+    def _get_id_columns(self) -> list:
+        if self.id_columns is None:
+            return []
+        if isinstance(self.id_columns, str):
+            return [self.id_columns]
+        return self.id_columns
+
+    def _sql_window(self) -> str:
+        # Periods are compared only inside the same ids, so the window can be computed by partition
+        id_columns = self._get_id_columns()
+        partition = f"PARTITION BY {', '.join(id_columns)} " if len(id_columns) > 0 else ""
+        return f"{partition}ORDER BY {self.start_date}{TAG_FORMATTED}, {self.end_date}{TAG_FORMATTED}"
+
+    def _sql_sweep_columns(self) -> str:
+        # Running max of the ends (sweep line), the previous row value is compared with the start of the row
+        return f"""
+            max({self.end_date}{TAG_FORMATTED}) over ({self._sql_window()} 
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) as {COLUMN_MAX_END},
+            lead({self.start_date}{TAG_FORMATTED}) over ({self._sql_window()}) as {COLUMN_NEXT_START}
             """
-        return query
 
-    def _sql_check_next_query(self):
-        if self.id_columns is not None:
-            query = f"""check OR (LEAD(check) over (order by sql_id_columns, {self.start_date}{TAG_FORMATTED}))"""
-        else:
-            query = f"""check OR (LEAD(check) over (order by {self.start_date}{TAG_FORMATTED}))"""
-        return query
+    def _sql_check_query(self) -> str:
+        return f"""
+            coalesce(lag({COLUMN_MAX_END}) over ({self._sql_window()}) {self.operator} {self.start_date}{TAG_FORMATTED}, false)
+            OR coalesce({self.end_date}{TAG_FORMATTED} {self.operator} {COLUMN_NEXT_START}, false)
+            """
 
     def _get_number_ko_sql(self) -> int:
         ignore_filters = [_create_filter_columns_not_null(self.columns_not_null),
@@ -59,31 +67,24 @@ class PeriodIntersection(Check):
                                                                  self.table.datetime_columns[self.start_date])
         cast_ending_date = self.table.source.cast_datetime_sql(self.end_date,
                                                                self.table.datetime_columns[self.end_date])
-        if self.id_columns is None:
-            sql_id_columns = ""
-        elif isinstance(self.id_columns, str):
-            sql_id_columns = f"{self.id_columns} as sql_id_columns,"
-        else:
-            sql_id_columns = [f"cast({col} as string)" for col in self.id_columns]
-            sql_id_columns = "CONCAT(" + ", '-', ".join(sql_id_columns) + ") as sql_id_columns,"
+        id_columns = "".join([f"{col}, " for col in self._get_id_columns()])
 
         query = f"""
                 SELECT 
-                    CASE WHEN double_check THEN "KO" ELSE "OK" END as check,
+                    CASE WHEN double_check THEN 'KO' ELSE 'OK' END as check_result,
                     count(*) as n_rows
                 from (
                     SELECT
-                        *,
-                        {self._sql_check_next_query()}  as double_check,
+                        {self._sql_check_query()} as double_check
                     from (
                         SELECT 
-                            {"sql_id_columns," if self.id_columns is not None else ""}
+                            {id_columns}
                             {self.start_date}{TAG_FORMATTED},
                             {self.end_date}{TAG_FORMATTED},
-                            {self._sql_check_previus_query()} as check
+                            {self._sql_sweep_columns()}
                         from (
                             SELECT
-                                {sql_id_columns}
+                                {id_columns}
                                 {cast_starting_date} as {self.start_date}{TAG_FORMATTED},
                                 {cast_ending_date} as {self.end_date}{TAG_FORMATTED}
                             from {self.table.db_name}
@@ -91,15 +92,15 @@ class PeriodIntersection(Check):
                             ) as cast_table
                     ) as check_table_data_quality
                 ) as check_table_data_quality
-                group by check
+                group by check_result
                 """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
+        n_ok = df.loc[df["check_result"] == "OK", "n_rows"].values
         if len(n_ok) > 0:
             n_ok = n_ok[0]
         else:
             n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
@@ -118,28 +119,20 @@ class PeriodIntersection(Check):
                                                                  self.table.datetime_columns[self.start_date])
         cast_ending_date = self.table.source.cast_datetime_sql(self.end_date,
                                                                self.table.datetime_columns[self.end_date])
-        if self.id_columns is None:
-            sql_id_columns = ""
-        elif isinstance(self.id_columns, str):
-            sql_id_columns = f"{self.id_columns} as sql_id_columns,"
-        else:
-            sql_id_columns = [f"cast({col} as string)" for col in self.id_columns]
-            sql_id_columns = "CONCAT(" + ", '-', ".join(sql_id_columns) + ") as sql_id_columns,"
         query = f"""
         SELECT
             {output_columns}
         from (
             SELECT 
                  *,
-                 {self._sql_check_next_query()}  as double_check
+                 {self._sql_check_query()} as double_check
             FROM (   
                 SELECT 
                     *,
-                    {self._sql_check_previus_query()} as check
+                    {self._sql_sweep_columns()}
                 from (
                     SELECT
                         *,
-                        {sql_id_columns}
                         {cast_starting_date} as {self.start_date}{TAG_FORMATTED},
                         {cast_ending_date} as {self.end_date}{TAG_FORMATTED}
                     from {self.table.db_name}
@@ -151,55 +144,38 @@ class PeriodIntersection(Check):
         {sql_limit}
         """
         df = self.table.source.run_query(query)
-        drop_column = ["double_check", "check", "sql_id_columns", f"{self.start_date}{TAG_FORMATTED}", f"{self.end_date}{TAG_FORMATTED}"]
+        drop_column = ["double_check", COLUMN_MAX_END, COLUMN_NEXT_START, f"{self.start_date}{TAG_FORMATTED}", f"{self.end_date}{TAG_FORMATTED}"]
         for col in drop_column:
             if col in df.columns:
                 df.drop([col], axis=1, inplace=True)
         return df
 
     def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df[self.start_date] = pd.to_datetime(df[self.start_date], errors="coerce")
-        df[self.end_date] = pd.to_datetime(df[self.end_date], errors="coerce")
+        df = self.table.df.assign(**{self.start_date: self.table.get_column_datetime(self.start_date),
+                                     self.end_date: self.table.get_column_datetime(self.end_date)})
         df = df[df[self.start_date].notnull() & df[self.end_date].notnull()]
-        if self.id_columns is not None:
-            if isinstance(self.id_columns, str):
-                id_columns = [self.id_columns]
-            else:
-                id_columns = self.id_columns
-            index_column = "id_column_data_quality"
-            df[index_column] = ""
-            for col in id_columns:
-                df[index_column] += _clean_string_float_inf_columns_df(df[col])
-
-            df = df.sort_values([index_column, self.start_date])
-            prev_column = "previous_ending_data_quality"
-            next_column = "next_starting_data_quality"
-            df[prev_column] = np.where(df[index_column].shift(1) == df[index_column],
-                                       df[self.end_date].shift(1),
-                                       None)
-            df[next_column] = np.where(df[index_column].shift(-1) == df[index_column],
-                                       df[self.start_date].shift(-1),
-                                       None)
+        start = df[self.start_date].values.astype("datetime64[ns]").view("int64")
+        end = df[self.end_date].values.astype("datetime64[ns]").view("int64")
+        id_columns = self._get_id_columns()
+        if len(id_columns) > 0:
+            group = df.groupby(id_columns, sort=False, dropna=False).ngroup().values
         else:
-            df = df.sort_values([self.start_date])
-            prev_column = "previous_ending_data_quality"
-            next_column = "next_starting_data_quality"
-            df[prev_column] = df[self.end_date].shift(1)
-            df[next_column] = df[self.start_date].shift(-1)
-
-        df[prev_column] = pd.to_datetime(df[prev_column], errors="coerce")
-        df[next_column] = pd.to_datetime(df[next_column], errors="coerce")
+            group = np.zeros(df.shape[0], dtype=np.int64)
+
+        # Sweep line on the periods sorted by id and start: a period overlaps a previous one if it starts before
+        # the max end seen so far in its group, and a following one if it ends after the next start
+        order = np.lexsort((end, start, group))
+        group, start, end = group[order], start[order], end[order]
+        first_in_group = np.r_[True, group[1:] != group[:-1]]
+        last_in_group = np.r_[first_in_group[1:], True]
+        max_end = pd.Series(end).groupby(group).cummax().values
+        previous_max_end = np.r_[np.iinfo(np.int64).min, max_end[:-1]]
+        previous_max_end[first_in_group] = np.iinfo(np.int64).min
+        next_start = np.r_[start[1:], np.iinfo(np.int64).max]
+        next_start[last_in_group] = np.iinfo(np.int64).max
 
         if self.extremes_exclude:
-            df = df[(df[prev_column] >= df[self.start_date]) | (df[self.end_date] >= df[next_column])]
+            mask = (previous_max_end >= start) | (end >= next_start)
         else:
-            df = df[(df[prev_column] > df[self.start_date]) | (df[self.end_date] > df[next_column])]
-        df.drop([prev_column, next_column], axis=1, inplace=True)
-        if self.id_columns is not None:
-            df.drop([index_column], axis=1, inplace=True)
-        return df
-
-
-
-
+            mask = (previous_max_end > start) | (end > next_start)
+        return df.iloc[np.sort(order[mask])]
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
@@ -9,11 +10,20 @@ class ValuesDuplicate(Check):
 
     def __init__(self,
                  table,
-                 column_name):
+                 column_name,
+                 approximate: bool = False):
         super().__init__(table,
                          "Duplicated index",
                          [column_name])
         self.column = column_name
+        self.approximate = approximate
+
+    def _count_distinct_sql(self) -> str:
+        # The approximate distinct count avoids the exact hash aggregation on big tables, the number of KO
+        # rows is then an estimate
+        if self.approximate and (self.table.source.approx_count_distinct_sql is not None):
+            return self.table.source.approx_count_distinct_sql(self.column)
+        return f"count(DISTINCT {self.column})"
 
     def _get_number_ko_sql(self) -> int:
         ignore_filters = [_create_filter_columns_not_null(self.column),
@@ -24,7 +34,7 @@ class ValuesDuplicate(Check):
         query = f"""
                 SELECT 
                     count(*) as n_rows,
-                    count(DISTINCT {self.column}) as n_distinct_index   
+                    {self._count_distinct_sql()} as n_distinct_index   
                 from {self.table.db_name}
                 {ignore_filters}
                 """
@@ -32,7 +42,7 @@ class ValuesDuplicate(Check):
         n_not_null_index = df["n_rows"].values[0]
         n_distinct_index = df["n_distinct_index"].values[0]
         n_ok = n_distinct_index
-        n_ko = n_not_null_index - n_distinct_index
+        n_ko = max(n_not_null_index - n_distinct_index, 0)
         if n_ko > 0:
             self.table.index_problem = True
         return n_ko
@@ -64,16 +74,12 @@ class ValuesDuplicate(Check):
             self.table.index_problem = True
         return df
 
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column].notnull() & (df[self.column].astype(str) != "")]
-        tag_count_index = "n_distinct_index_data_quality"
-        df[tag_count_index] = df.groupby(self.column)[self.column].transform("count")
-        df = df[df[tag_count_index] > 1]
-        df.drop([tag_count_index], axis=1, inplace=True)
-        if df.shape[0] > 0:
+    def _get_mask_dataframe(self) -> np.ndarray:
+        mask = self.table.get_mask_not_empthy(self.column)
+        mask[mask] = self.table.df[self.column][mask].duplicated(keep=False).values
+        if mask.any():
             self.table.index_problem = True
-        return df
+        return mask
 
 
 
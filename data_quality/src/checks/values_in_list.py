@@ -1,5 +1,6 @@
 from typing import Union, Optional
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
@@ -32,26 +33,27 @@ class ValuesInList(Check):
             list_values_sql = "('" + "','".join(values_list) + "')"
             return f"lower(cast({self.column_name} as STRING)) not in {list_values_sql}"
 
+    def _create_sql_negative_filter(self):
+        return self._create_filter()
+
+    def _create_sql_ignore_filters(self):
+        return [_create_filter_columns_not_null(self.column_name)]
+
     def _get_number_ko_sql(self) -> int:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_get_number_ko_sql(negative_filter)
+        return self.standard_get_number_ko_sql(self._create_sql_negative_filter())
 
     def _get_rows_ko_sql(self) -> pd.DataFrame:
-        self.add_ignore_filter(_create_filter_columns_not_null(self.column_name))
-        negative_filter = self._create_filter()
-        return self.standard_rows_ko_sql(negative_filter)
+        return self.standard_rows_ko_sql(self._create_sql_negative_filter())
 
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        df = df[df[self.column_name].notnull() & (df[self.column_name].astype(str) != "")]
+    def _get_mask_dataframe(self) -> np.ndarray:
+        mask = self.table.get_mask_not_empthy(self.column_name)
         if self.case_sensitive:
             values_list = [str(v) for v in self.values_list]
-            df = df[~df[self.column_name].astype(str).isin(values_list)]
+            mask &= ~self.table.get_column_string(self.column_name).isin(values_list).values
         else:
             values_list = [str(v).lower() for v in self.values_list]
-            df = df[~df[self.column_name].astype(str).str.lower().isin(values_list)]
-        return df
+            mask &= ~self.table.get_column_string(self.column_name, lower=True).isin(values_list).values
+        return mask
 
 
 
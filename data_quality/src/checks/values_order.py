@@ -1,11 +1,12 @@
 from typing import Union, Optional
 from datetime import date, datetime
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.check import Check
 from data_quality.src.utils import _aggregate_sql_filter, _output_column_to_sql, _query_limit, \
-    _create_filter_columns_not_null, COLUMN_CURRENT_CHECK
+    _create_filter_columns_not_null
 
 TAG_FORMATTED = "_custom_formatted"
 
@@ -49,7 +50,7 @@ class ValuesOrder(Check):
         sql_cast_values = self._cast_values_sql()
         query = f"""
                 SELECT 
-                    CASE WHEN {sql_filter} THEN "KO" ELSE "OK" END as check,
+                    CASE WHEN {sql_filter} THEN 'KO' ELSE 'OK' END as check_result,
                     count(*) as n_rows
                 from (
                     SELECT
@@ -57,15 +58,15 @@ class ValuesOrder(Check):
                     from {self.table.db_name}
                     {ignore_filters}
                     ) as cast_table
-                group by check
+                group by check_result
                 """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
+        n_ok = df.loc[df["check_result"] == "OK", "n_rows"].values
         if len(n_ok) > 0:
             n_ok = n_ok[0]
         else:
             n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
@@ -101,21 +102,16 @@ class ValuesOrder(Check):
                 df.drop([col + TAG_FORMATTED], axis=1, inplace=True)
         return df
 
-    def _get_rows_ko_dataframe(self) -> pd.DataFrame:
-        df = self.table.df
-        tag_check = COLUMN_CURRENT_CHECK
-        df[tag_check] = False
-        for col in self.ascending_columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-        for i in range(1, len(self.ascending_columns)):
+    def _get_mask_dataframe(self) -> np.ndarray:
+        columns = [self.table.get_column_numeric(col) for col in self.ascending_columns]
+        mask = np.zeros(self.table.df.shape[0], dtype=bool)
+        for i in range(1, len(columns)):
             for j in range(i):
                 if self.strictly_ascending:
-                    df[tag_check] = df[tag_check] | (df[self.ascending_columns[j]] >= df[self.ascending_columns[i]])
+                    mask |= (columns[j] >= columns[i]).values
                 else:
-                    df[tag_check] = df[tag_check] | (df[self.ascending_columns[j]] > df[self.ascending_columns[i]])
-        df = df[df[tag_check]]
-        df.drop([tag_check], axis=1, inplace=True)
-        return df
+                    mask |= (columns[j] > columns[i]).values
+        return mask
 
 
 
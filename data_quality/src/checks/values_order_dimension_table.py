@@ -4,7 +4,7 @@ import pandas as pd
 
 from data_quality.src.check import Check
 from data_quality.src.utils import _create_filter_columns_not_null, _aggregate_sql_filter, _output_column_to_sql, \
-    _query_limit, _clean_string_float_inf_columns_df, _uniform_to_list
+    _query_limit, _uniform_to_list, _concatenate_key_columns
 
 
 class ValuesOrderDimensionTable(Check):
@@ -69,21 +69,21 @@ class ValuesOrderDimensionTable(Check):
 
         query = f"""
                 SELECT 
-                    CASE WHEN {negative_filter} THEN "KO" ELSE "OK" END as check,
+                    CASE WHEN {negative_filter} THEN 'KO' ELSE 'OK' END as check_result,
                     count(*) as n_rows
                 from 
                     (SELECT * FROM {self.table.db_name} {ignore_filters}) left_table
                 left join {self.dimension_table.db_name} right_table
                     on {join_keys}
-                GROUP BY check   
+                GROUP BY check_result   
                 """
         df = self.table.source.run_query(query)
-        n_ok = df.loc[df["check"] == "OK", "n_rows"].values
+        n_ok = df.loc[df["check_result"] == "OK", "n_rows"].values
         if len(n_ok) > 0:
             n_ok = n_ok[0]
         else:
             n_ok = 0
-        n_ko = df.loc[df["check"] == "KO", "n_rows"].values
+        n_ko = df.loc[df["check_result"] == "KO", "n_rows"].values
         if len(n_ko) > 0:
             n_ko = n_ko[0]
         else:
@@ -155,24 +155,15 @@ class ValuesOrderDimensionTable(Check):
         for col in self.foreign_keys:
             df = df[df[col].notnull() & (df[col].astype(str) != "")]
 
-        tag_key = "unique_concatenate_key_data_quality"
-        df[tag_key] = ""
-
-        dimension_table = self.dimension_table.df.copy()
-        dimension_table[tag_key] = ""
-        for i in range(len(self.foreign_keys)):
-            foreign_keys_col = self.foreign_keys[i]
-            primary_keys_col = self.primary_keys[i]
-            df[tag_key] += _clean_string_float_inf_columns_df(df[foreign_keys_col])
-            dimension_table[tag_key] += _clean_string_float_inf_columns_df(dimension_table[primary_keys_col])
-        dimension_table = dimension_table[[tag_key, self.right_column]]
-        dimension_table.columns = [tag_key, "right_table_" + self.right_column]
-        df = df.merge(dimension_table, on=tag_key, how="inner")
+        # Inner join on the key index of the dimension table, shared with the other checks on the same keys
+        key_index = self.dimension_table.get_key_index(self.primary_keys)
+        left_positions, right_positions = key_index.join(_concatenate_key_columns(df, self.foreign_keys))
+        df = df.iloc[left_positions].reset_index(drop=True)
+        df["right_table_" + self.right_column] = self.dimension_table.df[self.right_column].values[right_positions]
         df = df[df[self.left_column].notnull() & (df[self.left_column].astype(str) != "")]
         df = df[df["right_table_" + self.right_column].notnull() & (df["right_table_" + self.right_column].astype(str) != "")]
         pandas_operator = self.operator if self.operator != "=" else "=="
         df = df.query(f"{self.left_column} {pandas_operator} {'right_table_' + self.right_column}")
-        df.drop([tag_key], axis=1, inplace=True)
         if self.right_column in df.columns:
             right_column_output_name = f"{self.right_column}_2"
         else:
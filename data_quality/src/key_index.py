@@ -0,0 +1,28 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class KeyIndex(object):
+    def __init__(self, keys: pd.Series):
+        # Distinct keys of the table and, grouped by key, the positions of its rows
+        codes, uniques = pd.factorize(keys.values)
+        self.keys = pd.Index(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        self.offsets = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+
+    def get_codes(self, keys: pd.Series) -> np.ndarray:
+        # Position of each key in the distinct keys, -1 if the key is not in the table
+        return self.keys.get_indexer(keys.values)
+
+    def join(self, keys: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        # Row positions of an inner join: every key is repeated for each row of the table with that key,
+        # the left rows keep their order
+        codes = self.get_codes(keys)
+        left_positions = np.flatnonzero(codes >= 0)
+        starts = self.offsets[codes[left_positions]]
+        counts = self.offsets[codes[left_positions] + 1] - starts
+        left_positions = np.repeat(left_positions, counts)
+        right_positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return left_positions, self.order[right_positions]
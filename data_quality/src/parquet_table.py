@@ -0,0 +1,166 @@
+import ast
+import asyncio
+import operator
+from typing import Union, List, Dict
+
+from data_quality.src.table import Table
+from data_quality.src.utils import _referenced_columns
+
+_COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge
+}
+_SWAPPED_OPERATORS = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+
+
+def _open_dataset(path: str):
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise Exception("pyarrow is required to read parquet files.")
+    return ds.dataset(path, format="parquet")
+
+
+def _literal(node):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        return -node.operand.value
+    raise ValueError("Not a literal")
+
+
+def _filter_to_expression(node, field):
+    # Only conjunctions of comparisons between a column and literals are pushed down, any other
+    # part of the filter is left to the pandas query run after the read
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        expressions = [_filter_to_expression(v, field) for v in node.values]
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        expressions = [_filter_to_expression(node.left, field), _filter_to_expression(node.right, field)]
+    elif isinstance(node, ast.Compare) and (len(node.ops) == 1):
+        left, op, right = node.left, type(node.ops[0]), node.comparators[0]
+        try:
+            if isinstance(left, ast.Name) and op in (ast.In, ast.NotIn):
+                values = [_literal(v) for v in right.elts] if isinstance(right, (ast.List, ast.Tuple)) else None
+                if values is None:
+                    return None
+                expression = field(left.id).isin(values)
+                return ~expression if op == ast.NotIn else expression
+            if isinstance(right, ast.Name) and not isinstance(left, ast.Name):
+                left, right = right, left
+                op = _SWAPPED_OPERATORS.get(op, op)
+            if isinstance(left, ast.Name) and (op in _COMPARE_OPERATORS):
+                expression = _COMPARE_OPERATORS[op](field(left.id), _literal(right))
+                # Arrow drops the nulls of a comparison, pandas keeps them with !=
+                return expression | field(left.id).is_null() if op == ast.NotEq else expression
+        except ValueError:
+            pass
+        return None
+    else:
+        return None
+    expressions = [e for e in expressions if e is not None]
+    if len(expressions) == 0:
+        return None
+    result = expressions[0]
+    for expression in expressions[1:]:
+        result = result & expression
+    return result
+
+
+def _create_pushdown_filter(table_filter: Union[str, None], column_names: set):
+    if table_filter is None:
+        return None
+    import pyarrow.dataset as ds
+    try:
+        node = ast.parse(table_filter.strip(), mode="eval").body
+    except SyntaxError:
+        return None
+
+    def field(name):
+        if name not in column_names:
+            raise ValueError("Unknown column")
+        return ds.field(name)
+
+    return _filter_to_expression(node, field)
+
+
+class ParquetTable(Table):
+    def __init__(self,
+                 path: str,
+                 index_column: str = None,
+                 output_name: str = None,
+                 not_empthy_columns: Union[str, list] = None,
+                 datetime_columns: Union[str, list, None] = None,
+                 datetime_formats: Union[str, list, None] = None,
+                 table_filter: str = None,
+                 output_columns: Union[List[str], str] = None,
+                 n_max_rows_output: int = None,
+                 get_rows_flag: Union[bool, None] = None):
+        # Only the schema is read here: data is read at run time with the columns used by the planned checks
+        self.path = path
+        self.dataset = _open_dataset(path)
+        self.loaded_columns = None
+        super().__init__(df=self.dataset.schema.empty_table().to_pandas(),
+                         index_column=index_column,
+                         output_name=output_name,
+                         not_empthy_columns=not_empthy_columns,
+                         datetime_columns=datetime_columns,
+                         datetime_formats=datetime_formats,
+                         table_filter=table_filter,
+                         output_columns=output_columns,
+                         n_max_rows_output=n_max_rows_output,
+                         get_rows_flag=get_rows_flag,
+                         deferred=True)
+
+    def _keep_rows(self, get_rows_flag: Union[bool, None]) -> bool:
+        # Like DataFrame tables, KO rows are kept unless they are explicitly not wanted
+        if get_rows_flag is None:
+            get_rows_flag = self.get_rows_flag
+        return get_rows_flag is not False
+
+    def get_needed_columns(self, planned_checks: list) -> List[str]:
+        column_names = list(self.dataset.schema.names)
+        column_set = set(column_names)
+        needed_columns = _referenced_columns([self.index_column, self.not_empthy_columns, self.datetime_columns,
+                                              self.table_filter], column_set)
+        for check, get_rows_flag in planned_checks:
+            # KO rows of a check without output columns have all the columns of the table
+            if (check.output_columns is None) and self._keep_rows(get_rows_flag):
+                return column_names
+            needed_columns |= check.get_referenced_columns(column_set)
+        return [col for col in column_names if col in needed_columns]
+
+    def create_pushdown_filter(self):
+        return _create_pushdown_filter(self.table_filter, set(self.dataset.schema.names))
+
+    def load(self, planned_checks: list):
+        # The KO rows of the checks already run are taken from the current frame before it is replaced
+        columns = self.get_needed_columns(planned_checks + [(check, False) for check in self.check_list])
+        if (self.loaded_columns is not None) and set(columns).issubset(self.loaded_columns):
+            return
+        df = self.dataset.to_table(columns=columns, filter=self.create_pushdown_filter()).to_pandas()
+        if self.table_filter is not None:
+            df = df.query(self.table_filter)
+        self._set_df(df)
+        self.get_number_of_rows()
+        self.loaded_columns = columns
+
+    def _drop_ko_rows(self, planned_checks: list):
+        # The frame may not have the columns of these rows
+        for check, get_rows_flag in planned_checks:
+            if not self._keep_rows(get_rows_flag):
+                check.ko_rows = None
+
+    def _submit_planned_checks(self, planned_checks: list, fused_n_ko: Dict) -> list:
+        self.load(planned_checks)
+        jobs = super()._submit_planned_checks(planned_checks, fused_n_ko)
+        self._drop_ko_rows(planned_checks)
+        return jobs
+
+    async def _arun_planned_checks(self, semaphore: asyncio.Semaphore, planned_checks: list):
+        self.load(planned_checks)
+        await super()._arun_planned_checks(semaphore, planned_checks)
+        self._drop_ko_rows(planned_checks)
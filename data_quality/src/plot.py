@@ -79,6 +79,27 @@ def _create_gauge_plot(percertage: Union[float, List[float]],
     return p
 
 
+def _format_count(table, n: int) -> str:
+    # Counts of a sampled table are scaled to the whole table
+    if table.sample_rate is None:
+        return _human_format(n)
+    return "≈" + _human_format(n / table.sample_rate)
+
+
+def _format_check_count(table, check) -> str:
+    # The estimate of a sampled check comes with its confidence interval
+    if (table.sample_rate is None) or (check.n_ko_lower is None):
+        return _format_count(table, check.n_ko)
+    return f"≈{_human_format(check.n_ko_estimate)}<br><span style='font-size:12pt'>" \
+           f"[{_human_format(check.n_ko_lower)} - {_human_format(check.n_ko_upper)}]</span>"
+
+
+def _format_perc(table, perc: float) -> str:
+    if table.sample_rate is None:
+        return _human_format_perc(perc)
+    return "≈" + _human_format_perc(perc)
+
+
 def create_allert_icon(warning=False, size=40):
     p = figure(x_range=(-1.05, 1.05), y_range=(-1.05, 1.05),
                plot_width=size, plot_height=size,
@@ -157,7 +178,7 @@ def plot_table_results(table,
               text_color="black"))
 
     p.add_layout(
-        Label(x=0.01, y=0.5, text=f"Total number of rows: {_human_format(table.n_rows)}",
+        Label(x=0.01, y=0.5, text=f"Total number of rows: {_format_count(table, table.n_rows)}",
               text_font_style="bold",
               text_font_size="20pt",
               text_baseline="middle",
@@ -181,19 +202,21 @@ def plot_table_results(table,
                   text_align="left",
                   text_color="black"))
 
-    if not table.over_n_max_rows_output(consider_warnings=False):
+    if table.number_unique_rows_ko is not None:
         n_problems = table.number_unique_rows_ko
-        text = f"# Rows with a problem: {_human_format(n_problems)}"
+        text = f"# Rows with a problem: {_format_count(table, n_problems)}"
         prefix = ""
     else:
         max_n_problems = min(table.total_number_ko, table.n_rows)
         min_n_problems = table.max_number_ko
         n_problems = min_n_problems
-        text = f"Total number of Problems: {_human_format(table.total_number_ko)}"
+        text = f"Total number of Problems: {_format_count(table, table.total_number_ko)}"
         if (max_n_problems - min_n_problems) / table.n_rows > 0.01:
             prefix = ">"
         else:
             prefix = "≈"
+    if table.sample_rate is not None:
+        prefix = prefix if prefix != "" else "≈"
     p.add_layout(
         Label(x=0.5, y=0.5, text=text,
               text_font_style="bold",
@@ -203,15 +226,15 @@ def plot_table_results(table,
               text_color="black"))
 
     if show_warning:
-        if not table.over_n_max_rows_output(consider_warnings=True):
+        if table.number_unique_rows_warning is not None:
             n_warning = table.number_unique_rows_warning
-            text = f"# Rows with a warning: {_human_format(n_warning)}"
+            text = f"# Rows with a warning: {_format_count(table, n_warning)}"
             #prefix = ""
         else:
             max_n_warnings = min(table.total_number_warnings, table.n_rows)
             min_n_warnings = table.max_number_warnings
             n_warning = min_n_warnings
-            text = f"Total number of Warnings: {_human_format(n_warning)}"
+            text = f"Total number of Warnings: {_format_count(table, n_warning)}"
             # if (max_n_warnings - min_n_warnings) / table.n_rows > 0.01:
             #     prefix = ">"
             # else:
@@ -247,14 +270,16 @@ def plot_table_results(table,
             warning_icon_size = 40 if show_warning else 0
             width_labels = WIDTH - warning_icon_size
             check_label = Div(text=check.check_description, width=int(width_labels * 2 / 3), style={'font-size': '20pt'})
-            n_check_label = Div(text=_human_format(check.n_ko), width=int(width_labels / 6), style={'font-size': '30pt'})
-            perc_label = Div(text=_human_format_perc(perc_ko), width=int(width_labels / 6), style={'font-size': '30pt'})
+            n_check_label = Div(text=_format_check_count(table, check), width=int(width_labels / 6), style={'font-size': '30pt'})
+            perc_label = Div(text=_format_perc(table, perc_ko), width=int(width_labels / 6), style={'font-size': '30pt'})
             warning_icon = create_allert_icon(check.flag_warning, size=warning_icon_size)
 
             p = row(warning_icon, check_label, n_check_label, perc_label)
 
-            if (check.ko_rows is not None) and (check.ko_rows.shape[0] > 0):
-                df_plot = check.ko_rows.drop([TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, TAG_FLAG_WARNING], axis=1)
+            ko_rows = check.ko_rows
+            if (ko_rows is not None) and (ko_rows.shape[0] > 0):
+                df_plot = ko_rows.drop([TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, TAG_FLAG_WARNING], axis=1,
+                                       errors="ignore")
                 if n_max_rows_output is not None:
                     df_plot = df_plot.head(n_max_rows_output)
                 df_plot.replace("", pd.NA, inplace=True)
@@ -0,0 +1,155 @@
+import os
+import copy
+import tempfile
+from typing import Union, List, Dict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_quality.src.check import Check
+from data_quality.src.table import Table
+from data_quality.src.checks.values_duplicate import ValuesDuplicate
+
+# Checks whose mask depends on rows of other partitions are computed on the whole column by one worker
+WHOLE_COLUMN_CHECKS = (ValuesDuplicate,)
+ARROW_FILE_CACHE_KEY = ("process_arrow_file",)
+
+
+def _compute_masks_worker(path: str, table_settings: dict, check_list: list, start: int, stop: int):
+    import pyarrow as pa
+    # The file is memory-mapped: every worker reads the same pages and converts only its slice
+    arrow_table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all().slice(start, stop - start)
+    table = Table(df=arrow_table.to_pandas(), **table_settings)
+    masks = []
+    for check in check_list:
+        check.table = table
+        mask = check._get_mask_dataframe()
+        masks.append(None if mask is None else np.packbits(mask))
+    return masks, table.index_problem
+
+
+class _ArrowFile(object):
+    # Columns of the frame written once for the workers, the file is removed with the object
+    def __init__(self, arrow_table, columns: List[str], directory: Union[str, None]):
+        import pyarrow as pa
+        file_descriptor, self.path = tempfile.mkstemp(suffix=".arrow", dir=directory)
+        os.close(file_descriptor)
+        with pa.OSFile(self.path, "wb") as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        self.columns = set(columns)
+        self.column_names = arrow_table.column_names
+
+    def __del__(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _detach_check(check: Check) -> Check:
+    # Copy sent to the workers without the table and its frame
+    check = copy.copy(check)
+    check.table = None
+    check._ko_rows = None
+    check.ko_positions = None
+    return check
+
+
+class ProcessMaskExecutor(object):
+    def __init__(self,
+                 max_workers: int,
+                 n_partitions: Union[int, None] = None,
+                 spill_path: Union[str, None] = None):
+        if max_workers < 1:
+            raise Exception("max_workers must be at least 1.")
+        self.max_workers = max_workers
+        self.n_partitions = n_partitions if n_partitions is not None else max_workers
+        self.spill_path = spill_path
+        self.pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # The processes are started once and reused by every run of the table
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __deepcopy__(self, memo):
+        # Tables copied with create_new_table_by_filter share the processes
+        return self
+
+    def _get_table_settings(self, table: Table) -> dict:
+        datetime_columns = list(table.datetime_columns.keys())
+        return {
+            "index_column": table.index_column,
+            "not_empthy_columns": table.not_empthy_columns,
+            "datetime_columns": datetime_columns if len(datetime_columns) > 0 else None,
+            "datetime_formats": [table.datetime_columns[col] for col in datetime_columns]
+            if len(datetime_columns) > 0 else None
+        }
+
+    def _create_arrow_table(self, df: pd.DataFrame, columns: List[str]):
+        import pyarrow as pa
+        # Columns pyarrow can't convert (mixed object types) stay in the parent process
+        arrays = {}
+        for col in columns:
+            try:
+                arrays[col] = pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+        return pa.Table.from_arrays(list(arrays.values()), names=list(arrays.keys()))
+
+    def _get_arrow_file(self, table: Table, columns: List[str]) -> _ArrowFile:
+        # The file is kept in the column cache of the table, so it's written again only when the frame changes
+        # or a run needs more columns
+        arrow_file = table.column_cache.get(ARROW_FILE_CACHE_KEY)
+        if (arrow_file is None) or (not set(columns).issubset(arrow_file.columns)):
+            if arrow_file is not None:
+                columns = sorted(set(columns) | arrow_file.columns)
+            arrow_file = _ArrowFile(self._create_arrow_table(table.df, columns), columns, self.spill_path)
+            table.column_cache[ARROW_FILE_CACHE_KEY] = arrow_file
+        return arrow_file
+
+    def _get_partitions(self, n_rows: int) -> List[tuple]:
+        bounds = np.linspace(0, n_rows, min(self.n_partitions, max(n_rows, 1)) + 1).astype(int)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def compute_masks(self, table: Table, check_list: list) -> Dict[Check, np.ndarray]:
+        column_names = set(table.get_column_names())
+        check_list = [check for check in check_list
+                      if type(check)._get_mask_dataframe is not Check._get_mask_dataframe]
+        check_columns = {check: check.get_referenced_columns(column_names) for check in check_list}
+        columns = sorted(set().union(*check_columns.values())) if len(check_list) > 0 else []
+        arrow_file = self._get_arrow_file(table, columns)
+        check_list = [check for check in check_list if check_columns[check].issubset(arrow_file.column_names)]
+        if len(check_list) == 0:
+            return {}
+        n_rows = table.df.shape[0]
+        row_checks = [check for check in check_list if not isinstance(check, WHOLE_COLUMN_CHECKS)]
+        tasks = []
+        if len(row_checks) > 0:
+            tasks += [(row_checks, start, stop) for start, stop in self._get_partitions(n_rows)]
+        tasks += [([check], 0, n_rows) for check in check_list if isinstance(check, WHOLE_COLUMN_CHECKS)]
+
+        table_settings = self._get_table_settings(table)
+        pool = self._get_pool()
+        jobs = [(task_checks, stop - start,
+                 pool.submit(_compute_masks_worker, arrow_file.path, table_settings,
+                             [_detach_check(check) for check in task_checks], start, stop))
+                for task_checks, start, stop in tasks]
+        partition_masks = {check: [] for check in check_list}
+        for task_checks, n_partition_rows, job in jobs:
+            masks, index_problem = job.result()
+            table.index_problem |= index_problem
+            for check, mask in zip(task_checks, masks):
+                partition_masks[check].append(
+                    None if mask is None else np.unpackbits(mask, count=n_partition_rows).astype(bool))
+        # Partitions are submitted in row order, so the masks are concatenated back in the same order
+        return {check: np.concatenate(masks) for check, masks in partition_masks.items()
+                if all(mask is not None for mask in masks)}
@@ -0,0 +1,39 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Union
+
+import pandas as pd
+
+
+class QueryCache(object):
+    def __init__(self,
+                 max_size: int = 128,
+                 ttl: Union[float, None] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, query: str) -> Union[pd.DataFrame, None]:
+        with self.lock:
+            if query not in self.results:
+                return None
+            timestamp, df = self.results[query]
+            if (self.ttl is not None) and (time.monotonic() - timestamp > self.ttl):
+                del self.results[query]
+                return None
+            self.results.move_to_end(query)
+        # Checks modify the DataFrames returned by run_query, the cached one must stay untouched
+        return df.copy()
+
+    def set(self, query: str, df: pd.DataFrame):
+        with self.lock:
+            self.results[query] = (time.monotonic(), df.copy())
+            self.results.move_to_end(query)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
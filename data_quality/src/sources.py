@@ -1,33 +1,77 @@
+import os
+import json
+import asyncio
+import inspect
+import tempfile
 from abc import ABC, abstractmethod
-from typing import Callable, Union, List
+from typing import Callable, Union, List, Awaitable
+from concurrent.futures import ThreadPoolExecutor, Future
 
 import pandas as pd
 
 from data_quality.src.sources_types.bigquery import BigQuery
 from data_quality.src.sources_types.impala import Impala
+from data_quality.src.sources_types.duckdb import DuckDB
+from data_quality.src.sources_types.sqlite import SQLite
+from data_quality.src.sources_types.sources_type import CAPABILITIES
 from data_quality.src.table import Table
+from data_quality.src.query_cache import QueryCache
+from data_quality.src.utils import _normalize_sql
+
+SOURCE_TYPE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".data_quality", "source_types.json")
 
 
 class Sources(object):
     def __init__(self,
-                 run_query_function: Callable[[str], pd.DataFrame],
+                 run_query_function: Union[Callable[[str], pd.DataFrame], Callable[[str], Awaitable[pd.DataFrame]]],
                  session,
                  type_sources: str,
                  get_rows_flag: bool = False,
-                 n_max_rows_output: Union[int, None] = None):
+                 n_max_rows_output: Union[int, None] = None,
+                 deferred: bool = False,
+                 max_workers: int = 1,
+                 count_with_rows_flag: bool = False,
+                 unique_rows_sql_flag: bool = False,
+                 cache_size: Union[int, None] = None,
+                 cache_ttl: Union[float, None] = None,
+                 connection_id: Union[str, None] = None,
+                 source_type_cache_path: Union[str, None] = None,
+                 sample_rate: Union[float, None] = None,
+                 upload_dataframe_function: Union[Callable[[pd.DataFrame], str], None] = None):
+        if max_workers < 1:
+            raise Exception("max_workers must be at least 1.")
         self.run_query_function = run_query_function
+        self.upload_dataframe_function = upload_dataframe_function
+        self.flag_async = inspect.iscoroutinefunction(run_query_function)
+        self.loop = None
+        self.max_workers = max_workers
+        self.executor = None
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size is not None else None
         self.session = session
+        self.connection_id = connection_id
+        if source_type_cache_path is None:
+            source_type_cache_path = SOURCE_TYPE_CACHE_PATH
+        self.source_type_cache_path = source_type_cache_path
         self.list_source_type = [
-            Impala(run_query_function),
-            BigQuery(run_query_function)
+            Impala(self.run_query),
+            BigQuery(self.run_query),
+            DuckDB(self.run_query),
+            SQLite(self.run_query)
         ]
         self.cast_datetime_sql = None
         self.cast_float_sql = None
         self.match_regex = None
         self.datetime_format_replace_dictionary = None
+        self.approx_count_distinct_sql = None
+        self.sample_filter_sql = None
+        self.keys_array_sql = None
         self.set_source_type(type_sources)
         self.n_max_rows_output = n_max_rows_output
         self.get_rows_flag = get_rows_flag
+        self.deferred = deferred
+        self.count_with_rows_flag = count_with_rows_flag
+        self.unique_rows_sql_flag = unique_rows_sql_flag
+        self.sample_rate = sample_rate
 
     def set_source_type(self, type_sources: str):
         list_source_names = [t.name for t in self.list_source_type]
@@ -39,53 +83,108 @@ class Sources(object):
             raise Exception(f"Source type unknown. Values admitted are: {','.join(list_source_names)}")
 
     def check_source_type(self):
-        self.check_query_function()
+        capabilities = self._load_source_type_cache()
+        if capabilities is not None:
+            self._set_capabilities(capabilities)
+            return
+        capabilities = self.probe_source_type()
+        self._set_capabilities(capabilities)
+        # Saved only once the probes found every required capability
+        self._save_source_type_cache(capabilities)
 
-        # Cast Datetime
-        cast_datetime_sql = None
+    def probe_source_type(self) -> dict:
+        # Every dialect is probed with a single query, the first one supporting a capability is used
+        capabilities = {c: None for c in CAPABILITIES}
         for source_type in self.list_source_type:
-            if cast_datetime_sql is None:
-                check = source_type.check_cast_datetime()
-                if check:
-                    cast_datetime_sql = source_type.cast_datetime_sql
-        if cast_datetime_sql is not None:
-            self.cast_datetime_sql = cast_datetime_sql
-        else:
-            raise Exception("Unable to query db for cast as datetime.")
+            if all(capabilities[c] is not None for c in CAPABILITIES):
+                break
+            checks = source_type.check_capabilities()
+            for c in CAPABILITIES:
+                if (capabilities[c] is None) and checks[c]:
+                    capabilities[c] = source_type.name
+        return capabilities
 
-        # Cast float
-        cast_float_sql = None
-        for source_type in self.list_source_type:
-            if cast_float_sql is None:
-                check = source_type.check_cast_float()
-                if check:
-                    cast_float_sql = source_type.cast_float_sql
-        if cast_float_sql is not None:
-            self.cast_float_sql = cast_float_sql
-        else:
+    def _set_capabilities(self, capabilities: dict):
+        # The connectivity check is only needed to explain why the probes failed
+        if capabilities["cast_datetime"] is None:
+            self.check_query_function()
+            raise Exception("Unable to query db for cast as datetime.")
+        if capabilities["cast_float"] is None:
+            self.check_query_function()
             raise Exception("Unable to query db for cast as float.")
+        if capabilities["datetime_format_replace"] is None:
+            self.check_query_function()
+            raise Exception("Unable to query db for datetime formats.")
+        self.cast_datetime_sql = self._get_source_type(capabilities["cast_datetime"]).cast_datetime_sql
+        self.cast_float_sql = self._get_source_type(capabilities["cast_float"]).cast_float_sql
+        if capabilities["regex"] is not None:
+            self.match_regex = self._get_source_type(capabilities["regex"]).match_regex
+        self.datetime_format_replace_dictionary = \
+            self._get_source_type(capabilities["datetime_format_replace"]).datetime_format_replace_dictionary
+        # Approximate count and sampling have no probe: they are used only if every probe found the same dialect
+        source_names = set(capabilities.values()) - {None}
+        if len(source_names) == 1:
+            source_type = self._get_source_type(source_names.pop())
+            self.approx_count_distinct_sql = source_type.approx_count_distinct_sql
+            self.sample_filter_sql = source_type.sample_filter_sql
+            self.keys_array_sql = source_type.keys_array_sql
+        else:
+            self.keys_array_sql = self._get_source_type(capabilities["cast_datetime"]).keys_array_sql
 
-        # Match Regex
-        match_regex = None
+    def _get_source_type(self, name: str):
         for source_type in self.list_source_type:
-            if match_regex is None:
-                check = source_type.check_regex()
-                if check:
-                    match_regex = source_type.match_regex
-        if match_regex is not None:
-            self.match_regex = match_regex
+            if source_type.name == name:
+                return source_type
+        return None
 
-        # Replace format datetime
-        datetime_format_replace_dictionary = None
-        for source_type in self.list_source_type:
-            if datetime_format_replace_dictionary is None:
-                check = source_type.check_datetime_format_replace()
-                if check:
-                    datetime_format_replace_dictionary = source_type.datetime_format_replace_dictionary
-        if datetime_format_replace_dictionary is not None:
-            self.datetime_format_replace_dictionary = datetime_format_replace_dictionary
-        else:
-            raise Exception("Unable to query db for datetime formats.")
+    def _read_source_type_cache(self) -> dict:
+        try:
+            with open(self.source_type_cache_path, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        if not isinstance(cache, dict):
+            cache = {}
+        return cache
+
+    def _load_source_type_cache(self) -> Union[dict, None]:
+        if self.connection_id is None:
+            return None
+        capabilities = self._read_source_type_cache().get(self.connection_id)
+        if not isinstance(capabilities, dict):
+            return None
+        list_source_names = [t.name for t in self.list_source_type]
+        for c in CAPABILITIES:
+            if capabilities.get(c, "") not in list_source_names + [None]:
+                return None
+        return capabilities
+
+    def _save_source_type_cache(self, capabilities: dict):
+        if self.connection_id is None:
+            return
+        cache = self._read_source_type_cache()
+        cache[self.connection_id] = {c: capabilities[c] for c in CAPABILITIES}
+        self._write_source_type_cache(cache)
+
+    def _write_source_type_cache(self, cache: dict):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.source_type_cache_path))
+            os.makedirs(directory, exist_ok=True)
+            # Written to a temporary file and renamed, so jobs starting together never read half a file
+            with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(f.name, self.source_type_cache_path)
+        except OSError:
+            # The cache only saves the probes of the next run
+            pass
+
+    def clear_source_type_cache(self):
+        if self.connection_id is None:
+            return
+        cache = self._read_source_type_cache()
+        if self.connection_id in cache:
+            del cache[self.connection_id]
+            self._write_source_type_cache(cache)
 
     def check_query_function(self):
             query = """
@@ -116,6 +215,21 @@ class Sources(object):
             if type_sources.lower() == source_type.name:
                 self.datetime_format_replace_dictionary = source_type.datetime_format_replace_dictionary
 
+        # Approximate count distinct
+        for source_type in self.list_source_type:
+            if type_sources.lower() == source_type.name:
+                self.approx_count_distinct_sql = source_type.approx_count_distinct_sql
+
+        # Sample filter
+        for source_type in self.list_source_type:
+            if type_sources.lower() == source_type.name:
+                self.sample_filter_sql = source_type.sample_filter_sql
+
+        # Arrays of keys
+        for source_type in self.list_source_type:
+            if type_sources.lower() == source_type.name:
+                self.keys_array_sql = source_type.keys_array_sql
+
     def create_table(self,
                      name: str,
                      index_column: str = None,
@@ -127,11 +241,23 @@ class Sources(object):
                      n_max_rows_output: Union[int, None] = None,
                      output_columns: Union[List[str], str] = None,
                      get_rows_flag: Union[bool, None] = None,
+                     deferred: Union[bool, None] = None,
+                     count_with_rows_flag: Union[bool, None] = None,
+                     unique_rows_sql_flag: Union[bool, None] = None,
+                     sample_rate: Union[float, None] = None
                      ) -> Table:
         if n_max_rows_output is None:
             n_max_rows_output = self.n_max_rows_output
         if get_rows_flag is None:
             get_rows_flag = self.get_rows_flag
+        if deferred is None:
+            deferred = self.deferred
+        if count_with_rows_flag is None:
+            count_with_rows_flag = self.count_with_rows_flag
+        if unique_rows_sql_flag is None:
+            unique_rows_sql_flag = self.unique_rows_sql_flag
+        if sample_rate is None:
+            sample_rate = self.sample_rate
         table = Table(db_name=name,
                       source=self,
                       index_column=index_column,
@@ -142,10 +268,74 @@ class Sources(object):
                       datetime_formats=datetime_formats,
                       output_columns=output_columns,
                       n_max_rows_output=n_max_rows_output,
-                      get_rows_flag=get_rows_flag)
+                      get_rows_flag=get_rows_flag,
+                      deferred=deferred,
+                      count_with_rows_flag=count_with_rows_flag,
+                      unique_rows_sql_flag=unique_rows_sql_flag,
+                      sample_rate=sample_rate)
         self.session.tables.append(table)
         return table
 
     def run_query(self, query: str) -> pd.DataFrame:
-        return self.run_query_function(query)
+        query = _normalize_sql(query)
+        df = self.cache.get(query) if self.cache is not None else None
+        if df is None:
+            df = self._run_query_function(query)
+            if self.cache is not None:
+                self.cache.set(query, df)
+        return df
+
+    async def arun_query(self, query: str) -> pd.DataFrame:
+        query = _normalize_sql(query)
+        df = self.cache.get(query) if self.cache is not None else None
+        if df is None:
+            if self.flag_async:
+                df = await self.run_query_function(query)
+            else:
+                df = await self.arun_in_executor(self.run_query_function, query)
+            if self.cache is not None:
+                self.cache.set(query, df)
+        return df
+
+    def _run_query_function(self, query: str) -> pd.DataFrame:
+        if not self.flag_async:
+            return self.run_query_function(query)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if (running_loop is None) and (self.loop is not None) and self.loop.is_running():
+            # Sync check code running in a worker thread of arun: the query goes back to the event loop
+            return asyncio.run_coroutine_threadsafe(self.run_query_function(query), self.loop).result()
+        return asyncio.run(self.run_query_function(query))
+
+    async def arun_in_executor(self, function, *args):
+        self.loop = asyncio.get_running_loop()
+        return await self.loop.run_in_executor(None, function, *args)
+
+    def submit(self, function, *args) -> Future:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor.submit(function, *args)
+
+    def run_queries(self, queries: List[str]) -> List[pd.DataFrame]:
+        jobs = [self.submit(self.run_query, query) for query in queries]
+        return [job.result() for job in jobs]
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def drop_table(self, table_name: str):
+        # Staging tables of upload_dataframe_function, the query is not cached
+        self._run_query_function(f"DROP TABLE IF EXISTS {table_name}")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __deepcopy__(self, memo):
+        # Tables copied with create_new_table_by_filter keep querying the same source
+        return self
 
@@ -1,6 +1,8 @@
 from datetime import datetime
+from typing import List
 
 from data_quality.src.sources_types.sources_type import SourceType
+from data_quality.src.utils import SAMPLE_HASH_BUCKETS
 
 
 class BigQuery(SourceType):
@@ -18,74 +20,41 @@ class BigQuery(SourceType):
             "%S": "SS"
         }
 
-    def check_cast_datetime(self):
-        result = True
-        try:
-            query = """
-            SELECT 
-                safe_cast("01-02-2021" as timestamp FORMAT "yyyy-MM-dd") as a, 
-                safe_cast("02-02-2021" as timestamp FORMAT "dd-MM-yyyy") as b
-            """
-            df = self.run_query_function(query)
-            result = result & (df["a"].isna().sum() == 1)
-            result = result & (df["b"].isna().sum() == 0)
-        except:
-            result = False
-        return result
-
     def cast_datetime_sql(self, column_name, format_date):
         if format_date is None:
             return f"safe_cast({column_name} as timestamp)"
         else:
             return f"safe_cast({column_name} as timestamp FORMAT '{format_date}')"
 
-    def check_cast_float(self):
-        result = True
-        try:
-            query = """
-            SELECT
-                safe_cast(3 as float64) as a,
-                safe_cast('-' as float64) as b
-            """
-            df = self.run_query_function(query)
-            result = result & (df["a"].isna().sum() == 0)
-            result = result & (df["b"].isna().sum() == 1)
-        except:
-            result = False
-        return result
-
     def cast_float_sql(self, column_name):
         return f"safe_cast({column_name} as float64)"
 
-    def check_regex(self):
-        result = True
-        try:
-            query = """
-               SELECT  
-                REGEXP_CONTAINS("2022-01-18", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as a,
-                REGEXP_CONTAINS("2022-01-182", "(?i)^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as b
-               """
-            df = self.run_query_function(query)
-            result = result & (df["a"].sum() == 1)
-            result = result & (df["b"].sum() == 0)
-        except:
-            result = False
-        return result
-
     def match_regex(self, column_name: str, regex: str, case_sensitive: bool = True) -> str:
         if case_sensitive:
             return f"REGEXP_CONTAINS({column_name}, '{regex}')"
         else:
             return f"REGEXP_CONTAINS({column_name}, '(?i){regex}')"
 
-    def check_datetime_format_replace(self):
-        try:
-            query = """
-            select safe_cast("2021-01-01 11:00:00" as timestamp FORMAT "yyyy-MM-dd HH24:MI:ss") as a
-            """
-            df = self.run_query_function(query)
-            result = (df["a"] == "2021-01-01 11:00:00").sum() == 1
-        except:
-            result = False
-        return result
-
+    def approx_count_distinct_sql(self, column_name: str) -> str:
+        return f"APPROX_COUNT_DISTINCT({column_name})"
+
+    def sample_filter_sql(self, column_name: str, sample_rate: float) -> str:
+        n_buckets = int(round(sample_rate * SAMPLE_HASH_BUCKETS))
+        return f"MOD(ABS(FARM_FINGERPRINT(COALESCE(CAST({column_name} AS STRING), ''))), {SAMPLE_HASH_BUCKETS}) " \
+               f"< {n_buckets}"
+
+    def keys_array_sql(self, keys: List[str], column_name: str) -> str:
+        keys = "','".join(keys)
+        return f"SELECT {column_name} FROM UNNEST(['{keys}']) AS {column_name}"
+
+    def capabilities_query(self) -> str:
+        return """
+        SELECT 
+            safe_cast("01-02-2021" as timestamp FORMAT "yyyy-MM-dd") as cast_datetime_a, 
+            safe_cast("02-02-2021" as timestamp FORMAT "dd-MM-yyyy") as cast_datetime_b,
+            safe_cast(3 as float64) as cast_float_a,
+            safe_cast('-' as float64) as cast_float_b,
+            REGEXP_CONTAINS("2022-01-18", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as regex_a,
+            REGEXP_CONTAINS("2022-01-182", "(?i)^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as regex_b,
+            safe_cast("2021-01-01 11:00:00" as timestamp FORMAT "yyyy-MM-dd HH24:MI:ss") as datetime_format_a
+        """
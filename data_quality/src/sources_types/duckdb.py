@@ -0,0 +1,93 @@
+import uuid
+from typing import Callable, List
+
+import pandas as pd
+
+from data_quality.src.sources_types.sources_type import SourceType
+from data_quality.src.utils import SAMPLE_HASH_BUCKETS
+
+
+def create_duckdb_run_query_function(connection=None) -> Callable[[str], pd.DataFrame]:
+    # Each query runs on its own cursor so the function can be used by several workers.
+    # Local files can be checked with table names like read_parquet('path/*.parquet') and
+    # DataFrames after connection.register(name, df)
+    if connection is None:
+        try:
+            import duckdb
+        except ImportError:
+            raise Exception("duckdb is required to run queries on a DuckDB connection.")
+        connection = duckdb.connect()
+
+    def run_query(query: str) -> pd.DataFrame:
+        return connection.cursor().execute(query).df()
+
+    return run_query
+
+
+def create_duckdb_upload_dataframe_function(connection) -> Callable[[pd.DataFrame], str]:
+    # Tables registered on a connection are not seen by its cursors, the keys are copied in a new table.
+    # The staging tables are dropped when the column cache of the dimension table is cleared (del_table)
+    def upload_dataframe(df: pd.DataFrame) -> str:
+        table_name = f"data_quality_keys_{uuid.uuid4().hex}"
+        cursor = connection.cursor()
+        cursor.register("df_data_quality", df)
+        cursor.execute(f"CREATE TABLE {table_name} AS SELECT * FROM df_data_quality")
+        cursor.unregister("df_data_quality")
+        return table_name
+
+    return upload_dataframe
+
+
+class DuckDB(SourceType):
+
+    def __init__(self, run_query_function):
+        self.run_query_function = run_query_function
+        self.name = "duckdb"
+        self.datetime_format_replace_dictionary = {
+            "%Y": "%Y",
+            "%y": "%y",
+            "%m": "%m",
+            "%d": "%d",
+            "%H": "%H",
+            "%M": "%M",
+            "%S": "%S"
+        }
+
+    def cast_datetime_sql(self, column_name, format_date):
+        if format_date is None:
+            return f"try_cast({column_name} as timestamp)"
+        else:
+            return f"try_strptime(cast({column_name} as varchar), '{format_date}')"
+
+    def cast_float_sql(self, column_name):
+        return f"try_cast({column_name} as double)"
+
+    def match_regex(self, column_name: str, regex: str, case_sensitive: bool = True) -> str:
+        # Backslashes of the regex come escaped, E'' literals unescape them as the other dialects do
+        if case_sensitive:
+            return f"regexp_matches(cast({column_name} as varchar), E'{regex}')"
+        else:
+            return f"regexp_matches(cast({column_name} as varchar), E'{regex}', 'i')"
+
+    def approx_count_distinct_sql(self, column_name: str) -> str:
+        return f"approx_count_distinct({column_name})"
+
+    def sample_filter_sql(self, column_name: str, sample_rate: float) -> str:
+        n_buckets = int(round(sample_rate * SAMPLE_HASH_BUCKETS))
+        return f"hash(coalesce(cast({column_name} as varchar), '')) % {SAMPLE_HASH_BUCKETS} < {n_buckets}"
+
+    def keys_array_sql(self, keys: List[str], column_name: str) -> str:
+        keys = "','".join(keys)
+        return f"SELECT unnest(['{keys}']) AS {column_name}"
+
+    def capabilities_query(self) -> str:
+        return """
+        SELECT
+            try_strptime('01-02-2021', '%Y-%m-%d') as cast_datetime_a,
+            try_strptime('02-02-2021', '%d-%m-%Y') as cast_datetime_b,
+            try_cast(3 as double) as cast_float_a,
+            try_cast('x' as double) as cast_float_b,
+            regexp_matches('2022-01-18', '^[0-9]{4}-[0-9]{2}-[0-9]{2}$') as regex_a,
+            regexp_matches('2022-01-182', '^[0-9]{4}-[0-9]{2}-[0-9]{2}$', 'i') as regex_b,
+            try_strptime('2021-01-01 11:00:00', '%Y-%m-%d %H:%M:%S') as datetime_format_a
+        """
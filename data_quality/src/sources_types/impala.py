@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from data_quality.src.sources_types.sources_type import SourceType
+from data_quality.src.utils import SAMPLE_HASH_BUCKETS
 
 
 class Impala(SourceType):
@@ -18,75 +19,36 @@ class Impala(SourceType):
             "%S": "SS"
         }
 
-    def check_cast_datetime(self):
-        result = True
-        try:
-            query = """
-            SELECT 
-                to_timestamp("01-02-2021", "yyyy-MM-dd") as a, 
-                to_timestamp("02-02-2021", "dd-MM-yyyy") as b
-            """
-            df = self.run_query_function(query)
-            result = result & (df["a"].isna().sum() == 1)
-            result = result & (df["b"].isna().sum() == 0)
-        except:
-            result = False
-        return result
-
     def cast_datetime_sql(self, column_name, format_date):
         if format_date is None:
             return column_name
         else:
             return f"to_timestamp({column_name}, '{format_date}')"
 
-    def check_cast_float(self):
-        result = True
-        try:
-            query = """
-            SELECT 
-                cast(3 as float) as a,
-                cast('x' as float) as b
-            """
-            df = self.run_query_function(query)
-            result = result & (df["a"].isna().sum() == 0)
-            result = result & (df["b"].isna().sum() == 1)
-        except:
-            result = False
-        return result
-
     def cast_float_sql(self, column_name):
         return f"cast({column_name} as float)"
 
-    def check_regex(self):
-        result = True
-        try:
-            query = """
-            SELECT  
-                regexp_like("2022-01-18", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as a,
-                regexp_like("2022-01-182", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$", 'i') as b
-            """
-            df = self.run_query_function(query)
-            result = result & (df["a"].sum() == 1)
-            result = result & (df["b"].sum() == 0)
-        except:
-            result = False
-        return result
-
     def match_regex(self, column_name: str, regex: str, case_sensitive: bool = True) -> str:
         if case_sensitive:
             return f"regexp_like({column_name}, '{regex}')"
         else:
             return f"regexp_like({column_name}, '{regex}', 'i')"
 
-    def check_datetime_format_replace(self):
-        try:
-            query = """
-            select to_timestamp("2021-01-01 11:00:00", "yyyy-MM-dd HH:mm:ss") as a
-            """
-            df = self.run_query_function(query)
-            result = (df["a"] == "2021-01-01 11:00:00").sum() == 1
-        except:
-            result = False
-        return result
-
-
+    def approx_count_distinct_sql(self, column_name: str) -> str:
+        return f"NDV({column_name})"
+
+    def sample_filter_sql(self, column_name: str, sample_rate: float) -> str:
+        n_buckets = int(round(sample_rate * SAMPLE_HASH_BUCKETS))
+        return f"abs(fnv_hash(coalesce(cast({column_name} as string), ''))) % {SAMPLE_HASH_BUCKETS} < {n_buckets}"
+
+    def capabilities_query(self) -> str:
+        return """
+        SELECT 
+            to_timestamp("01-02-2021", "yyyy-MM-dd") as cast_datetime_a, 
+            to_timestamp("02-02-2021", "dd-MM-yyyy") as cast_datetime_b,
+            cast(3 as float) as cast_float_a,
+            cast('x' as float) as cast_float_b,
+            regexp_like("2022-01-18", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$") as regex_a,
+            regexp_like("2022-01-182", "^[0-9]{4}-[0-9]{2}-[0-9]{2}$", 'i') as regex_b,
+            to_timestamp("2021-01-01 11:00:00", "yyyy-MM-dd HH:mm:ss") as datetime_format_a
+        """
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+CAPABILITIES = ["cast_datetime", "cast_float", "regex", "datetime_format_replace"]
+
 
 class SourceType(ABC):
 
@@ -8,30 +10,45 @@ class SourceType(ABC):
         self.name = None
         self.datetime_format_replace_dictionary = None
 
-    @abstractmethod
-    def check_cast_datetime(self) -> bool:
-        pass
-
     @abstractmethod
     def cast_datetime_sql(self, column_name: str, format_date: str) -> str:
         pass
 
-    @abstractmethod
-    def check_cast_float(self) -> bool:
-        pass
-
     @abstractmethod
     def cast_float_sql(self, column_name: str) -> str:
         pass
 
-    @abstractmethod
-    def check_regex(self) -> bool:
-        pass
-
     @abstractmethod
     def match_regex(self, column_name: str, regex: str, case_sensitive: bool = True) -> str:
         pass
 
     @abstractmethod
-    def check_datetime_format_replace(self) -> bool:
+    def capabilities_query(self) -> str:
         pass
+
+    def approx_count_distinct_sql(self, column_name: str) -> str:
+        # Dialects without an approximate distinct count use the exact one
+        return f"count(DISTINCT {column_name})"
+
+    # Rows kept by hash of a column, sample_filter_sql(column_name, sample_rate) -> str: every query sees the
+    # same sample and the rows with the same key (null keys included) are kept together.
+    # None for the dialects without a hash function
+    sample_filter_sql = None
+
+    # Relation with one row per key built from an array literal, keys_array_sql(keys, column_name) -> str.
+    # None for the dialects without arrays: the keys of a DataFrame dimension table stay in a NOT IN list
+    keys_array_sql = None
+
+    def check_capabilities(self) -> dict:
+        # All the probes in one round trip; if the dialect rejects the query it is not this source type
+        try:
+            df = self.run_query_function(self.capabilities_query())
+            return {
+                "cast_datetime": bool((df["cast_datetime_a"].isna().sum() == 1) &
+                                      (df["cast_datetime_b"].isna().sum() == 0)),
+                "cast_float": bool((df["cast_float_a"].isna().sum() == 0) & (df["cast_float_b"].isna().sum() == 1)),
+                "regex": bool((df["regex_a"].sum() == 1) & (df["regex_b"].sum() == 0)),
+                "datetime_format_replace": bool((df["datetime_format_a"] == "2021-01-01 11:00:00").sum() == 1)
+            }
+        except:
+            return {c: False for c in CAPABILITIES}
@@ -0,0 +1,123 @@
+import re
+import zlib
+import sqlite3
+import threading
+from typing import Callable, List
+
+import pandas as pd
+
+from data_quality.src.sources_types.sources_type import SourceType
+from data_quality.src.utils import SAMPLE_HASH_BUCKETS
+
+_STRING_TYPE_REGEX = re.compile(r"\bas\s+string\b", re.IGNORECASE)
+
+
+def _regexp(pattern, value) -> bool:
+    if (pattern is None) or (value is None):
+        return None
+    return re.search(pattern, str(value)) is not None
+
+
+def _strptime(value, format_date):
+    # Datetimes are returned as ISO strings, so they compare as the formatted literals used by the checks
+    if value is None:
+        return None
+    result = pd.to_datetime(value, format=format_date, errors="coerce")
+    if pd.isna(result):
+        return None
+    return result.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hash(value):
+    if value is None:
+        return None
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+def _concat(*values) -> str:
+    return "".join(["" if v is None else str(v) for v in values])
+
+
+def register_sqlite_functions(connection):
+    connection.create_function("regexp", 2, _regexp, deterministic=True)
+    connection.create_function("strptime_data_quality", 2, _strptime, deterministic=True)
+    connection.create_function("float_data_quality", 1, _to_float, deterministic=True)
+    connection.create_function("hash_data_quality", 1, _hash, deterministic=True)
+    if sqlite3.sqlite_version_info < (3, 44, 0):
+        connection.create_function("concat", -1, _concat, deterministic=True)
+
+
+def create_sqlite_run_query_function(connection=None) -> Callable[[str], pd.DataFrame]:
+    # "string" is not a SQLite type (cast(x as string) gives a number), queries are rewritten to use text
+    if connection is None:
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+    register_sqlite_functions(connection)
+    lock = threading.Lock()
+
+    def run_query(query: str) -> pd.DataFrame:
+        query = _STRING_TYPE_REGEX.sub("as text", query)
+        with lock:
+            return pd.read_sql_query(query, connection)
+
+    return run_query
+
+
+class SQLite(SourceType):
+
+    def __init__(self, run_query_function):
+        self.run_query_function = run_query_function
+        self.name = "sqlite"
+        self.datetime_format_replace_dictionary = {
+            "%Y": "%Y",
+            "%y": "%y",
+            "%m": "%m",
+            "%d": "%d",
+            "%H": "%H",
+            "%M": "%M",
+            "%S": "%S"
+        }
+
+    def cast_datetime_sql(self, column_name, format_date):
+        if format_date is None:
+            return f"strptime_data_quality({column_name}, NULL)"
+        else:
+            return f"strptime_data_quality({column_name}, '{format_date}')"
+
+    def cast_float_sql(self, column_name):
+        return f"float_data_quality({column_name})"
+
+    def match_regex(self, column_name: str, regex: str, case_sensitive: bool = True) -> str:
+        # SQLite literals don't unescape backslashes, the regex is passed as the user wrote it
+        regex = regex.replace("\\\\", "\\")
+        if case_sensitive:
+            return f"({column_name} REGEXP '{regex}')"
+        else:
+            return f"({column_name} REGEXP '(?i){regex}')"
+
+    def sample_filter_sql(self, column_name: str, sample_rate: float) -> str:
+        n_buckets = int(round(sample_rate * SAMPLE_HASH_BUCKETS))
+        return f"hash_data_quality(coalesce({column_name}, '')) % {SAMPLE_HASH_BUCKETS} < {n_buckets}"
+
+    def keys_array_sql(self, keys: List[str], column_name: str) -> str:
+        # A VALUES list is not limited by the max number of terms of a compound select
+        keys = "'),('".join(keys)
+        return f"SELECT column1 AS {column_name} FROM (VALUES ('{keys}'))"
+
+    def capabilities_query(self) -> str:
+        return """
+        SELECT
+            strptime_data_quality('01-02-2021', '%Y-%m-%d') as cast_datetime_a,
+            strptime_data_quality('02-02-2021', '%d-%m-%Y') as cast_datetime_b,
+            float_data_quality(3) as cast_float_a,
+            float_data_quality('x') as cast_float_b,
+            '2022-01-18' REGEXP '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' as regex_a,
+            '2022-01-182' REGEXP '(?i)^[0-9]{4}-[0-9]{2}-[0-9]{2}$' as regex_b,
+            strptime_data_quality('2021-01-01 11:00:00', '%Y-%m-%d %H:%M:%S') as datetime_format_a
+        """
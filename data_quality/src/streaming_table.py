@@ -0,0 +1,255 @@
+import os
+import asyncio
+import itertools
+import tempfile
+from typing import Union, List, Iterable, Dict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from data_quality.src.table import Table
+from data_quality.src.checks.values_duplicate import ValuesDuplicate
+from data_quality.src.checks.period_intersection import PeriodIntersection
+from data_quality.src.utils import TAG_CHECK_DESCRIPTION, _concatenate_key_columns
+
+COLUMN_ROW_NUMBER = "row_number_data_quality"
+SPILL_PARTITIONS = 16
+
+
+class _SpillFiles(object):
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.paths = []
+
+    def write(self, df: pd.DataFrame):
+        path = os.path.join(self.directory, f"{self.name}_{len(self.paths)}.pkl")
+        df.to_pickle(path)
+        self.paths.append(path)
+
+    def read(self):
+        for path in self.paths:
+            yield pd.read_pickle(path)
+
+
+class _PartitionedSpillFiles(object):
+    # Rows are spilled in partitions by hash of their key, all the rows with the same key are in the same partition
+    def __init__(self, directory: str, name: str, n_partitions: int):
+        self.partitions = [_SpillFiles(directory, f"{name}_{i}") for i in range(n_partitions)]
+
+    def write(self, df: pd.DataFrame, keys: pd.Series):
+        partition_ids = pd.util.hash_pandas_object(keys, index=False).values % len(self.partitions)
+        for i, spill in enumerate(self.partitions):
+            mask = partition_ids == i
+            if mask.any():
+                spill.write(df[mask])
+
+    def read(self):
+        # One frame for each partition
+        for spill in self.partitions:
+            if len(spill.paths) > 0:
+                yield pd.concat(list(spill.read()), ignore_index=True)
+
+
+class _StreamingCheck(object):
+    # Row level checks: every chunk is checked on its own, counts are summed and rows kept up to the limit
+    def __init__(self, table, check, get_rows_flag: bool):
+        self.table = table
+        self.check = check
+        self.get_rows_flag = get_rows_flag
+        self.n_ko = 0
+        self.rows = []
+        self.n_rows_kept = 0
+
+    def _output_columns(self, df: pd.DataFrame) -> List[str]:
+        return self.check.output_columns if self.check.output_columns is not None else list(df.columns)
+
+    def _keep_rows(self, df_ko: pd.DataFrame):
+        n_max_rows_output = self.check.n_max_rows_output
+        if (not self.get_rows_flag) or (df_ko.shape[0] == 0):
+            return
+        if n_max_rows_output is not None:
+            if self.n_rows_kept >= n_max_rows_output:
+                return
+            df_ko = df_ko.head(n_max_rows_output - self.n_rows_kept)
+        self.rows.append(df_ko[self._output_columns(df_ko)])
+        self.n_rows_kept += df_ko.shape[0]
+
+    def add_chunk(self, row_numbers: np.ndarray):
+        df_ko = self.check._get_rows_ko_dataframe()
+        self.n_ko += df_ko.shape[0]
+        self._keep_rows(df_ko)
+
+    def finalize(self):
+        df_ko = None
+        flag_over_max_rows = None
+        if self.get_rows_flag:
+            if len(self.rows) > 0:
+                df_ko = pd.concat(self.rows)
+            else:
+                df_ko = pd.DataFrame(columns=self._output_columns(self.table.df))
+            df_ko[TAG_CHECK_DESCRIPTION] = self.check.check_description
+            flag_over_max_rows = self.n_ko > df_ko.shape[0]
+        self.check._set_result(self.n_ko, df_ko, flag_over_max_rows)
+
+
+class _StreamingValuesDuplicate(_StreamingCheck):
+    # Values are counted in a hash table across chunks, rows are spilled to disk and selected at the end
+    def __init__(self, table, check, get_rows_flag: bool, spill_directory: str, name: str):
+        super().__init__(table, check, get_rows_flag)
+        self.value_counts = pd.Series(dtype="int64")
+        self.spill = _SpillFiles(spill_directory, name)
+
+    def add_chunk(self, row_numbers: np.ndarray):
+        df = self.table.df
+        mask = self.table.get_mask_not_empthy(self.check.column)
+        self.value_counts = self.value_counts.add(df[self.check.column][mask].value_counts(), fill_value=0)
+        if self.get_rows_flag:
+            self.spill.write(df[mask][list(dict.fromkeys(self._output_columns(df) + [self.check.column]))])
+
+    def finalize(self):
+        duplicated_counts = self.value_counts[self.value_counts > 1]
+        self.n_ko = int(duplicated_counts.sum())
+        if self.get_rows_flag:
+            for df in self.spill.read():
+                df = df[df[self.check.column].isin(duplicated_counts.index)]
+                self._keep_rows(df)
+        if self.n_ko > 0:
+            self.table.index_problem = True
+        super().finalize()
+
+
+class _StreamingPeriodIntersection(_StreamingCheck):
+    # Only the period and id columns of every chunk are spilled, partitioned by hash of the ids. Periods
+    # intersect only inside the same ids, so each partition is checked on its own at the end and only the keys
+    # of one partition are in memory (all the keys if the check has no id columns), then the KO rows are read
+    # back from the spilled output columns
+    def __init__(self, table, check, get_rows_flag: bool, spill_directory: str, name: str):
+        super().__init__(table, check, get_rows_flag)
+        self.id_columns = check._get_id_columns()
+        n_partitions = SPILL_PARTITIONS if len(self.id_columns) > 0 else 1
+        self.key_spill = _PartitionedSpillFiles(spill_directory, name + "_keys", n_partitions)
+        self.rows_spill = _SpillFiles(spill_directory, name + "_rows")
+
+    def _key_columns(self) -> List[str]:
+        return list(dict.fromkeys(self.id_columns + [self.check.start_date, self.check.end_date]))
+
+    def _partition_keys(self, df: pd.DataFrame) -> pd.Series:
+        if len(self.id_columns) == 0:
+            return pd.Series(0, index=df.index)
+        # Null ids are grouped together by the check, whatever the type of the null
+        ids = df[self.id_columns].astype(object)
+        return _concatenate_key_columns(ids.where(ids.notnull(), None), self.id_columns)
+
+    def add_chunk(self, row_numbers: np.ndarray):
+        df = self.table.df
+        self.key_spill.write(df[self._key_columns()].assign(**{COLUMN_ROW_NUMBER: row_numbers}),
+                             self._partition_keys(df))
+        if self.get_rows_flag:
+            self.rows_spill.write(df[self._output_columns(df)].assign(**{COLUMN_ROW_NUMBER: row_numbers}))
+
+    def finalize(self):
+        chunk_df = self.table.df
+        ko_row_numbers = []
+        for df in self.key_spill.read():
+            self.table._set_chunk(df)
+            ko_row_numbers.append(self.check._get_rows_ko_dataframe()[COLUMN_ROW_NUMBER].values)
+        self.table._set_chunk(chunk_df)
+        ko_row_numbers = np.concatenate(ko_row_numbers) if len(ko_row_numbers) > 0 else np.array([], dtype=np.int64)
+        self.n_ko = ko_row_numbers.shape[0]
+        if self.get_rows_flag:
+            for df in self.rows_spill.read():
+                df = df[df[COLUMN_ROW_NUMBER].isin(ko_row_numbers)]
+                self._keep_rows(df.drop(columns=COLUMN_ROW_NUMBER))
+        super().finalize()
+
+
+class StreamingTable(Table):
+    def __init__(self,
+                 chunks: Iterable[pd.DataFrame],
+                 index_column: str = None,
+                 output_name: str = None,
+                 not_empthy_columns: Union[str, list] = None,
+                 datetime_columns: Union[str, list, None] = None,
+                 datetime_formats: Union[str, list, None] = None,
+                 table_filter: str = None,
+                 output_columns: Union[List[str], str] = None,
+                 n_max_rows_output: int = None,
+                 get_rows_flag: bool = True,
+                 spill_path: Union[str, None] = None):
+        # The first chunk is only read to know the columns, checks are always planned and run on all chunks
+        chunks = iter(chunks)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            raise Exception("The streaming table needs at least one chunk.")
+        self.chunks = itertools.chain([first_chunk], chunks)
+        self.spill_path = spill_path
+        super().__init__(df=first_chunk.iloc[0:0],
+                         index_column=index_column,
+                         output_name=output_name,
+                         not_empthy_columns=not_empthy_columns,
+                         datetime_columns=datetime_columns,
+                         datetime_formats=datetime_formats,
+                         table_filter=table_filter,
+                         output_columns=output_columns,
+                         n_max_rows_output=n_max_rows_output,
+                         get_rows_flag=get_rows_flag,
+                         deferred=True)
+
+    def get_number_of_rows(self, refresh: bool = False):
+        # Rows are counted while the chunks are read
+        if getattr(self, "n_rows", None) is None:
+            self.n_rows = 0
+
+    def _set_chunk(self, df: pd.DataFrame):
+        self.df = df
+        self.column_cache = {}
+        self.ko_mask = None
+        self.ko_mask_positions = {}
+
+    def _create_streaming_check(self, check, get_rows_flag: Union[bool, None], spill_directory: str, name: str):
+        if get_rows_flag is None:
+            get_rows_flag = self.get_rows_flag
+        if isinstance(check, ValuesDuplicate):
+            return _StreamingValuesDuplicate(self, check, get_rows_flag, spill_directory, name)
+        if isinstance(check, PeriodIntersection):
+            return _StreamingPeriodIntersection(self, check, get_rows_flag, spill_directory, name)
+        return _StreamingCheck(self, check, get_rows_flag)
+
+    def _run_streaming_checks(self, planned_checks: list):
+        if len(planned_checks) == 0:
+            return
+        if self.chunks is None:
+            raise Exception("Chunks of the table were already read, the streaming table can be run only once.")
+        empty_df = self.df
+        with tempfile.TemporaryDirectory(dir=self.spill_path) as spill_directory:
+            streaming_checks = [self._create_streaming_check(check, get_rows_flag, spill_directory, f"check_{i}")
+                                for i, (check, get_rows_flag) in enumerate(planned_checks)]
+            n_rows = 0
+            for chunk in self.chunks:
+                if self.table_filter is not None:
+                    chunk = chunk.query(self.table_filter)
+                self._set_chunk(chunk)
+                row_numbers = np.arange(n_rows, n_rows + chunk.shape[0])
+                for streaming_check in streaming_checks:
+                    streaming_check.add_chunk(row_numbers)
+                n_rows += chunk.shape[0]
+            self.chunks = None
+            self._set_chunk(empty_df)
+            self.n_rows = n_rows
+            for streaming_check in streaming_checks:
+                streaming_check.finalize()
+
+    def _submit_planned_checks(self, planned_checks: list, fused_n_ko: Dict) -> list:
+        self._run_streaming_checks(planned_checks)
+        jobs = []
+        for check, _ in planned_checks:
+            job = Future()
+            job.set_result(check.n_ko)
+            jobs.append((check, job))
+        return jobs
+
+    async def _arun_planned_checks(self, semaphore: asyncio.Semaphore, planned_checks: list):
+        async with semaphore:
+            self._run_streaming_checks(planned_checks)
@@ -1,15 +1,21 @@
+import asyncio
+from copy import deepcopy
 from typing import Union, List, Optional, Dict
+from concurrent.futures import Future
 from valdec.decorators import validate
 from datetime import datetime, date
 
+import numpy as np
 import pandas as pd
 
 from data_quality.src.checks.dates_order_dimension_table import DatesOrderDimensionTable
 from data_quality.src.checks.period_intersection import PeriodIntersection
 from data_quality.src.checks.values_order_dimension_table import ValuesOrderDimensionTable
 from data_quality.src.plot import plot_table_results
-from data_quality.src.utils import _clean_sql_filter, _aggregate_sql_filter, _output_column_to_sql, _query_limit, \
-    TAG_FLAG_ONLY_WARNING, TAG_FLAG_WARNING, TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, DEFAULT_CHECK_DESCRIPTION
+from data_quality.src.key_index import KeyIndex
+from data_quality.src.utils import _clean_sql_filter, _aggregate_sql_filter, _join_sql_filter, _output_column_to_sql, \
+    _query_limit, TAG_FLAG_ONLY_WARNING, TAG_FLAG_WARNING, TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, DEFAULT_CHECK_DESCRIPTION, \
+    COLUMN_CHECK_ID, MAX_CHECKS_ROWS_BATCH, SAMPLE_HASH_BUCKETS, SAMPLE_SEED, _concatenate_key_columns
 from data_quality.src.checks.index_null import IndexNull
 from data_quality.src.checks.values_duplicate import ValuesDuplicate
 from data_quality.src.checks.not_empthy_column import NotEmpthyColumn
@@ -37,7 +43,12 @@ class Table:
                  table_filter: str = None,
                  output_columns: Union[List[str], str] = None,
                  n_max_rows_output: int = None,
-                 get_rows_flag: Union[bool, None] = None
+                 get_rows_flag: Union[bool, None] = None,
+                 deferred: bool = False,
+                 count_with_rows_flag: bool = False,
+                 unique_rows_sql_flag: bool = False,
+                 mask_executor=None,
+                 sample_rate: Union[float, None] = None
                  ):
         # Input parameters
         if df is not None:
@@ -54,15 +65,26 @@ class Table:
         self.set_not_empthy_columns(not_empthy_columns)
         self.datetime_columns = {}
         self.set_datetime_columns(datetime_columns, datetime_formats)
+        if (sample_rate is not None) and not (0 < sample_rate <= 1):
+            raise Exception("sample_rate must be in (0, 1].")
+        self.sample_rate = sample_rate
+        if self.flag_dataframe and (self.sample_rate is not None):
+            self._set_sample()
         self.table_filter = None
         self.set_table_filer(table_filter)
         self.output_columns = None
         self.set_output_columns(output_columns)
         self.n_max_rows_output = n_max_rows_output
         self.get_rows_flag = get_rows_flag
+        self.deferred = deferred
+        self.count_with_rows_flag = count_with_rows_flag
+        self.unique_rows_sql_flag = unique_rows_sql_flag
+        self.mask_executor = mask_executor
+        self.planned_checks = []
 
         # Result parameters
         self.n_rows = None
+        self.n_rows_estimate = None
         self.index_problem = False
         self.passed_all_checks = True
         self.check_list = []
@@ -75,12 +97,57 @@ class Table:
         self.number_unique_rows_warning = None
         self.max_number_ko = None
         self.max_number_warnings = None
+        self.ko_mask = None
+        self.ko_mask_positions = {}
+        self.column_cache = {}
+        self.staging_tables = []
+
+    def __deepcopy__(self, memo):
+        # Copies start with an empty column cache, the staging tables of the cache are dropped only by this table
+        new_table = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_table
+        for key, value in vars(self).items():
+            if key not in ["column_cache", "staging_tables"]:
+                setattr(new_table, key, deepcopy(value, memo))
+        new_table.column_cache = {}
+        new_table.staging_tables = []
+        return new_table
 
     @validate
     def set_table_filer(self, sql_filter: Optional[str]):
         self.table_filter = _clean_sql_filter(sql_filter)
         if self.flag_dataframe and (self.table_filter is not None):
-            self.df = self.df.query(self.table_filter)
+            self._set_df(self.df.query(self.table_filter))
+        if (not self.flag_dataframe) and (self.sample_rate is not None):
+            # The sample of a SQL table is a predicate, it goes with every new filter
+            self.table_filter = _join_sql_filter([self.table_filter, self._get_sample_filter()])
+
+    def _set_sample(self):
+        # The frame is sampled once, filters and copies of the table work on the sampled rows.
+        # Rows are sampled by hash of the index, so all the rows with the same index are in the sample or none
+        if self.index_column is not None:
+            hashes = pd.util.hash_pandas_object(self.df[self.index_column], index=False).values
+            mask = (hashes % SAMPLE_HASH_BUCKETS) < int(round(self.sample_rate * SAMPLE_HASH_BUCKETS))
+        else:
+            mask = np.random.default_rng(SAMPLE_SEED).random(self.df.shape[0]) < self.sample_rate
+        self._set_df(self.df[mask])
+
+    def _get_sample_filter(self) -> str:
+        if self.source.sample_filter_sql is None:
+            raise Exception("Sampling is not available for this source type.")
+        # Every query must see the same rows: SQL tables are sampled by hash of the index
+        if self.index_column is None:
+            raise Exception("index_column is required to sample a SQL table.")
+        return _clean_sql_filter(self.source.sample_filter_sql(self.index_column, self.sample_rate))
+
+    def _set_df(self, df: pd.DataFrame):
+        # Positions of the checks already run refer to the previous frame
+        for check in getattr(self, "check_list", []):
+            check.keep_ko_rows()
+        self.df = df
+        self.ko_mask = None
+        self.ko_mask_positions = {}
+        self.clear_column_cache()
 
     @validate
     def set_output_name(self, name: Optional[str]):
@@ -150,20 +217,69 @@ class Table:
 
     def calculate_result_info(self):
         self.get_number_of_rows()
+        if self.sample_rate is not None:
+            # Counts are on the sample, the estimates for the whole table are kept apart
+            self.n_rows_estimate = int(round(self.n_rows / self.sample_rate))
+            for check in self.check_list:
+                check.set_estimate(self.n_rows, self.sample_rate)
         self.n_checks = len([a for a in self.check_list if not a.flag_warning])
         self.n_warning_checks = len([a for a in self.check_list if a.flag_warning])
         self._create_ko_rows()
-        if not any([a.flag_over_max_rows for a in self.check_list if not a.flag_warning]):
-            df = self.get_ko_rows(consider_warnings=False)
-            self.number_unique_rows_ko = df.shape[0]
-        if not any([a.flag_over_max_rows for a in self.check_list if a.flag_warning]):
-            df = self.get_ko_rows(consider_warnings=True)
-            self.number_unique_rows_warning = df[df[TAG_FLAG_ONLY_WARNING]].shape[0]
+        self.number_unique_rows_ko = None
+        self.number_unique_rows_warning = None
+        if self.unique_rows_sql_flag and (not self.flag_dataframe) and \
+                (len(self._get_fusable_checks(self.check_list)) == len(self.check_list)):
+            self.get_unique_rows_ko_sql()
+        else:
+            # Rows are deduplicated in pandas, so the count is exact only if every KO row was downloaded
+            if self._all_ko_rows_downloaded(flag_warning=False):
+                df = self.get_ko_rows(consider_warnings=False)
+                self.number_unique_rows_ko = df.shape[0]
+            if self._all_ko_rows_downloaded(flag_warning=True):
+                df = self.get_ko_rows(consider_warnings=True)
+                self.number_unique_rows_warning = df[df[TAG_FLAG_ONLY_WARNING]].shape[0]
         self.max_number_ko = max([a.n_ko for a in self.check_list if not a.flag_warning], default=0)
         self.max_number_warnings = max([a.n_ko for a in self.check_list if a.flag_warning], default=0)
         self.total_number_ko = sum([a.n_ko for a in self.check_list if not a.flag_warning])
         self.total_number_warnings = sum([a.n_ko for a in self.check_list if a.flag_warning])
 
+    def _all_ko_rows_downloaded(self, flag_warning: bool) -> bool:
+        return all([(a.n_ko == 0) or ((a.ko_rows is not None) and (not a.flag_over_max_rows))
+                    for a in self.check_list if a.flag_warning == flag_warning])
+
+    def create_unique_rows_ko_sql(self) -> str:
+        # A row is KO if any check fails on it, warning-only if it fails only warning checks
+        ko_sql = []
+        warning_sql = []
+        for check in self._get_fusable_checks(self.check_list):
+            sql_filter = [f for f in check._get_sql_ignore_filters() if f != self.table_filter]
+            sql_filter.append(check._create_sql_negative_filter())
+            sql_filter = [f"({f})" for f in sql_filter if (f is not None) and (len(f) > 0)]
+            sql_filter = f"({_join_sql_filter(sql_filter)})"
+            if check.flag_warning:
+                warning_sql.append(sql_filter)
+            else:
+                ko_sql.append(sql_filter)
+        ko_sql = " OR ".join(ko_sql) if len(ko_sql) > 0 else "1 = 0"
+        warning_sql = " OR ".join(warning_sql) if len(warning_sql) > 0 else "1 = 0"
+        filter_sql = _aggregate_sql_filter(self.table_filter)
+        query = f"""
+        SELECT 
+            count(*) as n_rows,
+            SUM(CASE WHEN {ko_sql} THEN 1 ELSE 0 END) as n_rows_ko,
+            SUM(CASE WHEN {ko_sql} THEN 0 WHEN {warning_sql} THEN 1 ELSE 0 END) as n_rows_warning
+        from {self.db_name}
+        {filter_sql}
+        """
+        return query
+
+    def get_unique_rows_ko_sql(self):
+        df = self.source.run_query(self.create_unique_rows_ko_sql())
+        self.n_rows = df["n_rows"].values[0]
+        self.number_unique_rows_ko = 0 if pd.isna(df["n_rows_ko"].values[0]) else int(df["n_rows_ko"].values[0])
+        self.number_unique_rows_warning = \
+            0 if pd.isna(df["n_rows_warning"].values[0]) else int(df["n_rows_warning"].values[0])
+
     def get_number_of_rows(self, refresh: bool = False):
         if self.flag_dataframe:
             self.n_rows = self.df.shape[0]
@@ -188,10 +304,42 @@ class Table:
         else:
             return len([a for a in self.check_list if a.flag_warning]) > 0
 
+    def _create_ko_rows_bitmask(self, check_list: list) -> pd.DataFrame:
+        # Rows are identified by position: each KO row gets the bitset of its failed checks and every
+        # distinct bitset is turned into the descriptions once
+        positions = np.unique(np.concatenate([check.ko_positions for check in check_list]))
+        failed_checks = np.zeros((positions.shape[0], len(check_list)), dtype=bool)
+        for i, check in enumerate(check_list):
+            failed_checks[np.searchsorted(positions, check.ko_positions), i] = True
+        bitsets, bitset_ids = np.unique(np.packbits(failed_checks, axis=1), axis=0, return_inverse=True)
+        bitsets = np.unpackbits(bitsets, axis=1, count=len(check_list)).astype(bool)
+        descriptions = []
+        for bitset in bitsets:
+            checks = [check for check, failed in zip(check_list, bitset) if failed]
+            descriptions.append((
+                " - ".join(dict.fromkeys([c.check_description for c in checks if not c.flag_warning])) or None,
+                " - ".join(dict.fromkeys([c.check_description for c in checks if c.flag_warning])) or None,
+                all([c.flag_warning for c in checks])
+            ))
+        descriptions = pd.DataFrame(descriptions, columns=[TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION,
+                                                           TAG_FLAG_WARNING])
+
+        column_list = []
+        for check in check_list:
+            output_columns = check.output_columns if check.output_columns is not None else self.get_column_names()
+            column_list += [col for col in output_columns if col not in column_list]
+        df = self.get_rows_by_positions(positions, column_list).reset_index(drop=True)
+        descriptions = descriptions.iloc[bitset_ids.reshape(-1)].reset_index(drop=True)
+        return pd.concat([df, descriptions], axis=1)
+
     def _create_ko_rows(self):
         list_ko_rows = []
+        bitmask_checks = [check for check in self.check_list
+                          if check.flag_ko and (check.ko_positions is not None)]
+        if len(bitmask_checks) > 0:
+            list_ko_rows.append(self._create_ko_rows_bitmask(bitmask_checks))
         for check in self.check_list:
-            if check.flag_ko:
+            if check.flag_ko and (check.ko_positions is None):
                 _df = check.ko_rows
                 if _df is not None:
                     if check.flag_warning:
@@ -205,6 +353,17 @@ class Table:
 
         drop_columns_list = [TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION, TAG_FLAG_WARNING]
 
+        if len(list_ko_rows) == 0:
+            self.ko_rows = pd.DataFrame(columns=drop_columns_list + [TAG_FLAG_ONLY_WARNING])
+            return
+        if len(list_ko_rows) == 1 and (len(bitmask_checks) > 0):
+            df = list_ko_rows[0]
+            df[[TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION]] = \
+                df[[TAG_CHECK_DESCRIPTION, TAG_WARNING_DESCRIPTION]].fillna("")
+            df[TAG_FLAG_ONLY_WARNING] = df[TAG_CHECK_DESCRIPTION].str.len() == 0
+            self.ko_rows = df
+            return
+        # Frames of checks without row positions (joins, SQL tables) are merged by their contents
         df = pd.concat(list_ko_rows, ignore_index=True)
         column_list = list(df.columns)
         column_list = [a for a in column_list if a not in drop_columns_list]
@@ -275,6 +434,289 @@ class Table:
         result = self.source.run_query(query)["n_rows"].values[0]
         self.n_rows = result
 
+    def _get_cached_column(self, key: tuple, function):
+        # Conversions shared by the DataFrame checks, computed once per column: never modify the result
+        if key not in self.column_cache:
+            self.column_cache[key] = function()
+        return self.column_cache[key]
+
+    def clear_column_cache(self):
+        # Staging tables uploaded for the cached keys of the table are dropped with the cache
+        for source, table_name in getattr(self, "staging_tables", []):
+            source.drop_table(table_name)
+        self.staging_tables = []
+        self.column_cache = {}
+
+    def get_key_index(self, key_columns: List[str]) -> KeyIndex:
+        # Keys of a dimension table, shared by all the checks joining on the same columns
+        return self._get_cached_column(("key_index", tuple(key_columns)),
+                                       lambda: KeyIndex(_concatenate_key_columns(self.df, key_columns)))
+
+    def get_column_string(self, column_name: str, lower: bool = False) -> pd.Series:
+        if lower:
+            return self._get_cached_column(("string_lower", column_name),
+                                           lambda: self.get_column_string(column_name).str.lower())
+        return self._get_cached_column(("string", column_name), lambda: self.df[column_name].astype(str))
+
+    def get_column_datetime(self, column_name: str, format_date: Union[str, None] = None) -> pd.Series:
+        return self._get_cached_column(("datetime", column_name, format_date),
+                                       lambda: pd.to_datetime(self.df[column_name], format=format_date,
+                                                              errors="coerce"))
+
+    def get_column_numeric(self, column_name: str) -> pd.Series:
+        return self._get_cached_column(("numeric", column_name),
+                                       lambda: pd.to_numeric(self.df[column_name], errors="coerce"))
+
+    def get_column_names(self) -> List[str]:
+        return list(self.df.columns)
+
+    def get_rows_by_positions(self, positions: np.ndarray, columns: Union[List[str], None] = None) -> pd.DataFrame:
+        df = self.df.iloc[positions]
+        if columns is not None:
+            df = df[columns]
+        return df
+
+    def get_mask_not_empthy(self, column_name: str) -> np.ndarray:
+        mask = self._get_cached_column(("not_empthy", column_name),
+                                       lambda: self.df[column_name].notnull().values &
+                                               (self.get_column_string(column_name) != "").values)
+        # Checks build their masks in place on the returned array
+        return mask.copy()
+
+    def compute_check_masks(self, check_list: list):
+        # Checks are evaluated one at a time on the same frame and stored as one bit per row and check
+        executor_masks = {}
+        pending_checks = [check for check in check_list if check not in self.ko_mask_positions]
+        # Sending the frame to the processes pays off only for the batch of checks of a deferred run
+        if (self.mask_executor is not None) and (len(pending_checks) > 1):
+            executor_masks = self.mask_executor.compute_masks(self, pending_checks)
+        for check in check_list:
+            if check in self.ko_mask_positions:
+                continue
+            if check in executor_masks:
+                mask = executor_masks[check]
+            else:
+                mask = self._get_check_mask_values(check)
+            if mask is None:
+                continue
+            position = len(self.ko_mask_positions)
+            if position % 8 == 0:
+                new_column = np.zeros((mask.shape[0], 1), dtype=np.uint8)
+                self.ko_mask = new_column if self.ko_mask is None else np.hstack([self.ko_mask, new_column])
+            self.ko_mask[:, position // 8] |= np.asarray(mask, dtype=np.uint8) << (7 - position % 8)
+            self.ko_mask_positions[check] = position
+
+    def _get_check_mask_values(self, check) -> Optional[np.ndarray]:
+        return check._get_mask_dataframe()
+
+    def get_check_mask(self, check) -> Optional[np.ndarray]:
+        self.compute_check_masks([check])
+        if check not in self.ko_mask_positions:
+            return None
+        position = self.ko_mask_positions[check]
+        return ((self.ko_mask[:, position // 8] >> (7 - position % 8)) & 1).astype(bool)
+
+    def get_mask_matrix(self) -> np.ndarray:
+        # Rows x checks boolean matrix, columns ordered as in ko_mask_positions
+        if self.ko_mask is None:
+            return np.zeros((self.df.shape[0], 0), dtype=bool)
+        return np.unpackbits(self.ko_mask, axis=1, count=len(self.ko_mask_positions)).astype(bool)
+
+    def _get_fusable_checks(self, check_list: list) -> list:
+        if self.flag_dataframe:
+            return []
+        return [check for check in check_list if check._create_sql_negative_filter() is not None]
+
+    def create_fused_number_ko_sql(self, check_list: Union[list, None] = None) -> str:
+        # One scan for all the checks: every check becomes a SUM(CASE WHEN ...) column
+        if check_list is None:
+            check_list = self.check_list
+        check_list = self._get_fusable_checks(check_list)
+        columns_sql = ["count(*) as n_rows"]
+        for i, check in enumerate(check_list):
+            sql_filter = [f for f in check._get_sql_ignore_filters() if f != self.table_filter]
+            sql_filter.append(check._create_sql_negative_filter())
+            sql_filter = [f"({f})" for f in sql_filter if (f is not None) and (len(f) > 0)]
+            columns_sql.append(f"SUM(CASE WHEN {_join_sql_filter(sql_filter)} THEN 1 ELSE 0 END) as n_ko_{i}")
+        columns_sql = """,
+            """.join(columns_sql)
+        filter_sql = _aggregate_sql_filter(self.table_filter)
+        query = f"""
+        SELECT 
+            {columns_sql}
+        from {self.db_name}
+        {filter_sql}
+        """
+        return query
+
+    def get_fused_number_ko_sql(self, check_list: Union[list, None] = None) -> Dict:
+        if check_list is None:
+            check_list = self.check_list
+        check_list = self._get_fusable_checks(check_list)
+        if len(check_list) == 0:
+            return {}
+        query = self.create_fused_number_ko_sql(check_list)
+        df = self.source.run_query(query)
+        return self._read_fused_number_ko(df, check_list)
+
+    def _read_fused_number_ko(self, df: pd.DataFrame, check_list: list) -> Dict:
+        self.n_rows = df["n_rows"].values[0]
+        result = {}
+        for i, check in enumerate(check_list):
+            n_ko = df[f"n_ko_{i}"].values[0]
+            result[check] = 0 if pd.isna(n_ko) else int(n_ko)
+        return result
+
+    async def aget_fused_number_ko_sql(self, check_list: Union[list, None] = None) -> Dict:
+        if check_list is None:
+            check_list = self.check_list
+        check_list = self._get_fusable_checks(check_list)
+        if len(check_list) == 0:
+            return {}
+        query = self.create_fused_number_ko_sql(check_list)
+        df = await self.source.arun_query(query)
+        return self._read_fused_number_ko(df, check_list)
+
+    def refresh_number_ko(self):
+        if self.flag_dataframe:
+            return
+        fused_n_ko = self.get_fused_number_ko_sql()
+        for check in self.check_list:
+            if check in fused_n_ko:
+                n_ko = fused_n_ko[check]
+            else:
+                n_ko = check._get_number_ko_sql()
+            check._set_result(n_ko, check.ko_rows, check.flag_over_max_rows)
+
+    def _run_check(self, check, get_rows_flag: Union[bool, None] = None) -> Optional[int]:
+        if self.deferred:
+            self.planned_checks.append((check, get_rows_flag))
+            return None
+        return check.check(get_rows_flag=get_rows_flag)
+
+    def _pop_planned_checks(self) -> list:
+        planned_checks = {}
+        for check, get_rows_flag in self.planned_checks:
+            key = (check._get_plan_key(), get_rows_flag)
+            if key not in planned_checks:
+                planned_checks[key] = (check, get_rows_flag)
+        self.planned_checks = []
+        return list(planned_checks.values())
+
+    def _submit(self, function, *args) -> Future:
+        # DataFrame checks share the lazily built column cache and KO mask of the table, and their pandas work
+        # holds the GIL: threads would only add races, so they run on the calling thread
+        if (not self.flag_dataframe) and (self.source.max_workers > 1):
+            return self.source.submit(function, *args)
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def _get_rows_batches(self, planned_checks: list, fused_n_ko: Dict) -> list:
+        # Failing checks counted by the fused query that need the same columns get their rows together
+        groups = {}
+        for check, get_rows_flag in planned_checks:
+            if get_rows_flag is None:
+                get_rows_flag = self.get_rows_flag
+            if get_rows_flag and (fused_n_ko.get(check, 0) > 0):
+                key = _output_column_to_sql(check.output_columns)
+                groups.setdefault(key, []).append(check)
+        batches = []
+        for check_list in groups.values():
+            for i in range(0, len(check_list), MAX_CHECKS_ROWS_BATCH):
+                batch = check_list[i:i + MAX_CHECKS_ROWS_BATCH]
+                if len(batch) > 1:
+                    batches.append(batch)
+        return batches
+
+    def create_batched_rows_ko_sql(self, check_list: list) -> str:
+        queries = []
+        for i, check in enumerate(check_list):
+            query = check._create_standard_rows_ko_sql(check._create_sql_negative_filter(),
+                                                       extra_columns=[f"{i} as {COLUMN_CHECK_ID}"])
+            queries.append(f"SELECT * FROM ({query}) t{i}")
+        return """
+        UNION ALL
+        """.join(queries)
+
+    def _split_batched_rows_ko(self, df: pd.DataFrame, check_list: list, fused_n_ko: Dict):
+        for i, check in enumerate(check_list):
+            df_ko = df.loc[df[COLUMN_CHECK_ID] == i].drop(columns=COLUMN_CHECK_ID).reset_index(drop=True)
+            check._set_rows_result(fused_n_ko[check], df_ko, True)
+
+    def get_batched_rows_ko_sql(self, check_list: list, fused_n_ko: Dict):
+        df = self.source.run_query(self.create_batched_rows_ko_sql(check_list))
+        self._split_batched_rows_ko(df, check_list, fused_n_ko)
+
+    async def aget_batched_rows_ko_sql(self, semaphore: asyncio.Semaphore, check_list: list, fused_n_ko: Dict):
+        async with semaphore:
+            df = await self.source.arun_query(self.create_batched_rows_ko_sql(check_list))
+        self._split_batched_rows_ko(df, check_list, fused_n_ko)
+
+    def _submit_planned_checks(self, planned_checks: list, fused_n_ko: Dict) -> list:
+        if self.flag_dataframe:
+            self.compute_check_masks([check for check, _ in planned_checks])
+        batch_jobs = {}
+        for batch in self._get_rows_batches(planned_checks, fused_n_ko):
+            job = self._submit(self.get_batched_rows_ko_sql, batch, fused_n_ko)
+            for check in batch:
+                batch_jobs[check] = job
+        return [(check, batch_jobs[check] if check in batch_jobs
+                 else self._submit(check._compute, get_rows_flag, fused_n_ko.get(check)))
+                for check, get_rows_flag in planned_checks]
+
+    def _register_planned_checks(self, jobs: list):
+        # Results are collected in plan order so check_list doesn't depend on query timing
+        for check, job in jobs:
+            job.result()
+            self.check_list.append(check)
+        self.ko_rows = None
+
+    def run(self):
+        planned_checks = self._pop_planned_checks()
+        fused_n_ko = self.get_fused_number_ko_sql([check for check, _ in planned_checks])
+        self._register_planned_checks(self._submit_planned_checks(planned_checks, fused_n_ko))
+
+    async def _acompute_check(self, semaphore: asyncio.Semaphore, check, get_rows_flag: Union[bool, None],
+                              n_ko: Union[int, None]):
+        async with semaphore:
+            if n_ko is not None:
+                await check._acompute(get_rows_flag, n_ko)
+            else:
+                # Checks with their own queries are sync code: run them in a thread, queries are sent back
+                # to the event loop by Sources.run_query
+                await self.source.arun_in_executor(check._compute, get_rows_flag, n_ko)
+
+    def _compute_planned_checks_dataframe(self, planned_checks: list):
+        self.compute_check_masks([check for check, _ in planned_checks])
+        for check, get_rows_flag in planned_checks:
+            check._compute(get_rows_flag, None)
+
+    async def _arun_planned_checks(self, semaphore: asyncio.Semaphore, planned_checks: list):
+        if self.flag_dataframe:
+            # The checks run in a thread: the ones against SQL dimension tables send their queries back to the loop
+            loop = asyncio.get_running_loop()
+            for check, _ in planned_checks:
+                dimension_table = getattr(check, "dimension_table", None)
+                if (dimension_table is not None) and (not dimension_table.flag_dataframe):
+                    dimension_table.source.loop = loop
+            async with semaphore:
+                await loop.run_in_executor(None, self._compute_planned_checks_dataframe, planned_checks)
+            return
+        async with semaphore:
+            fused_n_ko = await self.aget_fused_number_ko_sql([check for check, _ in planned_checks])
+        batches = self._get_rows_batches(planned_checks, fused_n_ko)
+        batched_checks = [check for batch in batches for check in batch]
+        await asyncio.gather(*[self.aget_batched_rows_ko_sql(semaphore, batch, fused_n_ko) for batch in batches],
+                             *[self._acompute_check(semaphore, check, get_rows_flag, fused_n_ko.get(check))
+                               for check, get_rows_flag in planned_checks if check not in batched_checks])
+
+    async def arun(self, max_concurrency: int = 10):
+        planned_checks = self._pop_planned_checks()
+        await self._arun_planned_checks(asyncio.Semaphore(max_concurrency), planned_checks)
+        self.check_list += [check for check, _ in planned_checks]
+        self.ko_rows = None
+
     # Check methods
 
     @validate
@@ -295,7 +737,7 @@ class Table:
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            n_ko = check.check(get_rows_flag=get_rows_flag)
+            n_ko = self._run_check(check, get_rows_flag)
         else:
             n_ko = None
 
@@ -309,17 +751,18 @@ class Table:
                               output_columns: Union[List[str], str, None] = None,
                               flag_warning: bool = False,
                               check_description: Union[List[str], str, None] = None,
-                              n_max_rows_output: Union[int, None] = None) -> Optional[int]:
+                              n_max_rows_output: Union[int, None] = None,
+                              approximate: bool = False) -> Optional[int]:
 
         if self.index_column is not None:
-            check = ValuesDuplicate(self, self.index_column)
+            check = ValuesDuplicate(self, self.index_column, approximate=approximate)
             check.initialize_params(check_description=check_description,
                                     flag_warning=flag_warning,
                                     n_max_rows_output=n_max_rows_output,
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            n_ko = check.check(get_rows_flag=get_rows_flag)
+            n_ko = self._run_check(check, get_rows_flag)
         else:
             n_ko = None
 
@@ -349,7 +792,7 @@ class Table:
                                             ignore_filter=ignore_filter,
                                             columns_not_null=columns_not_null,
                                             output_columns=output_columns)
-                    result[col] = check.check(get_rows_flag=get_rows_flag)
+                    result[col] = self._run_check(check, get_rows_flag)
         else:
             if isinstance(columns, str):
                 check = NotEmpthyColumn(self, columns)
@@ -359,7 +802,7 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result = check.check(get_rows_flag=get_rows_flag)
+                result = self._run_check(check, get_rows_flag)
             else:
                 result = {}
                 for col in columns:
@@ -370,7 +813,7 @@ class Table:
                                             ignore_filter=ignore_filter,
                                             columns_not_null=columns_not_null,
                                             output_columns=output_columns)
-                    result[col] = check.check(get_rows_flag=get_rows_flag)
+                    result[col] = self._run_check(check, get_rows_flag)
 
         return result
 
@@ -383,19 +826,20 @@ class Table:
                                output_columns: Union[List[str], str, None] = None,
                                flag_warning: bool = False,
                                check_description: Union[List[str], str, None] = None,
-                               n_max_rows_output: Union[int, None] = None) -> Dict:
+                               n_max_rows_output: Union[int, None] = None,
+                               approximate: bool = False) -> Dict:
         if isinstance(columns, str):
             columns = [columns]
         result = {}
         for col in columns:
-            check = ValuesDuplicate(self, col)
+            check = ValuesDuplicate(self, col, approximate=approximate)
             check.initialize_params(check_description=check_description,
                                     flag_warning=flag_warning,
                                     n_max_rows_output=n_max_rows_output,
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            result[col] = check.check(get_rows_flag=get_rows_flag)
+            result[col] = self._run_check(check, get_rows_flag)
         return result
 
     @validate
@@ -423,7 +867,7 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result[col] = check.check(get_rows_flag=get_rows_flag)
+                result[col] = self._run_check(check, get_rows_flag)
 
         return result
 
@@ -462,7 +906,7 @@ class Table:
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            result = check.check(get_rows_flag=get_rows_flag)
+            result = self._run_check(check, get_rows_flag)
         else:
             result = {}
             for col in columns:
@@ -478,7 +922,7 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result[col] = check.check(get_rows_flag=get_rows_flag)
+                result[col] = self._run_check(check, get_rows_flag)
         return result
 
     @validate
@@ -509,7 +953,7 @@ class Table:
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            result = check.check(get_rows_flag=get_rows_flag)
+            result = self._run_check(check, get_rows_flag)
         else:
             result = {}
             for col in columns:
@@ -525,7 +969,7 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result[col] = check.check(get_rows_flag=get_rows_flag)
+                result[col] = self._run_check(check, get_rows_flag)
         return result
 
     def check_date_column_not_in_future(self,
@@ -560,7 +1004,7 @@ class Table:
                           output_columns: Union[List[str], str, None] = None,
                           flag_warning: bool = False,
                           check_description: Union[str, None] = None,
-                          n_max_rows_output: Union[int, None] = None) -> int:
+                          n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         self.set_datetime_columns(ascending_columns, replace_formats=False)
         check = DatesOrder(
             self,
@@ -573,7 +1017,7 @@ class Table:
                                 ignore_filter=ignore_filter,
                                 columns_not_null=columns_not_null,
                                 output_columns=output_columns)
-        return check.check(get_rows_flag=get_rows_flag)
+        return self._run_check(check, get_rows_flag)
 
     @validate
     def check_values_order(self,
@@ -585,7 +1029,7 @@ class Table:
                            output_columns: Union[List[str], str, None] = None,
                            flag_warning: bool = False,
                            check_description: Union[str, None] = None,
-                           n_max_rows_output: Union[int, None] = None) -> int:
+                           n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         check = ValuesOrder(
             self,
             ascending_columns=ascending_columns,
@@ -597,7 +1041,7 @@ class Table:
                                 ignore_filter=ignore_filter,
                                 columns_not_null=columns_not_null,
                                 output_columns=output_columns)
-        return check.check(get_rows_flag=get_rows_flag)
+        return self._run_check(check, get_rows_flag)
 
     @validate
     def check_values_in_list(self,
@@ -622,7 +1066,7 @@ class Table:
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            result = check.check(get_rows_flag=get_rows_flag)
+            result = self._run_check(check, get_rows_flag)
         else:
             result = {}
             for col in columns:
@@ -630,14 +1074,13 @@ class Table:
                                      col,
                                      values_list=values_list,
                                      case_sensitive=case_sensitive)
-                result = check.check(get_rows_flag=get_rows_flag)
                 check.initialize_params(check_description=check_description,
                                         flag_warning=flag_warning,
                                         n_max_rows_output=n_max_rows_output,
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result[col] = check.check(get_rows_flag=get_rows_flag)
+                result[col] = self._run_check(check, get_rows_flag)
         return result
 
     @validate
@@ -663,7 +1106,7 @@ class Table:
                                     ignore_filter=ignore_filter,
                                     columns_not_null=columns_not_null,
                                     output_columns=output_columns)
-            result = check.check(get_rows_flag=get_rows_flag)
+            result = self._run_check(check, get_rows_flag)
         else:
             result = {}
             for col in columns:
@@ -677,7 +1120,7 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result[col] = check.check(get_rows_flag=get_rows_flag)
+                result[col] = self._run_check(check, get_rows_flag)
         return result
 
     @validate
@@ -689,7 +1132,7 @@ class Table:
                                get_rows_flag: Union[bool, None] = None,
                                output_columns: Union[List[str], str, None] = None,
                                flag_warning: bool = False,
-                               n_max_rows_output: Union[int, None] = None) -> int:
+                               n_max_rows_output: Union[int, None] = None) -> Optional[int]:
 
         negative_condition = _clean_sql_filter(negative_condition)
         if check_description is None:
@@ -705,7 +1148,7 @@ class Table:
                                 ignore_filter=ignore_condition,
                                 columns_not_null=columns_not_null,
                                 output_columns=output_columns)
-        return check.check(get_rows_flag=get_rows_flag)
+        return self._run_check(check, get_rows_flag)
 
     @validate
     def check_match_dimension_table(self,
@@ -718,7 +1161,7 @@ class Table:
                                     output_columns: Union[List[str], str, None] = None,
                                     check_description: Union[str, None] = None,
                                     flag_warning: bool = False,
-                                    n_max_rows_output: Union[int, None] = None) -> int:
+                                    n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         check = MatchDImensionTable(
             self,
             foreign_keys=foreign_keys,
@@ -731,7 +1174,7 @@ class Table:
                                 ignore_filter=ignore_filter,
                                 columns_not_null=columns_not_null,
                                 output_columns=output_columns)
-        return check.check(get_rows_flag=get_rows_flag)
+        return self._run_check(check, get_rows_flag)
 
     @validate
     def check_dates_order_dimension_table(self,
@@ -747,14 +1190,14 @@ class Table:
                                           output_columns: Union[List[str], str, None] = None,
                                           check_description: Union[str, None] = None,
                                           flag_warning: bool = False,
-                                          n_max_rows_output: Union[int, None] = None) -> int:
+                                          n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         self.set_datetime_columns(left_columns, replace_formats=False)
         dimension_table.set_datetime_columns(right_columns, replace_formats=False)
         if isinstance(left_columns, str):
             left_columns = [left_columns]
         if isinstance(right_columns, str):
             right_columns = [right_columns]
-        result = 0
+        result = None if self.deferred else 0
         for lc in left_columns:
             for rc in right_columns:
                 check = DatesOrderDimensionTable(
@@ -772,7 +1215,9 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result += check.check(get_rows_flag=get_rows_flag)
+                n_ko = self._run_check(check, get_rows_flag)
+                if n_ko is not None:
+                    result += n_ko
         return result
 
     @validate
@@ -789,12 +1234,12 @@ class Table:
                                            output_columns: Union[List[str], str, None] = None,
                                            check_description: Union[str, None] = None,
                                            flag_warning: bool = False,
-                                           n_max_rows_output: Union[int, None] = None) -> int:
+                                           n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         if isinstance(left_columns, str):
             left_columns = [left_columns]
         if isinstance(right_columns, str):
             right_columns = [right_columns]
-        result = 0
+        result = None if self.deferred else 0
         for lc in left_columns:
             for rc in right_columns:
                 check = ValuesOrderDimensionTable(
@@ -812,7 +1257,9 @@ class Table:
                                         ignore_filter=ignore_filter,
                                         columns_not_null=columns_not_null,
                                         output_columns=output_columns)
-                result += check.check(get_rows_flag=get_rows_flag)
+                n_ko = self._run_check(check, get_rows_flag)
+                if n_ko is not None:
+                    result += n_ko
         return result
 
     def check_period_intersection_rows(self,
@@ -826,7 +1273,7 @@ class Table:
                                        output_columns: Union[List[str], str, None] = None,
                                        flag_warning: bool = False,
                                        check_description: Union[str, None] = None,
-                                       n_max_rows_output: Union[int, None] = None) -> int:
+                                       n_max_rows_output: Union[int, None] = None) -> Optional[int]:
         self.set_datetime_columns([start_date, end_date], replace_formats=False)
         check = PeriodIntersection(
             self,
@@ -841,7 +1288,7 @@ class Table:
                                 ignore_filter=ignore_filter,
                                 columns_not_null=columns_not_null,
                                 output_columns=output_columns)
-        return check.check(get_rows_flag=get_rows_flag)
+        return self._run_check(check, get_rows_flag)
 
     def create_html_output(self,
                            title: str = None,
@@ -1,3 +1,4 @@
+import re
 from typing import Union, List
 
 FISCALCODE_REGEX = r"(?:[A-Z][AEIOU][AEIOUX]|[B-DF-HJ-NP-TV-Z]{2}[A-Z]){2}(?:[\dLMNP-V]{2}(?:[A-EHLMPR-T](?:[04LQ][1-9MNP-V]|[15MR][\dLMNP-V]|[26NS][0-8LMNP-U])|[DHPS][37PT][0L]|[ACELMRT][37PT][01LM]|[AC-EHLMPR-T][26NS][9V])|(?:[02468LNQSU][048LQU]|[13579MPRTV][26NS])B[26NS][9V])(?:[A-MZ][1-9MNP-V][\dLMNP-V]{2}|[A-M][0L](?:[1-9MNP-V][\dLMNP-V]|[0L][1-9MNP-V]))[A-Z]"
@@ -11,6 +12,18 @@ TAG_CHECK_DESCRIPTION = "check_description"
 TAG_WARNING_DESCRIPTION = "warning_description"
 DEFAULT_CHECK_DESCRIPTION = "Custom condition failed"
 COLUMN_CURRENT_CHECK = "current_check_data_quality"
+COLUMN_NUMBER_KO = "number_ko_data_quality"
+COLUMN_CHECK_ID = "check_id_data_quality"
+MAX_CHECKS_ROWS_BATCH = 20
+SAMPLE_HASH_BUCKETS = 1000000
+SAMPLE_SEED = 0
+CONFIDENCE_Z = 1.96
+COLUMN_KEY = "key_data_quality"
+KEY_SEPARATOR = "-"
+MAX_LITERAL_KEYS_BYTES = 16 * 1024
+MAX_ARRAY_KEYS_BYTES = 512 * 1024
+KEYS_CHUNK_BYTES = 128 * 1024
+KEYS_CHUNK_SIZE = 10000
 
 
 def _human_format(num):
@@ -59,22 +72,51 @@ def _clean_sql_filter(text):
     return text
 
 
-def _aggregate_sql_filter(filter_list):
+def _join_sql_filter(filter_list):
     if isinstance(filter_list, list):
+        filter_list = [a for f in filter_list for a in (f if isinstance(f, list) else [f])]
         filter_list = [f for f in filter_list if (f is not None) and (len(f) > 0)]
     elif isinstance(filter_list, str):
         filter_list = [filter_list]
 
     if (filter_list is None) or len(filter_list) == 0:
+        sql_filter = None
+    else:
+        # Sorted so the same filters always give the same SQL text (and hit the db result cache)
+        filter_list = sorted(set(filter_list))
+        sql_filter = " AND ".join(filter_list)
+
+    return sql_filter
+
+
+def _aggregate_sql_filter(filter_list):
+    sql_filter = _join_sql_filter(filter_list)
+    if sql_filter is None:
         sql_filter = ""
     else:
-        filter_list = list(set(filter_list))
-        sql_filter = """ WHERE """
-        sql_filter += " AND ".join(filter_list)
+        sql_filter = """ WHERE """ + sql_filter
 
     return sql_filter
 
 
+_SQL_TOKEN_REGEX = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`|--[^\n]*\n?|\s+)""")
+
+
+def _normalize_sql(query: str) -> str:
+    # Collapse whitespace outside of quoted strings and keep line comments closed by a newline
+    result = []
+    for token in _SQL_TOKEN_REGEX.split(query):
+        if (token is None) or (len(token) == 0):
+            continue
+        if token.isspace():
+            result.append(" ")
+        elif token.startswith("--"):
+            result.append(token.rstrip("\n") + "\n")
+        else:
+            result.append(token)
+    return "".join(result).strip()
+
+
 def _output_column_to_sql(output_columns, table_tag=None):
     if output_columns is None:
         if table_tag is None:
@@ -125,3 +167,43 @@ def _clean_string_float_inf_columns_df(series):
     return result
 
 
+def _concatenate_key_columns(df, columns: List[str]):
+    keys = _clean_string_float_inf_columns_df(df[columns[0]])
+    for col in columns[1:]:
+        keys = keys + KEY_SEPARATOR + _clean_string_float_inf_columns_df(df[col])
+    return keys
+
+
+def _key_literal_size(key: str) -> int:
+    # Bytes of the key written as a quoted literal followed by a comma
+    return len(key.encode("utf-8")) + 3
+
+
+def _chunk_keys_by_size(keys: List[str], max_bytes: int) -> List[List[str]]:
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for key in keys:
+        key_size = _key_literal_size(key)
+        if (len(chunk) > 0) and (chunk_size + key_size > max_bytes):
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(key)
+        chunk_size += key_size
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+def _referenced_columns(value, column_names: set) -> set:
+    # Column names used by a check parameter: the value itself or any identifier in a filter
+    if isinstance(value, str):
+        if value in column_names:
+            return {value}
+        return set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", value)) & column_names
+    if isinstance(value, (list, tuple, set)):
+        return set().union(*[_referenced_columns(v, column_names) for v in value])
+    if isinstance(value, dict):
+        return _referenced_columns(list(value.keys()), column_names)
+    return set()
@@ -17,6 +17,7 @@ setup(
     url="https://github.com/enelx-customer-business-analytics/enelx_utils.git",
     packages=find_packages(exclude=("data_quality.src")),
     install_requires=requirements,
+    extras_require={"parquet": ["pyarrow"], "duckdb": ["duckdb"]},
     include_package_data=True,
     package_data={
         },
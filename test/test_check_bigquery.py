@@ -1,5 +1,7 @@
+import os
 import unittest
 import logging
+import tempfile
 
 import pandas as pd
 from pandas._testing import assert_frame_equal
@@ -336,6 +338,115 @@ class TestCheckSQL(unittest.TestCase):
                                                   end_date="subscription_end")
         check_results(result_df, test_table)
 
+    def test_fused_number_ko(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        bigquery = dq_session.create_sources(run_query_bigquery, type_sources="bigquery")
+        test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index",
+                                           not_empthy_columns=["dimension_id"])
+        test_table.run_basic_check()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        n_ko_list = [check.n_ko for check in test_table.check_list]
+        test_table.refresh_number_ko()
+        self.assertEqual(n_ko_list, [check.n_ko for check in test_table.check_list])
+
+    def test_concurrent_run(self):
+        dq_session = DataQualitySession()
+        bigquery = dq_session.create_sources(run_query_bigquery, type_sources="bigquery", deferred=True, max_workers=4)
+        table_list = []
+        for db_name in ["index_null", "duplicated_index", "not_empthy_column"]:
+            test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index")
+            test_table.check_index_not_null(get_rows_flag=True)
+            test_table.check_duplicate_index(get_rows_flag=True)
+            table_list.append(test_table)
+        dq_session.run()
+        bigquery.close()
+        for test_table in table_list:
+            self.assertEqual([check.check_description for check in test_table.check_list],
+                             ["Index null", "Duplicated index"])
+
+    def test_query_cache(self):
+        n_queries = []
+
+        def run_query_counted(query: str) -> pd.DataFrame:
+            n_queries.append(query)
+            return run_query_bigquery(query)
+
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        bigquery = dq_session.create_sources(run_query_counted, type_sources="bigquery", get_rows_flag=True,
+                                             cache_size=16)
+        for i in range(2):
+            test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index")
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        self.assertEqual(len(n_queries), 2)
+        self.assertEqual(test_table.check_list[0].n_ko, 2)
+
+    def test_source_type_cache(self):
+        n_queries = []
+
+        def run_query_counted(query: str) -> pd.DataFrame:
+            n_queries.append(query)
+            return run_query_bigquery(query)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "source_types.json")
+            dq_session = DataQualitySession()
+            dq_session.create_sources(run_query_counted, connection_id="bigquery_test",
+                                      source_type_cache_path=cache_path)
+            n_probes = len(n_queries)
+            bigquery = dq_session.create_sources(run_query_counted, connection_id="bigquery_test",
+                                                 source_type_cache_path=cache_path)
+            self.assertEqual(len(n_queries), n_probes)
+            self.assertEqual(bigquery.cast_float_sql("a"), "safe_cast(a as float64)")
+
+    def test_count_with_rows(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        result_list = []
+        for count_with_rows_flag in [False, True]:
+            bigquery = dq_session.create_sources(run_query_bigquery, type_sources="bigquery", get_rows_flag=True,
+                                                 count_with_rows_flag=count_with_rows_flag)
+            test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index",
+                                               not_empthy_columns=["dimension_id"])
+            test_table.run_basic_check()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+            result_list.append([(check.n_ko, check.ko_rows.shape[0]) for check in test_table.check_list])
+        self.assertEqual(result_list[0], result_list[1])
+
+    def test_batched_rows_ko(self):
+        db_name = "fact_table"
+        result_list = []
+        for deferred in [False, True]:
+            dq_session = DataQualitySession()
+            bigquery = dq_session.create_sources(run_query_bigquery, type_sources="bigquery", get_rows_flag=True,
+                                                 deferred=deferred)
+            test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index",
+                                               not_empthy_columns=["dimension_id"])
+            test_table.run_basic_check()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+            dq_session.run()
+            result_list.append([(check.n_ko, check.ko_rows.astype(object).where(check.ko_rows.notna(), None)
+                                .sort_values(list(check.ko_rows.columns)).to_string(index=False))
+                                for check in test_table.check_list])
+        self.assertEqual(result_list[0], result_list[1])
+
+    def test_unique_rows_sql(self):
+        db_name = "fact_table"
+        result_list = []
+        for unique_rows_sql_flag in [False, True]:
+            dq_session = DataQualitySession()
+            bigquery = dq_session.create_sources(run_query_bigquery, type_sources="bigquery", get_rows_flag=True,
+                                                 unique_rows_sql_flag=unique_rows_sql_flag)
+            test_table = bigquery.create_table(DBBIGQUERY + db_name, index_column="index",
+                                               not_empthy_columns=["dimension_id"])
+            test_table.check_index_not_null()
+            test_table.check_not_empthy_column()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"], flag_warning=True)
+            test_table.calculate_result_info()
+            result_list.append((test_table.number_unique_rows_ko, test_table.number_unique_rows_warning))
+        self.assertEqual(result_list[0], result_list[1])
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
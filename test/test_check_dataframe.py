@@ -1,12 +1,19 @@
 import unittest
 import logging
+import asyncio
+import os
+import tempfile
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from pandas._testing import assert_frame_equal
 
 from data_quality.data_quality_holder import DataQualitySession
+from data_quality.src.process_executor import ARROW_FILE_CACHE_KEY
 from data_quality.src.utils import FISCALCODE_REGEX
+from data_quality.src.key_index import KeyIndex
 
 
 def get_dataframe_for_test(sheet_name):
@@ -287,6 +294,28 @@ class TestCheckDataframe(unittest.TestCase):
         test_table.check_values_order_dimension_table("user_id", dimension_table, "n_products", "max_products", "<=")
         check_results(df, test_table, same_columns=False)
 
+    def test_dimension_key_index(self):
+        dq_session = DataQualitySession()
+        dimension_table = dq_session.create_table_from_dataframe(get_dataframe_for_test("user_list"),
+                                                                 output_name="dimension_table", index_column="id")
+        for db_name in ["products", "products2"]:
+            test_table = dq_session.create_table_from_dataframe(
+                get_dataframe_for_test(db_name).drop(["check_description"], axis=1), output_name=db_name)
+            test_table.check_match_dimension_table("user_id", dimension_table)
+        key_index = dimension_table.get_key_index(["id"])
+        test_table.check_values_order_dimension_table("user_id", dimension_table, "n_products", "max_products", "<=")
+        self.assertIs(dimension_table.get_key_index(["id"]), key_index)
+        dq_session.del_table(dimension_table)
+        self.assertIsNot(dimension_table.get_key_index(["id"]), key_index)
+
+        # Duplicated keys give the rows of a pandas merge
+        left = pd.Series(["b", "x", "a", "b"])
+        right = pd.Series(["a", "b", "c", "b"])
+        left_positions, right_positions = KeyIndex(right).join(left)
+        merge = pd.DataFrame({"key": left, "l": range(4)}).merge(pd.DataFrame({"key": right, "r": range(4)}),
+                                                                 on="key")
+        self.assertEqual(sorted(zip(left_positions, right_positions)), sorted(zip(merge["l"], merge["r"])))
+
     def test_period_intersection_rows1(self):
 
         df = get_dataframe_for_test("period_intersection")
@@ -316,6 +345,336 @@ class TestCheckDataframe(unittest.TestCase):
                            check_names=False, check_dtype=False
                            )
 
+    def test_period_intersection_not_adjacent(self):
+        # The third period of each user overlaps only the first one
+        df = pd.DataFrame({"user_id": [1, 1, 1, 1, 2, 2],
+                           "plan": ["a", "a", "a", "b", "a", "a"],
+                           "start": pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-05", "2021-01-02",
+                                                    "2021-01-01", "2021-01-03"]),
+                           "end": pd.to_datetime(["2021-01-10", "2021-01-03", "2021-01-06", "2021-01-03",
+                                                  "2021-01-03", "2021-01-04"])})
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df, output_name="periods")
+        n_ko = test_table.check_period_intersection_rows(id_columns=["user_id", "plan"], start_date="start",
+                                                         end_date="end")
+        self.assertEqual(n_ko, 3)
+        assert_frame_equal(test_table.check_list[0].ko_rows[df.columns], df.iloc[[0, 1, 2]])
+        n_ko = test_table.check_period_intersection_rows(id_columns=["user_id", "plan"], start_date="start",
+                                                         end_date="end", extremes_exclude=True)
+        self.assertEqual(n_ko, 5)
+
+    def test_deferred_run(self):
+        df = get_dataframe_for_test("fact_table")
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.drop(["check_description"], axis=1), index_column="index",
+                                                            not_empthy_columns=["dimension_id"],
+                                                            output_name="fact_table",
+                                                            deferred=True)
+        test_table.run_basic_check()
+        self.assertIsNone(test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"]))
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        self.assertEqual(len(test_table.check_list), 0)
+        dq_session.run()
+        self.assertEqual(len(test_table.check_list), 4)
+        self.assertEqual(test_table.check_list[-1].n_ko, 2)
+
+    def test_async_run(self):
+        df = get_dataframe_for_test("fact_table")
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.drop(["check_description"], axis=1), index_column="index",
+                                                            not_empthy_columns=["dimension_id"],
+                                                            output_name="fact_table",
+                                                            deferred=True)
+        test_table.run_basic_check()
+        asyncio.run(dq_session.arun(max_concurrency=2))
+        self.assertEqual([check.n_ko for check in test_table.check_list], [0, 0, 3])
+
+    def test_mask_matrix(self):
+        df = get_dataframe_for_test("fact_table")
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.drop(["check_description"], axis=1), index_column="index",
+                                                            not_empthy_columns=["dimension_id"],
+                                                            output_name="fact_table")
+        test_table.run_basic_check()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        mask_matrix = test_table.get_mask_matrix()
+        self.assertEqual(mask_matrix.shape, (df.shape[0], len(test_table.check_list)))
+        self.assertEqual(list(mask_matrix.sum(axis=0)), [check.n_ko for check in test_table.check_list])
+
+    def test_column_cache(self):
+        df = get_dataframe_for_test("period_intersection").drop(["check_description"], axis=1)
+        df = df.astype({"subscription_start": str, "subscription_end": str})
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.copy(), output_name="period_intersection")
+        test_table.check_dates_order(["subscription_start", "subscription_end"])
+        test_table.check_period_intersection_rows(id_columns="user_id",
+                                                  start_date="subscription_start",
+                                                  end_date="subscription_end")
+        assert_frame_equal(test_table.df, df)
+        self.assertIn(("datetime", "subscription_start", None), test_table.column_cache)
+
+    def test_ko_positions(self):
+        df = get_dataframe_for_test("fact_table")
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.drop(["check_description"], axis=1), index_column="index",
+                                                            not_empthy_columns=["dimension_id"],
+                                                            output_name="fact_table")
+        test_table.check_not_empthy_column()
+        check = test_table.check_list[0]
+        self.assertEqual(len(check.ko_positions), check.n_ko)
+        ko_rows = check.ko_rows
+        self.assertEqual(ko_rows.shape[0], check.n_ko)
+        test_table.set_table_filer("index > 5")
+        self.assertIsNone(check.ko_positions)
+        assert_frame_equal(check.ko_rows, ko_rows)
+
+    def test_ko_rows_bitmask(self):
+        df = get_dataframe_for_test("fact_table")
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df.drop(["check_description"], axis=1), index_column="index",
+                                                            not_empthy_columns=["dimension_id"],
+                                                            output_name="fact_table")
+        test_table.run_basic_check()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        test_table.check_values_in_list("dimension_code", ["a"], flag_warning=True, check_description="Only a")
+        test_table.check_custom_condition("dimension_id > 8", flag_warning=True, check_description="Big id")
+        ko_rows = test_table.get_ko_rows().set_index("index")
+        self.assertEqual(ko_rows.shape[0], 9)
+        self.assertEqual(ko_rows.loc[8, "check_description"], "Value in column dimension_code not admitted")
+        self.assertEqual(ko_rows.loc[8, "warning_description"], "Only a - Big id")
+        self.assertTrue(ko_rows.loc[7, "flag_only_warning"])
+
+    def test_streaming_table(self):
+        df = get_dataframe_for_test("period_intersection").drop(["check_description"], axis=1)
+        n_ko_list = []
+        for streaming in [False, True]:
+            dq_session = DataQualitySession()
+            if streaming:
+                test_table = dq_session.create_table_from_chunks((df.iloc[i:i + 3] for i in range(0, df.shape[0], 3)),
+                                                                 output_name="period_intersection",
+                                                                 n_max_rows_output=2)
+            else:
+                test_table = dq_session.create_table_from_dataframe(df, output_name="period_intersection",
+                                                                    deferred=True)
+            test_table.check_period_intersection_rows(id_columns="user_id",
+                                                      start_date="subscription_start",
+                                                      end_date="subscription_end")
+            test_table.check_duplicate_values("user_id")
+            test_table.check_custom_condition("user_id == 1")
+            dq_session.run()
+            n_ko_list.append([check.n_ko for check in test_table.check_list])
+        self.assertEqual(n_ko_list[0], n_ko_list[1])
+        self.assertEqual(test_table.n_rows, df.shape[0])
+        self.assertTrue(all([check.ko_rows.shape[0] == 2 for check in test_table.check_list]))
+        with self.assertRaisesRegex(Exception, "at least one chunk"):
+            dq_session.create_table_from_chunks((chunk for chunk in []), output_name="empty")
+
+    def test_streaming_period_intersection(self):
+        rng = np.random.default_rng(1)
+        start = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1000, 2000), unit="D")
+        df = pd.DataFrame({"index": np.arange(2000), "user_id": rng.integers(0, 200, 2000).astype(float),
+                           "start": start, "end": start + pd.to_timedelta(rng.integers(1, 30, 2000), unit="D")})
+        df.loc[df.index % 50 == 0, "user_id"] = np.nan
+        ko_rows_list = []
+        for streaming in [False, True]:
+            dq_session = DataQualitySession()
+            if streaming:
+                # Chunks without null ids have integer ids, half of the others have None ids
+                def get_chunk(i):
+                    chunk = df.iloc[i:i + 25]
+                    if i % 50 != 0:
+                        return chunk.astype({"user_id": "Int64"})
+                    if i % 100 == 0:
+                        return chunk.assign(user_id=chunk["user_id"].astype(object).where(chunk["user_id"].notnull(),
+                                                                                          None))
+                    return chunk
+
+                chunks = (get_chunk(i) for i in range(0, df.shape[0], 25))
+                test_table = dq_session.create_table_from_chunks(chunks, output_name="period_intersection",
+                                                                 n_max_rows_output=None)
+            else:
+                test_table = dq_session.create_table_from_dataframe(df, output_name="period_intersection")
+            test_table.check_period_intersection_rows(id_columns="user_id", start_date="start", end_date="end")
+            dq_session.run()
+            ko_rows_list.append(sorted(test_table.check_list[0].ko_rows["index"]))
+        self.assertGreater(len(ko_rows_list[0]), 0)
+        self.assertEqual(ko_rows_list[0], ko_rows_list[1])
+
+    def test_parquet_table(self):
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        df["unused_column"] = 0
+        n_ko_list = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fact_table.parquet")
+            df.to_parquet(path)
+            for parquet in [False, True]:
+                dq_session = DataQualitySession()
+                if parquet:
+                    test_table = dq_session.create_table_from_parquet(path, output_name="fact_table",
+                                                                      index_column="index",
+                                                                      table_filter="index >= 2 and index != 5",
+                                                                      output_columns=["dimension_code"])
+                else:
+                    test_table = dq_session.create_table_from_dataframe(df, output_name="fact_table",
+                                                                        index_column="index",
+                                                                        table_filter="index >= 2 and index != 5",
+                                                                        output_columns=["dimension_code"])
+                test_table.check_not_empthy_column("dimension_id")
+                test_table.check_values_in_list("dimension_code", ["a", "b"])
+                dq_session.run()
+                n_ko_list.append([check.n_ko for check in test_table.check_list])
+        self.assertEqual(n_ko_list[0], n_ko_list[1])
+        self.assertEqual(test_table.n_rows, df.query("index >= 2 and index != 5").shape[0])
+        self.assertNotIn("unused_column", test_table.df.columns)
+        self.assertIsNotNone(test_table.create_pushdown_filter())
+
+    def test_parquet_table_filter_nulls(self):
+        df = pd.DataFrame({"index": range(6), "a": [1, np.nan, 5, None, 2, 5], "s": ["x", None, "y", "z", None, "y"]})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "nulls.parquet")
+            df.to_parquet(path)
+            for table_filter in ["a != 5", "s != 'y'", "a != 5 and s != 'y'", "a not in [5]"]:
+                results = []
+                for parquet in [False, True]:
+                    dq_session = DataQualitySession()
+                    if parquet:
+                        test_table = dq_session.create_table_from_parquet(path, output_name="nulls", index_column="index",
+                                                                          table_filter=table_filter)
+                    else:
+                        test_table = dq_session.create_table_from_dataframe(df, output_name="nulls", index_column="index",
+                                                                            table_filter=table_filter)
+                    test_table.check_not_empthy_column("a")
+                    test_table.check_not_empthy_column("s")
+                    dq_session.run()
+                    test_table.get_number_of_rows()
+                    results.append((test_table.n_rows, [check.n_ko for check in test_table.check_list]))
+                self.assertEqual(results[0], results[1])
+                self.assertEqual(results[1][0], df.query(table_filter).shape[0])
+
+    def test_parquet_table_get_rows_flag(self):
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        df["unused_column"] = 0
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fact_table.parquet")
+            df.to_parquet(path)
+            dq_session = DataQualitySession()
+            test_table = dq_session.create_table_from_parquet(path, output_name="fact_table", index_column="index")
+            test_table.check_not_empthy_column("dimension_id", get_rows_flag=False)
+            test_table.check_values_in_list("dimension_code", ["a", "b"], get_rows_flag=False)
+            dq_session.run()
+            self.assertNotIn("unused_column", test_table.df.columns)
+            self.assertTrue(all([check.n_ko > 0 for check in test_table.check_list]))
+            self.assertTrue(all([check.ko_rows is None for check in test_table.check_list]))
+            test_table.check_values_in_list("dimension_code", ["a", "b"])
+            dq_session.run()
+            self.assertIn("unused_column", test_table.df.columns)
+            self.assertIn("unused_column", test_table.check_list[-1].ko_rows.columns)
+
+    def test_arrow_table(self):
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        results = []
+        for arrow in [False, True]:
+            dq_session = DataQualitySession()
+            if arrow:
+                test_table = dq_session.create_table_from_arrow(pa.Table.from_pandas(df, preserve_index=False),
+                                                                output_name="fact_table", index_column="index",
+                                                                table_filter="index != 5")
+            else:
+                test_table = dq_session.create_table_from_dataframe(df, output_name="fact_table",
+                                                                    index_column="index", table_filter="index != 5")
+            test_table.check_index_not_null()
+            test_table.check_not_empthy_column(["dimension_id", "dimension_code"])
+            test_table.check_values_in_list("dimension_code", ["A", "b"], case_sensitive=False)
+            test_table.check_column_match_regex("dimension_code", "^[ab]$")
+            test_table.check_columns_between_values("dimension_id", min_value=2, max_included=False, max_value=4)
+            n_ko = [check.n_ko for check in test_table.check_list]
+            if arrow:
+                self.assertIsNone(test_table._df)
+            ko_rows = test_table.get_ko_rows().reset_index(drop=True)
+            results.append((n_ko, ko_rows))
+        self.assertEqual(results[0][0], results[1][0])
+        assert_frame_equal(results[0][1], results[1][1])
+
+    def test_process_mask_executor(self):
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        results = []
+        for max_processes in [None, 2]:
+            dq_session = DataQualitySession()
+            test_table = dq_session.create_table_from_dataframe(df, output_name="fact_table", index_column="index",
+                                                                not_empthy_columns=["dimension_id"], deferred=True,
+                                                                max_processes=max_processes, n_partitions=3)
+            test_table.run_basic_check()
+            test_table.check_duplicate_values("dimension_id")
+            test_table.check_values_in_list("dimension_code", ["a", "b"])
+            test_table.check_custom_condition("dimension_id > 2")
+            dq_session.run()
+            results.append(([check.n_ko for check in test_table.check_list], test_table.index_problem,
+                            test_table.get_ko_rows()))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(results[0][1], results[1][1])
+        assert_frame_equal(results[0][2], results[1][2])
+
+    def test_process_mask_executor_reuse(self):
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        dq_session = DataQualitySession()
+        eager_table = dq_session.create_table_from_dataframe(df, output_name="eager", max_processes=2)
+        eager_table.check_values_in_list("dimension_code", ["a", "b"])
+        eager_table.check_custom_condition("dimension_id > 2")
+        eager_table.check_values_in_list("dimension_code", ["a"])
+        eager_table.check_custom_condition("dimension_id > 1")
+        self.assertIsNone(eager_table.mask_executor.pool)
+
+        test_table = dq_session.create_table_from_dataframe(df, output_name="deferred", deferred=True,
+                                                            max_processes=2)
+        test_table.check_values_in_list("dimension_code", ["a", "b"])
+        test_table.check_custom_condition("dimension_id > 2")
+        dq_session.run()
+        pool = test_table.mask_executor.pool
+        self.assertIsNotNone(pool)
+        arrow_file = test_table.column_cache[ARROW_FILE_CACHE_KEY]
+        test_table.check_values_in_list("dimension_code", ["a"])
+        test_table.check_custom_condition("dimension_id > 1")
+        dq_session.run()
+        self.assertIs(test_table.mask_executor.pool, pool)
+        self.assertIs(test_table.column_cache[ARROW_FILE_CACHE_KEY], arrow_file)
+        self.assertEqual([check.n_ko for check in test_table.check_list],
+                         [check.n_ko for check in eager_table.check_list])
+        path = arrow_file.path
+        del arrow_file
+        test_table.set_table_filer("dimension_id > 0")
+        self.assertFalse(os.path.exists(path))
+        test_table.mask_executor.close()
+
+    def test_sample_rate(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({"index": np.arange(20000), "A": rng.integers(0, 100, 20000)})
+        n_ko = (df["A"] >= 90).sum()
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df, output_name="sample", index_column="index",
+                                                            sample_rate=0.25)
+        test_table.check_columns_between_values("A", max_value=90, max_included=False)
+        test_table.calculate_result_info()
+        check = test_table.check_list[0]
+        self.assertLess(test_table.n_rows, df.shape[0])
+        self.assertEqual(check.n_ko, (test_table.df["A"] >= 90).sum())
+        self.assertLessEqual(check.n_ko_lower, n_ko)
+        self.assertGreaterEqual(check.n_ko_upper, n_ko)
+        self.assertLessEqual(check.n_ko_lower, check.n_ko_estimate)
+        self.assertGreaterEqual(check.n_ko_upper, check.n_ko_estimate)
+        with self.assertRaises(Exception):
+            dq_session.create_table_from_dataframe(df, output_name="sample", sample_rate=1.5)
+
+    def test_sample_rate_filter(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({"A": rng.integers(0, 100, 20000)})
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df, output_name="sample", sample_rate=0.5)
+        sampled_df = test_table.df
+        new_table = dq_session.create_new_table_by_filter(test_table, table_filter="A < 50")
+        assert_frame_equal(new_table.df, sampled_df.query("A < 50"))
+        test_table.set_table_filer("A >= 50")
+        assert_frame_equal(test_table.df, sampled_df.query("A >= 50"))
+
     def test_create_result_df(self):
         df = get_dataframe_for_test("fact_table")
         dq_session = DataQualitySession()
@@ -0,0 +1,355 @@
+import unittest
+import logging
+import asyncio
+import threading
+
+import duckdb
+import pandas as pd
+from pandas._testing import assert_frame_equal
+
+from data_quality.data_quality_holder import DataQualitySession
+from data_quality.src.sources_types.duckdb import create_duckdb_run_query_function, create_duckdb_upload_dataframe_function
+from data_quality.src.utils import FISCALCODE_REGEX
+
+
+def get_dataframe_for_test(sheet_name):
+    df = pd.read_excel(r"test_df.xlsx", sheet_name=sheet_name)
+    return df
+
+
+def create_duckdb_tables(sheet_list):
+    connection = duckdb.connect()
+    for sheet in sheet_list:
+        df = get_dataframe_for_test(sheet).drop(["check_description"], axis=1, errors="ignore")
+        connection.register("df_data_quality", df)
+        connection.execute(f"create table {sheet} as select * from df_data_quality")
+        connection.unregister("df_data_quality")
+    return connection
+
+
+def create_sources(dq_session, sheet_list):
+    run_query_duckdb = create_duckdb_run_query_function(create_duckdb_tables(sheet_list))
+    return dq_session.create_sources(run_query_duckdb, type_sources="duckdb")
+
+
+def check_results(df, table, same_columns=True):
+    df1 = df[df["check_description"].notnull()]
+    df2 = table.check_list[0].ko_rows
+    df1.sort_values(list(df1.columns), inplace=True)
+    df2.sort_values(list(df1.columns), inplace=True)
+    df1.reset_index(drop=True, inplace=True)
+    df2.reset_index(drop=True, inplace=True)
+    if not same_columns:
+        df2 = df2[df1.columns]
+    a = pd.isna(df1)
+    b = pd.isna(df2)
+    df1 = df1.astype(str)
+    df1[a] = None
+    df2 = df2.astype(str)
+    df2[b] = None
+    assert_frame_equal(df1,
+                       df2,
+                       check_names=False, check_dtype=False
+                       )
+    return
+
+
+class TestCheckDuckDB(unittest.TestCase):
+
+    def test_get_source_type(self):
+        dq_session = DataQualitySession()
+        run_query_duckdb = create_duckdb_run_query_function()
+        duckdb_sources = dq_session.create_sources(run_query_duckdb, source_type_cache_path="")
+        self.assertEqual(duckdb_sources.probe_source_type(), {"cast_datetime": "duckdb",
+                                                              "cast_float": "duckdb",
+                                                              "regex": "duckdb",
+                                                              "datetime_format_replace": "duckdb"})
+
+    def test_index_null(self):
+        db_name = "index_null"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name, index_column="index")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_index_not_null(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_duplicated_index(self):
+        db_name = "duplicated_index"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name, index_column="index")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_duplicate_index(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_duplicated_index_approximate(self):
+        db_name = "duplicated_index"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        n_ko_list = []
+        for approximate in [False, True]:
+            test_table = duckdb_sources.create_table(db_name, index_column="index")
+            n_ko_list.append(test_table.check_duplicate_index(approximate=approximate))
+        self.assertEqual(n_ko_list[0], n_ko_list[1])
+        self.assertIn("approx_count_distinct", duckdb_sources.approx_count_distinct_sql("index"))
+
+    def test_sample_rate(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        results = []
+        for sample_rate in [None, 1.0]:
+            test_table = duckdb_sources.create_table(db_name, index_column="index", sample_rate=sample_rate)
+            test_table.run_basic_check()
+            test_table.check_values_in_list("dimension_code", ["a", "b"])
+            test_table.calculate_result_info()
+            results.append([check.n_ko for check in test_table.check_list])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([check.n_ko_estimate for check in test_table.check_list], results[0])
+
+        run_query_duckdb = create_duckdb_run_query_function()
+        sample_sources = dq_session.create_sources(run_query_duckdb, type_sources="duckdb")
+        table_name = "range(100000) t(index)"
+        test_table = sample_sources.create_table(table_name, index_column="index", sample_rate=0.1)
+        test_table.check_custom_condition("index % 10 = 0")
+        test_table.calculate_result_info()
+        check = test_table.check_list[0]
+        self.assertLess(test_table.n_rows, 20000)
+        self.assertLessEqual(check.n_ko_lower, 10000)
+        self.assertGreaterEqual(check.n_ko_upper, 10000)
+        test_table.set_table_filer("index < 50000")
+        test_table.get_number_of_rows(refresh=True)
+        self.assertLess(test_table.n_rows, 10000)
+        with self.assertRaises(Exception):
+            sample_sources.create_table(table_name, sample_rate=0.1)
+
+        # Rows with a null index are kept or dropped together, the same way by every query
+        null_table_name = "(select case when index % 3 = 0 then null else index end as index " \
+                          "from range(100000) t(index)) t"
+        null_counts = []
+        for _ in range(2):
+            null_table = sample_sources.create_table(null_table_name, index_column="index", sample_rate=0.5)
+            null_table.check_index_not_null()
+            null_table.calculate_result_info()
+            null_counts.append((null_table.n_rows, null_table.check_list[0].n_ko))
+        self.assertEqual(null_counts[0], null_counts[1])
+        self.assertIn(null_counts[0][1], [0, len(range(0, 100000, 3))])
+
+    def test_fused_number_ko(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name, index_column="index", not_empthy_columns=["dimension_id"],
+                                                 table_filter="dimension_code is not null")
+        test_table.run_basic_check()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        n_ko_list = [check.n_ko for check in test_table.check_list]
+        test_table.refresh_number_ko()
+        self.assertEqual(n_ko_list, [check.n_ko for check in test_table.check_list])
+
+    def test_not_empthy_column(self):
+        db_name = "not_empthy_column"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name, not_empthy_columns="A")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_not_empthy_column(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_columns_between_values(self):
+        db_name = "columns_between_values"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_columns_between_values("A", min_value=0, max_value=100, max_included=False, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_values_order(self):
+        db_name = "values_order"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_values_order(["A", "B", "C", "D"], get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_values_in_list_case_insensitive(self):
+        db_name = "values_in_list"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_values_in_list("A", values_list=["a", "b"], case_sensitive=False, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_match_regex(self):
+        db_name = "match_regex"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_column_match_regex("A", regex=FISCALCODE_REGEX, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_custom_condition(self):
+        db_name = "custom_condition"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_custom_condition("A = 3", get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_match_dimension_table_sql_df_many_keys(self):
+        # 5 000 keys are sent as arrays, 150 000 keys through a staging table
+        for n_keys in [500, 5000, 150000]:
+            connection = duckdb.connect()
+            connection.execute(f"create table fact_table as select i % 1000 as a, i // 1000 as b "
+                               f"from range({n_keys}) t(i)")
+            dq_session = DataQualitySession()
+            duckdb_sources = dq_session.create_sources(
+                create_duckdb_run_query_function(connection), type_sources="duckdb",
+                upload_dataframe_function=create_duckdb_upload_dataframe_function(connection))
+            keys = pd.DataFrame({"a": range(n_keys)})
+            keys["b"] = keys["a"] // 1000
+            keys["a"] = keys["a"] % 1000
+            keys = keys[keys.index % 7 != 0]
+            dimension_table = dq_session.create_table_from_dataframe(keys, output_name="dimension_table")
+            test_table = duckdb_sources.create_table("fact_table")
+            n_ko = test_table.check_match_dimension_table(["a", "b"], dimension_table, primary_keys=["a", "b"],
+                                                          get_rows_flag=True)
+            ko_keys = test_table.check_list[0].ko_rows["b"] * 1000 + test_table.check_list[0].ko_rows["a"]
+            self.assertEqual(n_ko, len(range(0, n_keys, 7)))
+            self.assertTrue((ko_keys % 7 == 0).all())
+            self.assertEqual(len(ko_keys), min(n_ko, test_table.n_max_rows_output or n_ko))
+            count_staging_tables_sql = "select count(*) from information_schema.tables " \
+                                       "where table_name like 'data_quality_keys_%'"
+            self.assertEqual(connection.execute(count_staging_tables_sql).fetchone()[0], 1 if n_keys > 100000 else 0)
+            # The staging table belongs to the dimension table, not to its copies
+            dq_session.del_table(dq_session.create_new_table_by_filter(dimension_table, output_name="copy"))
+            self.assertEqual(connection.execute(count_staging_tables_sql).fetchone()[0], 1 if n_keys > 100000 else 0)
+            dq_session.del_table(dimension_table)
+            self.assertEqual(connection.execute(count_staging_tables_sql).fetchone()[0], 0)
+
+    def test_match_dimension_table_sql_df_keys_size(self):
+        # 2 000 long keys are over the size of a NOT IN list: arrays are used if the dialect has them
+        connection = duckdb.connect()
+        connection.execute("create table fact_table as select repeat('k', 50) || i as a from range(2000) t(i)")
+        queries = []
+        run_query_duckdb = create_duckdb_run_query_function(connection)
+
+        def run_query_logged(query: str) -> pd.DataFrame:
+            queries.append(query)
+            return run_query_duckdb(query)
+
+        keys = pd.DataFrame({"a": ["k" * 50 + str(i) for i in range(2000) if i % 7 != 0]})
+        n_ko_list = []
+        for flag_array in [True, False]:
+            dq_session = DataQualitySession()
+            duckdb_sources = dq_session.create_sources(run_query_logged, type_sources="duckdb")
+            if not flag_array:
+                duckdb_sources.keys_array_sql = None
+            dimension_table = dq_session.create_table_from_dataframe(keys, output_name="dimension_table")
+            test_table = duckdb_sources.create_table("fact_table")
+            queries.clear()
+            n_ko_list.append(test_table.check_match_dimension_table("a", dimension_table, primary_keys="a"))
+            self.assertEqual(any(["unnest" in query for query in queries]), flag_array)
+            self.assertEqual(any(["not in" in query for query in queries]), not flag_array)
+        self.assertEqual(n_ko_list, [len(range(0, 2000, 7))] * 2)
+
+    def test_match_dimension_table_df_sql_many_keys(self):
+        # 25 000 distinct keys are looked up in 3 batches
+        connection = duckdb.connect()
+        connection.execute("create table dimension_table as select i % 1000 as id, i // 1000 as code "
+                           "from range(25000) t(i) where i % 7 <> 0")
+        dq_session = DataQualitySession()
+        duckdb_sources = dq_session.create_sources(create_duckdb_run_query_function(connection),
+                                                   type_sources="duckdb", max_workers=3)
+        dimension_table = duckdb_sources.create_table("dimension_table", output_name="dimension_table")
+        df = pd.DataFrame({"key": list(range(25000)) * 2})
+        df["a"] = df["key"] % 1000
+        df["b"] = df["key"] // 1000
+        test_table = dq_session.create_table_from_dataframe(df, output_name="fact_table")
+        n_ko = test_table.check_match_dimension_table(["a", "b"], dimension_table, primary_keys=["id", "code"],
+                                                      get_rows_flag=True)
+        self.assertEqual(n_ko, 2 * len(range(0, 25000, 7)))
+        self.assertTrue((test_table.check_list[0].ko_rows["key"] % 7 == 0).all())
+
+    def test_period_intersection_not_adjacent(self):
+        connection = duckdb.connect()
+        connection.execute("""
+            create table periods as select * from (values
+                (1, 'a', timestamp '2021-01-01', timestamp '2021-01-10'),
+                (1, 'a', timestamp '2021-01-02', timestamp '2021-01-03'),
+                (1, 'a', timestamp '2021-01-05', timestamp '2021-01-06'),
+                (1, 'b', timestamp '2021-01-02', timestamp '2021-01-03'),
+                (2, 'a', timestamp '2021-01-01', timestamp '2021-01-03'),
+                (2, 'a', timestamp '2021-01-03', timestamp '2021-01-04')) t(user_id, plan, start_date, end_date)
+            """)
+        dq_session = DataQualitySession()
+        duckdb_sources = dq_session.create_sources(create_duckdb_run_query_function(connection), type_sources="duckdb")
+        for extremes_exclude, expected_n_ko in [(False, 3), (True, 5)]:
+            test_table = duckdb_sources.create_table("periods")
+            n_ko = test_table.check_period_intersection_rows(id_columns=["user_id", "plan"], start_date="start_date",
+                                                             end_date="end_date", extremes_exclude=extremes_exclude,
+                                                             get_rows_flag=True)
+            self.assertEqual(n_ko, expected_n_ko)
+            self.assertEqual(test_table.check_list[0].ko_rows.shape[0], expected_n_ko)
+
+    def test_arun_async_query_function(self):
+        connection = create_duckdb_tables(["fact_table", "dimension_table"])
+        # Float ids are cast to strings as "1.0" by DuckDB, the dimension keys are stored as integers
+        connection.execute("create table dimension_int as select cast(id as bigint) as id from dimension_table")
+        run_query_duckdb = create_duckdb_run_query_function(connection)
+
+        async def run_query(query):
+            await asyncio.sleep(0)
+            return run_query_duckdb(query)
+
+        dq_session = DataQualitySession()
+        duckdb_sources = dq_session.create_sources(run_query, type_sources="duckdb", deferred=True, max_workers=2)
+        sql_table = duckdb_sources.create_table("fact_table", index_column="index", not_empthy_columns="dimension_id")
+        sql_table.run_basic_check()
+        sql_table.check_values_in_list("dimension_code", ["a", "b"], get_rows_flag=True)
+        dimension_table = duckdb_sources.create_table("dimension_int", output_name="dimension_table",
+                                                      index_column="id")
+        sql_table.check_match_dimension_table("dimension_id", dimension_table)
+        df = get_dataframe_for_test("fact_table").drop(["check_description"], axis=1)
+        df_table = dq_session.create_table_from_dataframe(df, output_name="fact_df", deferred=True)
+        df_table.check_match_dimension_table("dimension_id", dimension_table, get_rows_flag=True)
+
+        # The event loop must not wait on the queries of the DataFrame checks
+        thread = threading.Thread(target=lambda: asyncio.run(dq_session.arun(max_concurrency=1)), daemon=True)
+        thread.start()
+        thread.join(timeout=20)
+        self.assertFalse(thread.is_alive())
+
+        sync_sources = dq_session.create_sources(run_query_duckdb, type_sources="duckdb")
+        expected_table = sync_sources.create_table("fact_table", index_column="index", not_empthy_columns="dimension_id")
+        expected_table.run_basic_check()
+        expected_table.check_values_in_list("dimension_code", ["a", "b"])
+        expected_table.check_match_dimension_table("dimension_id", sync_sources.create_table("dimension_int",
+                                                                                            index_column="id"))
+        self.assertEqual([check.n_ko for check in sql_table.check_list],
+                         [check.n_ko for check in expected_table.check_list])
+        self.assertIsNotNone(sql_table.check_list[-2].ko_rows)
+        expected_df = get_dataframe_for_test("fact_table")
+        self.assertEqual(df_table.check_list[0].n_ko, expected_df["check_description"].notnull().sum())
+
+    def test_period_intersection_rows(self):
+        db_name = "period_intersection"
+        dq_session = DataQualitySession()
+        duckdb_sources = create_sources(dq_session, [db_name])
+        test_table = duckdb_sources.create_table(db_name, table_filter="user_id=2")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_period_intersection_rows(start_date="subscription_start",
+                                                  end_date="subscription_end",
+                                                  get_rows_flag=True)
+        check_results(result_df[result_df["user_id"] == 2], test_table)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
@@ -0,0 +1,383 @@
+import os
+import unittest
+import logging
+import tempfile
+
+import sqlite3
+import pandas as pd
+from pandas._testing import assert_frame_equal
+
+from data_quality.data_quality_holder import DataQualitySession
+from data_quality.src.sources_types.sqlite import create_sqlite_run_query_function
+from data_quality.src.utils import FISCALCODE_REGEX
+
+
+def get_dataframe_for_test(sheet_name):
+    # index is a reserved word in SQLite and datetimes are stored as text
+    df = pd.read_excel(r"test_df.xlsx", sheet_name=sheet_name).rename(columns={"index": "row_index"})
+    for col in df.select_dtypes("datetime").columns:
+        df[col] = df[col].astype(str).where(df[col].notnull(), None)
+    return df
+
+
+def create_sqlite_tables(sheet_list):
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    for sheet in sheet_list:
+        df = get_dataframe_for_test(sheet).drop(["check_description"], axis=1, errors="ignore")
+        df.to_sql(sheet, connection, index=False)
+    return connection
+
+
+def create_sources(dq_session, sheet_list, **kwargs):
+    run_query_sqlite = create_sqlite_run_query_function(create_sqlite_tables(sheet_list))
+    return dq_session.create_sources(run_query_sqlite, type_sources="sqlite", **kwargs)
+
+
+def check_results(df, table, same_columns=True):
+    df1 = df[df["check_description"].notnull()]
+    df2 = table.check_list[0].ko_rows
+    df1.sort_values(list(df1.columns), inplace=True)
+    df2.sort_values(list(df1.columns), inplace=True)
+    df1.reset_index(drop=True, inplace=True)
+    df2.reset_index(drop=True, inplace=True)
+    if not same_columns:
+        df2 = df2[df1.columns]
+    a = pd.isna(df1)
+    b = pd.isna(df2)
+    df1 = df1.astype(str)
+    df1[a] = None
+    df2 = df2.astype(str)
+    df2[b] = None
+    assert_frame_equal(df1,
+                       df2,
+                       check_names=False, check_dtype=False
+                       )
+    return
+
+
+class TestCheckSQLite(unittest.TestCase):
+
+    def test_get_source_type(self):
+        dq_session = DataQualitySession()
+        run_query_sqlite = create_sqlite_run_query_function()
+        sqlite_sources = dq_session.create_sources(run_query_sqlite, source_type_cache_path="")
+        self.assertEqual(sqlite_sources.probe_source_type(), {"cast_datetime": "sqlite",
+                                                              "cast_float": "sqlite",
+                                                              "regex": "sqlite",
+                                                              "datetime_format_replace": "sqlite"})
+
+    def test_source_type_cache(self):
+        n_queries = []
+        run_query_sqlite = create_sqlite_run_query_function()
+
+        def run_query_counted(query: str) -> pd.DataFrame:
+            n_queries.append(query)
+            return run_query_sqlite(query)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "source_types.json")
+            dq_session = DataQualitySession()
+            dq_session.create_sources(run_query_counted, connection_id="sqlite_test",
+                                      source_type_cache_path=cache_path)
+            # One probe query per dialect rejected before SQLite, one for SQLite
+            self.assertEqual(len(n_queries), 4)
+            # Capabilities read from the cache are not written again
+            os.utime(cache_path, (0, 0))
+            sqlite_sources = dq_session.create_sources(run_query_counted, connection_id="sqlite_test",
+                                                       source_type_cache_path=cache_path)
+            self.assertEqual(len(n_queries), 4)
+            self.assertEqual(os.path.getmtime(cache_path), 0)
+            self.assertEqual(sqlite_sources.cast_float_sql("a"), "float_data_quality(a)")
+
+    def test_index_null(self):
+        db_name = "index_null"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, index_column="row_index")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_index_not_null(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_duplicated_index(self):
+        db_name = "duplicated_index"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, index_column="row_index")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_duplicate_index(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_not_empthy_column(self):
+        db_name = "not_empthy_column"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, not_empthy_columns="A")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_not_empthy_column(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_columns_between_values(self):
+        db_name = "columns_between_values"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_columns_between_values("A", min_value=0, max_value=100, max_included=False, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_values_order(self):
+        db_name = "values_order"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_values_order(["A", "B", "C", "D"], get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_values_in_list_case_insensitive(self):
+        db_name = "values_in_list"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_values_in_list("A", values_list=["a", "b"], case_sensitive=False, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_match_regex(self):
+        db_name = "match_regex"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_column_match_regex("A", regex=FISCALCODE_REGEX, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_custom_condition(self):
+        db_name = "custom_condition"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_custom_condition("A = 3", get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_datetime_format1(self):
+        db_name = "datetime_format1"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, datetime_columns="A", datetime_formats="%d-%m-%Y")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_datetime_format(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_datetime_format3(self):
+        db_name = "datetime_format2"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, datetime_columns="A")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_datetime_format(get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_columns_between_dates(self):
+        db_name = "columns_between_dates"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_columns_between_dates("A", min_date="2020-01-01", max_date="2022-01-01", get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_dates_order(self):
+        db_name = "dates_order"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name,
+                                                 datetime_columns=["A", "B", "C", "D"],
+                                                 datetime_formats=["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", None, None])
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_dates_order(["A", "B", "C", "D"], get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_values_in_list(self):
+        db_name = "values_in_list_cs"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_values_in_list("A", values_list=["a", "b"], get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_match_dimension_table_sql_sql1(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name, "dimension_table"])
+        test_table = sqlite_sources.create_table(db_name)
+        dimension_table = sqlite_sources.create_table("dimension_table", output_name="dimension_table", index_column="id")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_match_dimension_table("dimension_id", dimension_table, get_rows_flag=True)
+        check_results(result_df, test_table)
+
+    def test_dates_order_dimension_table(self):
+        db_name = "products"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name, "user_list"])
+        test_table = sqlite_sources.create_table(db_name)
+        dimension_table = sqlite_sources.create_table("user_list", output_name="Users", index_column="id")
+        test_table.check_dates_order_dimension_table("user_id", dimension_table, "selling_date", "registration_date", ">=",
+                                                     get_rows_flag=True)
+        result_df = get_dataframe_for_test(db_name)
+        check_results(result_df, test_table, same_columns=False)
+
+    def test_values_order_dimension_table(self):
+        db_name = "products2"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name, "user_list"])
+        test_table = sqlite_sources.create_table(db_name)
+        dimension_table = sqlite_sources.create_table("user_list", output_name="Users", index_column="id")
+        test_table.check_values_order_dimension_table("user_id", dimension_table, "n_products", "max_products", "<=",
+                                                      get_rows_flag=True)
+        result_df = get_dataframe_for_test(db_name)
+        check_results(result_df, test_table, same_columns=False)
+
+    def test_period_intersection_rows1(self):
+        db_name = "period_intersection"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, table_filter="user_id=2")
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_period_intersection_rows(start_date="subscription_start",
+                                                  end_date="subscription_end",
+                                                  get_rows_flag=True)
+        check_results(result_df[result_df["user_id"] == 2], test_table)
+
+    def test_period_intersection_rows2(self):
+        db_name = "period_intersection"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name], get_rows_flag=True)
+        test_table = sqlite_sources.create_table(db_name)
+        result_df = get_dataframe_for_test(db_name)
+        test_table.check_period_intersection_rows(id_columns="user_id",
+                                                  start_date="subscription_start",
+                                                  end_date="subscription_end")
+        check_results(result_df, test_table)
+
+    def test_fused_number_ko(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        sqlite_sources = create_sources(dq_session, [db_name])
+        test_table = sqlite_sources.create_table(db_name, index_column="row_index", not_empthy_columns=["dimension_id"])
+        test_table.run_basic_check()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        n_ko_list = [check.n_ko for check in test_table.check_list]
+        test_table.refresh_number_ko()
+        self.assertEqual(n_ko_list, [check.n_ko for check in test_table.check_list])
+
+    def test_concurrent_run(self):
+        dq_session = DataQualitySession()
+        db_list = ["index_null", "duplicated_index", "not_empthy_column"]
+        sqlite_sources = create_sources(dq_session, db_list, deferred=True, max_workers=4)
+        table_list = []
+        for db_name in db_list:
+            test_table = sqlite_sources.create_table(db_name, index_column="row_index")
+            test_table.check_index_not_null(get_rows_flag=True)
+            test_table.check_duplicate_index(get_rows_flag=True)
+            table_list.append(test_table)
+        dq_session.run()
+        sqlite_sources.close()
+        for db_name, test_table in zip(db_list, table_list):
+            self.assertEqual([check.check_description for check in test_table.check_list],
+                             ["Index null", "Duplicated index"])
+            expected_table = create_sources(DataQualitySession(), [db_name]).create_table(db_name,
+                                                                                          index_column="row_index")
+            expected_table.check_index_not_null()
+            expected_table.check_duplicate_index()
+            self.assertEqual([check.n_ko for check in test_table.check_list],
+                             [check.n_ko for check in expected_table.check_list])
+
+    def test_query_cache(self):
+        n_queries = []
+        run_query_sqlite = create_sqlite_run_query_function(create_sqlite_tables(["fact_table"]))
+
+        def run_query_counted(query: str) -> pd.DataFrame:
+            n_queries.append(query)
+            return run_query_sqlite(query)
+
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        sqlite_sources = dq_session.create_sources(run_query_counted, type_sources="sqlite", get_rows_flag=True,
+                                                   cache_size=16)
+        for i in range(2):
+            test_table = sqlite_sources.create_table(db_name, index_column="row_index")
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        self.assertEqual(len(n_queries), 2)
+        self.assertEqual(test_table.check_list[0].n_ko, 2)
+        sqlite_sources.clear_cache()
+        test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+        self.assertEqual(len(n_queries), 4)
+
+    def test_count_with_rows(self):
+        db_name = "fact_table"
+        dq_session = DataQualitySession()
+        result_list = []
+        for count_with_rows_flag in [False, True]:
+            sqlite_sources = create_sources(dq_session, [db_name], get_rows_flag=True,
+                                            count_with_rows_flag=count_with_rows_flag)
+            test_table = sqlite_sources.create_table(db_name, index_column="row_index",
+                                                     not_empthy_columns=["dimension_id"])
+            test_table.run_basic_check()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+            result_list.append([(check.n_ko, check.ko_rows.shape[0]) for check in test_table.check_list])
+        self.assertEqual(result_list[0], result_list[1])
+
+    def test_count_with_rows_table_filter(self):
+        # The OR of the not empty filter must not escape the table filter
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        pd.DataFrame({"g": [1, 1, 2, 2], "a": ["x", "", None, ""]}).to_sql("t", connection, index=False)
+        dq_session = DataQualitySession()
+        n_ko_list = []
+        for count_with_rows_flag in [False, True]:
+            sqlite_sources = dq_session.create_sources(create_sqlite_run_query_function(connection),
+                                                       type_sources="sqlite", get_rows_flag=True,
+                                                       count_with_rows_flag=count_with_rows_flag)
+            test_table = sqlite_sources.create_table("t", table_filter="g = 1")
+            n_ko_list.append(test_table.check_not_empthy_column("a"))
+        self.assertEqual(n_ko_list, [1, 1])
+
+    def test_batched_rows_ko(self):
+        db_name = "fact_table"
+        result_list = []
+        for deferred in [False, True]:
+            dq_session = DataQualitySession()
+            sqlite_sources = create_sources(dq_session, [db_name], get_rows_flag=True, deferred=deferred)
+            test_table = sqlite_sources.create_table(db_name, index_column="row_index",
+                                                     not_empthy_columns=["dimension_id"],
+                                                     table_filter="row_index < 9")
+            test_table.run_basic_check()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"])
+            dq_session.run()
+            result_list.append([(check.n_ko, check.ko_rows.astype(object).where(check.ko_rows.notna(), None)
+                                .sort_values(list(check.ko_rows.columns)).to_string(index=False))
+                                for check in test_table.check_list])
+        self.assertEqual(result_list[0], result_list[1])
+
+    def test_unique_rows_sql(self):
+        db_name = "fact_table"
+        result_list = []
+        for unique_rows_sql_flag in [False, True]:
+            dq_session = DataQualitySession()
+            sqlite_sources = create_sources(dq_session, [db_name], get_rows_flag=True,
+                                            unique_rows_sql_flag=unique_rows_sql_flag)
+            test_table = sqlite_sources.create_table(db_name, index_column="row_index",
+                                                     not_empthy_columns=["dimension_id"])
+            test_table.check_index_not_null()
+            test_table.check_not_empthy_column()
+            test_table.check_values_in_list("dimension_code", ["a", "b", "c", "d"], flag_warning=True)
+            test_table.calculate_result_info()
+            result_list.append((test_table.number_unique_rows_ko, test_table.number_unique_rows_warning))
+        self.assertEqual(result_list[0], result_list[1])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
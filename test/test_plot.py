@@ -4,7 +4,7 @@ import logging
 import pandas as pd
 
 from data_quality.data_quality_holder import DataQualitySession
-from data_quality.src.utils import FISCALCODE_REGEX
+from data_quality.src.utils import FISCALCODE_REGEX, _human_format
 
 
 def get_dataframe_for_test(sheet_name):
@@ -35,6 +35,19 @@ class TestPlot(unittest.TestCase):
         test_table.create_html_output(save_in_path=r"test_plot_table_warning.html")
 
 
+    def test_plot_table_sample(self):
+        df = pd.DataFrame({"index": range(1000), "A": [i % 10 for i in range(1000)]})
+
+        dq_session = DataQualitySession()
+        test_table = dq_session.create_table_from_dataframe(df, output_name="Test Table", index_column="index",
+                                                            sample_rate=0.5)
+        test_table.check_columns_between_values("A", max_value=8)
+        test_table.create_html_output(save_in_path=r"test_plot_table_sample.html")
+        check = test_table.check_list[0]
+        with open(r"test_plot_table_sample.html") as f:
+            html = f.read()
+        self.assertIn(f"[{_human_format(check.n_ko_lower)} - {_human_format(check.n_ko_upper)}]", html)
+
     def test_plot_session_unique(self):
         df = get_dataframe_for_test("match_regex")
 